@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+ASGI application
+Serves the /api/v1 routes that polling cells call most - collection and
+by-id reads, change events (long-poll and Server-Sent Events) and device
+commands - as coroutines on SQLAlchemy's async engine (aiosqlite), so a
+waiting client holds no thread. Every other request is handed to the Flask
+app on a thread pool. The async handlers reuse the query builders,
+serializers and validators of main.py, so the JSON contracts are the same.
+
+Usage: python asgi.py [--host HOST] [--port PORT] [--workers N] [--threads N]
+                      [--keepalive SECONDS] [--graceful-timeout SECONDS]
+   or: uvicorn asgi:application
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.exceptions import HTTPException
+
+from cache import MISSING
+from device_queue import QueueFullError
+from metrics import RequestCounters, count_rows, request_counters
+from main import (app as flask_app, db, create_app, database_url, file_database, execute_sqlite_pragmas,
+                  endpoint_tables, select_table_versions, conditional_validators, is_not_modified,
+                  parse_collection_args, select_collection, collection_items, select_recipe_rows,
+                  recipe_row_to_dict, parse_event_args, select_change_events, change_event_to_dict,
+                  get_recipe_package, package_recipe_detail, accepted_command_body, model_to_dict,
+                  master_cache, change_notifier, command_queue, history_archiver, request_metrics,
+                  requested_profile_mode, RESOURCE_MODELS, MASTER_TABLES, ARCHIVE_MODELS, NDJSON_MIMETYPE,
+                  EVENT_POLL_INTERVAL, EVENT_HEARTBEAT, ChangeEvent, Command, Recipe)
+from server import ServerConfig
+
+
+class AsyncStream:
+    """A response whose body is produced by an async generator of strings"""
+
+    def __init__(self, response, chunks):
+        self.response = response
+        self.chunks = chunks
+
+
+def json_response(data, status=200):
+    """Build the response jsonify() would"""
+    response = flask_app.json.response(data)
+    response.status_code = status
+    return response
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1").lower(), value.decode("latin-1")
+        if name == "content-type":
+            key = "CONTENT_TYPE"
+        elif name == "content-length":
+            key = "CONTENT_LENGTH"
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body has been read in full, whatever its transfer encoding was
+    environ.pop("HTTP_TRANSFER_ENCODING", None)
+    if body or "CONTENT_LENGTH" in environ:
+        environ["CONTENT_LENGTH"] = str(len(body))
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def start_message(status, headers):
+    return {"type": "http.response.start", "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]}
+
+
+# Sync helper run on the thread pool: the package may have to be (re)built
+def load_recipe_package(recipe_id):
+    with flask_app.app_context():
+        package = get_recipe_package(recipe_id)
+        if package is None:
+            return None
+        return json.loads(package.payload), package.version
+
+
+class ASGIApp:
+    """Serves ASYNC_VIEWS as coroutines and everything else through the WSGI app"""
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self.url_adapter = flask_app.url_map.bind("localhost")
+        self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+        if self.engine is None:
+            self.startup()
+
+        environ = build_environ(scope, await read_body(receive))
+        request = flask_app.request_class(environ)
+        try:
+            endpoint, view_args = flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint, view_args = None, {}
+        view = ASYNC_VIEWS.get(endpoint) if request.method in ("GET", "POST") else None
+        if requested_profile_mode(request) is not None:
+            # Profiled requests run through the Flask app, which does the profiling
+            view = None
+
+        response = None
+        if view is not None:
+            started = time.perf_counter()
+            counters = RequestCounters(endpoint)
+            if flask_app.config['METRICS_ENABLED']:
+                # Each request runs in its own task, so this does not leak into others
+                request_counters.set(counters)
+            response = await self.dispatch(view, request, endpoint, view_args)
+        if response is None:
+            # The Flask app records the requests it serves
+            request_counters.set(None)
+            return await self.call_wsgi(environ, send)
+        if request.path.startswith("/api/"):
+            # The CORS headers flask_cors adds to /api/* responses
+            origin = request.headers.get("Origin")
+            response_headers = response.response.headers if isinstance(response, AsyncStream) else response.headers
+            response_headers["Access-Control-Allow-Origin"] = origin or "*"
+            if origin:
+                response_headers.add("Vary", "Origin")
+        if isinstance(response, AsyncStream):
+            sent = await self.send_stream(response, receive, send)
+            status = response.response.status_code
+        else:
+            body = b"".join(response.get_app_iter(environ))
+            await send(start_message(response.status_code, response.get_wsgi_headers(environ).items()))
+            await send({"type": "http.response.body", "body": body})
+            sent, status = len(body), response.status_code
+        if flask_app.config['METRICS_ENABLED']:
+            request_metrics.observe(endpoint, request.method, status, time.perf_counter() - started, counters, sent)
+
+    async def dispatch(self, view, request, endpoint, view_args):
+        """Run view with the conditional GET handling of main.conditional_get()"""
+        tables = endpoint_tables(endpoint, view_args) if request.method == "GET" else None
+        if tables is None:
+            return await view(self, request, endpoint, view_args, None)
+        versions = await self.read_table_versions(tables)
+        etag, last_modified = conditional_validators(request, tables, versions)
+        if is_not_modified(request, etag, versions):
+            response = flask_app.response_class(status=304)
+        else:
+            response = await view(self, request, endpoint, view_args, versions)
+        if response is not None and response.status_code in (200, 304):
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+        return response
+
+    # ---- lifecycle -------------------------------------------------------
+
+    def startup(self):
+        """Create the database and this process's async engine"""
+        if self.engine is not None:
+            return
+        if not file_database:
+            raise RuntimeError("The ASGI app needs a database file, not an in-memory database")
+        create_app()
+        options = dict(flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        if "pool_size" in options:
+            # aiosqlite defaults to NullPool; keep the pool of the SQLite profile
+            options["poolclass"] = AsyncAdaptedQueuePool
+        self.engine = create_async_engine(database_url.set(drivername="sqlite+aiosqlite"), **options)
+        event.listen(self.engine.sync_engine, "connect",
+                     lambda dbapi_connection, record: execute_sqlite_pragmas(dbapi_connection))
+        if flask_app.config['BACKGROUND_TASKS']:
+            history_archiver.start()
+            command_queue.start()
+
+    async def shutdown(self):
+        history_archiver.stop()
+        if self.engine is not None:
+            await self.engine.dispose()
+        self.executor.shutdown(wait=False)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---- responses -------------------------------------------------------
+
+    async def call_wsgi(self, environ, send):
+        """Run the Flask app on the thread pool, streaming its body back"""
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            started = []
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and started:
+                    raise exc_info[1].with_traceback(exc_info[2])
+                started[:] = [int(status.split(" ", 1)[0]), headers]
+
+            iterable = self.wsgi_app(environ, start_response)
+            sent_start = False
+            try:
+                for chunk in iterable:
+                    if not chunk:
+                        continue
+                    if not sent_start:
+                        send_from_thread(start_message(*started))
+                        sent_start = True
+                    send_from_thread({"type": "http.response.body", "body": chunk, "more_body": True})
+                if not sent_start:
+                    send_from_thread(start_message(*started))
+                send_from_thread({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+    async def send_stream(self, stream, receive, send):
+        """Send an AsyncStream until it ends or the client disconnects; returns the bytes sent"""
+        headers = stream.response.headers
+        headers.remove("Content-Length")
+        await send(start_message(stream.response.status_code, headers.items()))
+        sent = 0
+
+        async def pump():
+            nonlocal sent
+            async for chunk in stream.chunks:
+                chunk = chunk.encode()
+                sent += len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await stream.chunks.aclose()
+        return sent
+
+    # ---- database --------------------------------------------------------
+
+    async def run_sync(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # Rows are fetched on aiosqlite's thread, so they are counted here for the metrics
+    async def execute(self, stmt):
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(stmt)).all()
+        count_rows(len(rows))
+        return rows
+
+    async def scalar(self, stmt):
+        async with self.engine.connect() as connection:
+            value = await connection.scalar(stmt)
+        count_rows(1)
+        return value
+
+    async def read_table_versions(self, tables):
+        if not tables:
+            return {}
+        rows = await self.execute(select_table_versions(tables))
+        return {name: tuple(values) for name, *values in rows}
+
+    async def cached_master_read(self, table, key, versions, loader):
+        """main.cached_master_read() with the versions read by dispatch()"""
+        stamp = versions.get(table, (0, 0))[0] if versions is not None else None
+        value = master_cache.get((table, key), stamp)
+        if value is MISSING:
+            value = await loader()
+            if value is not None:
+                master_cache.set((table, key), value, stamp)
+        return value
+
+    async def read_collection(self, model, args):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(select_collection(model, args))
+            items = list(collection_items(model, result, args["fields"]))
+        count_rows(len(items))
+        return items
+
+    async def read_record(self, model, record_id):
+        if model is Recipe:
+            rows = await self.execute(select_recipe_rows().where(Recipe.id == record_id))
+            return recipe_row_to_dict(rows[0]) if rows else None
+        columns = model.__table__.columns
+        rows = await self.execute(db.select(*columns).where(columns["id"] == record_id))
+        return dict(zip(columns.keys(), rows[0])) if rows else None
+
+    async def read_change_events(self, since, tables, limit):
+        return [change_event_to_dict(row) for row in await self.execute(select_change_events(since, tables, limit))]
+
+    async def wait_for_change_events(self, since, tables, timeout, limit=500):
+        """main.wait_for_change_events() without holding a thread"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            generation = change_notifier.generation
+            events = await self.read_change_events(since, tables, limit)
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                return events
+            await change_notifier.wait_async(generation, min(remaining, EVENT_POLL_INTERVAL))
+
+
+# ============================================================================
+# ASYNC VIEWS
+# ============================================================================
+# Each mirrors the Flask view of the same endpoint. A view may return None to
+# hand the request to the Flask view, e.g. for streamed collections.
+
+async def get_collection(api, request, endpoint, view_args, versions):
+    resource = endpoint[len("api_get_"):]
+    model = RESOURCE_MODELS[resource]
+    if (request.args.get('stream') in ('1', 'true') or request.accept_mimetypes.best == NDJSON_MIMETYPE
+            or (model in ARCHIVE_MODELS and request.args.get('include_archived') in ('1', 'true'))):
+        return None
+    try:
+        args = parse_collection_args(model, query=request.args)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    try:
+        table = model.__tablename__
+        if table in MASTER_TABLES and not request.args:
+            items = await api.cached_master_read(table, 'all', versions, lambda: api.read_collection(model, args))
+            return json_response(items)
+
+        items = await api.read_collection(model, args)
+        next_cursor = None
+        if args["limit"] is not None and len(items) > args["limit"]:
+            items = items[:args["limit"]]
+            next_cursor = items[-1]["id"]
+        response = json_response(items)
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = str(next_cursor)
+            next_args = request.args.to_dict()
+            next_args["after"] = next_cursor
+            next_url = api.url_adapter.build(endpoint, dict(view_args, **next_args))
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        return response
+    except Exception as e:
+        return json_response({"error": f"Failed to fetch {resource}: {str(e)}"}, 500)
+
+
+async def get_record(api, request, endpoint, view_args, versions):
+    table = endpoint[len("api_get_"):]
+    model = RECORD_MODELS[table]
+    record_id = next(iter(view_args.values()))
+    try:
+        if table in MASTER_TABLES:
+            record = await api.cached_master_read(table, record_id, versions,
+                                                  lambda: api.read_record(model, record_id))
+        else:
+            record = await api.read_record(model, record_id)
+            if record is None and model in ARCHIVE_MODELS and request.args.get('include_archived') in ('1', 'true'):
+                record = await api.read_record(ARCHIVE_MODELS[model], record_id)
+        if not record:
+            return json_response({"error": f"{table.capitalize()} not found"}, 404)
+        return json_response(record)
+    except Exception as e:
+        return json_response({"error": f"Failed to fetch {table}: {str(e)}"}, 500)
+
+
+async def get_events(api, request, endpoint, view_args, versions):
+    try:
+        tables, since, timeout = parse_event_args(request)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        response = flask_app.response_class(mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return AsyncStream(response, stream_change_events(api, tables, since))
+
+    try:
+        if since is None:
+            # First call: hand out the current cursor to continue from
+            last_id = await api.scalar(db.select(db.func.max(ChangeEvent.id))) or 0
+            return json_response({"events": [], "last_id": last_id})
+        oldest = await api.scalar(db.select(db.func.min(ChangeEvent.id)))
+        reset = oldest is not None and since < oldest - 1
+        events = await api.wait_for_change_events(since, tables, timeout)
+        last_id = events[-1]["id"] if events else since
+        return json_response({"events": events, "last_id": last_id, "reset": reset})
+    except Exception as e:
+        return json_response({"error": f"Failed to fetch events: {str(e)}"}, 500)
+
+
+async def stream_change_events(api, tables, since):
+    last_id = since if since is not None else await api.scalar(db.select(db.func.max(ChangeEvent.id))) or 0
+    yield f"retry: 3000\nid: {last_id}\n\n"
+    while True:
+        events = await api.wait_for_change_events(last_id, tables, EVENT_HEARTBEAT)
+        if not events:
+            yield ": keep-alive\n\n"
+            continue
+        for change in events:
+            last_id = change["id"]
+            yield (f"id: {change['id']}\nevent: {change['table']}.{change['action']}\n"
+                   f"data: {flask_app.json.dumps(change)}\n\n")
+
+
+async def post_device_command(api, request, endpoint, view_args, versions):
+    try:
+        if not request.is_json:
+            return json_response({"error": "Request must be JSON"}, 400)
+
+        data = request.json
+        command_type = data.get("command")
+        parameters = data.get("parameters", {})
+        machine = parameters.get("machine", flask_app.config['DEVICE_MACHINES'][0])
+        if machine not in command_queue.machines:
+            return json_response({"error": f"Unknown machine: {machine}"}, 400)
+
+        if command_type == "start_recipe":
+            recipe_id = parameters.get("recipe_id")
+            if recipe_id is None:
+                return json_response({"error": "Missing 'recipe_id' in parameters"}, 400)
+            package = await api.run_sync(load_recipe_package, recipe_id)
+            if package is None:
+                return json_response({"error": f"Recipe id {recipe_id} not found"}, 404)
+            content, version = package
+            command_entry = Command(name="start_recipe",
+                                    description=f"Start recipe {recipe_id}: {content['description']}",
+                                    status="queued")
+            payload = {"command": "start_recipe", "package": content}
+            return await enqueue_device_command(api, command_entry, machine, payload, {
+                "recipe_detail": package_recipe_detail(content),
+                "package_version": version
+            })
+        elif command_type == "reset":
+            command_entry = Command(name="reset", description="Reset machine", status="queued")
+            return await enqueue_device_command(api, command_entry, machine, {"command": "reset"})
+        else:
+            return json_response({"error": "Unsupported command"}, 400)
+    except Exception as e:
+        return json_response({"error": f"Failed to execute command: {str(e)}"}, 500)
+
+
+async def enqueue_device_command(api, command_entry, machine, payload, extra=None):
+    # The session runs main's flush/commit listeners, so table versions, change
+    # events and subscriber wake-ups work as for writes through Flask
+    async with AsyncSession(api.engine, expire_on_commit=False) as session:
+        session.add(command_entry)
+        await session.commit()
+        command = model_to_dict(command_entry)
+        try:
+            await api.run_sync(command_queue.enqueue, machine, command_entry.id, payload)
+        except QueueFullError:
+            command_entry.status = "rejected"
+            await session.commit()
+            return json_response({"error": f"Command queue of machine '{machine}' is full",
+                                  "command_id": command_entry.id}, 503)
+
+    status_url = api.url_adapter.build('api_get_command', {'command_id': command_entry.id})
+    response = json_response(accepted_command_body(command, machine, status_url, extra), 202)
+    response.headers["Location"] = status_url
+    return response
+
+
+async def get_device_queue(api, request, endpoint, view_args, versions):
+    return json_response(await api.run_sync(command_queue.stats))
+
+
+RECORD_MODELS = {model.__tablename__: model for model in RESOURCE_MODELS.values()}
+
+ASYNC_VIEWS = dict(
+    {f"api_get_{resource}": get_collection for resource in RESOURCE_MODELS},
+    **{f"api_get_{table}": get_record for table in RECORD_MODELS},
+    api_events=get_events,
+    api_device_command=post_device_command,
+    api_device_queue=get_device_queue,
+)
+
+application = ASGIApp(flask_app, threads=int(os.environ.get("ASGI_THREADS", 32)))
+
+
+def main(argv=None):
+    import uvicorn
+
+    defaults = ServerConfig.from_env()
+    parser = argparse.ArgumentParser(description="Run the Manufacturing REST API ASGI server")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("ASGI_THREADS", 32)),
+                        help="threads per worker for routes served by the Flask app")
+    parser.add_argument("--keepalive", type=int, default=5, help="seconds an idle connection is kept open")
+    parser.add_argument("--graceful-timeout", type=float, default=defaults.graceful_timeout,
+                        help="seconds requests get to finish on shutdown")
+    parser.add_argument("--backlog", type=int, default=defaults.backlog)
+    args = parser.parse_args(argv)
+
+    # Migrate once here; workers are started as fresh processes that import this module
+    create_app()
+    os.environ["ASGI_THREADS"] = str(args.threads)
+    if args.workers > 1 and flask_app.config['BACKGROUND_TASKS']:
+        # uvicorn workers have no index to pick one by, so this supervisor
+        # process runs the history archiver and the device workers instead
+        os.environ["BACKGROUND_TASKS"] = "0"
+        history_archiver.start()
+        command_queue.start()
+    target = "asgi:application" if args.workers > 1 else ASGIApp(flask_app, threads=args.threads)
+    uvicorn.run(target, host=args.host, port=args.port, workers=args.workers, backlog=args.backlog,
+                timeout_keep_alive=args.keepalive, timeout_graceful_shutdown=args.graceful_timeout,
+                lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Performance benchmarks for the Manufacturing REST API"""
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+ASGI benchmark
+Runs the sync production server (server.py) and the ASGI app (asgi.py) on a
+seeded database while idle cells hold long-poll /api/v1/events requests open
+and other cells poll commands, jobs and the device queue, printing the
+latency percentiles of the polling requests for both.
+
+Usage: python -m benchmarks.asgi [seconds] [subscribers] [pollers] [workers] [threads]
+"""
+
+import sys
+import threading
+
+from benchmarks.serving import free_port, run_load, seed, start_server, stop_server
+
+# Long-polls on setups, which nothing writes, wait for their full timeout
+SUBSCRIBE = [("GET", "/api/v1/events?since=0&tables=setup&timeout=2", None)]
+POLL = [
+    ("GET", "/api/v1/commands/1", None),
+    ("GET", "/api/v1/jobs?status=pending&limit=20", None),
+    ("GET", "/api/v1/device/queue", None),
+    ("GET", "/api/v1/recipes/42", None),
+    ("POST", "/api/v1/device/commands", {"command": "reset"}),
+]
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    subscribers = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    pollers = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    workers = sys.argv[4] if len(sys.argv) > 4 else "1"
+    threads = sys.argv[5] if len(sys.argv) > 5 else "32"
+    seed()
+
+    port = free_port()
+    servers = {
+        f"sync {workers}x{threads}": [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port),
+                                      "--workers", workers, "--threads", threads],
+        f"asgi {workers}x{threads}": [sys.executable, "asgi.py", "--host", "127.0.0.1", "--port", str(port),
+                                      "--workers", workers, "--threads", threads],
+    }
+    print(f"{seconds:g}s, {subscribers} long-poll subscribers, {pollers} polling connections\n")
+    for name, command in servers.items():
+        process = start_server(command, port)
+        results = {}
+        try:
+            background = threading.Thread(target=lambda: results.update(
+                subscribers=run_load(port, SUBSCRIBE, subscribers, seconds)))
+            background.start()
+            results["pollers"] = run_load(port, POLL, pollers, seconds)
+            background.join()
+        finally:
+            stop_server(process)
+        polled, subscribed = results["pollers"], results["subscribers"]
+        print(f"{name:<14} polls/s {polled['requests_per_second']:>8}  p50 {polled['p50_ms']:>8} ms"
+              f"  p99 {polled['p99_ms']:>9} ms  errors {polled['errors']:>5}"
+              f"  | long-polls {subscribed['requests']:>6}  errors {subscribed['errors']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset
+Fills the schema with a given total number of rows in the proportions of a
+production line: a catalogue of contacts, wires and processes, recipes that
+use popular parts more often than others, setups and a long job and command
+history. Rows are generated as they are written by the bulk loader of
+populate_db.py.
+
+Usage: python -m benchmarks.dataset [rows] [seed]
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from main import app, db, Contact, Wire, Process, Recipe, Job, Setup, Command
+from populate_db import bulk_load, report
+
+# Share of the total row count per table, parents before children
+RATIOS = {
+    Contact: 0.02,
+    Wire: 0.01,
+    Process: 0.005,
+    Recipe: 0.15,
+    Setup: 0.005,
+    Job: 0.2,
+    Command: 0.61,
+}
+JOB_STATUSES = ("completed",) * 90 + ("failed",) * 4 + ("pending",) * 4 + ("running",) * 2
+COMMAND_STATUSES = ("completed",) * 93 + ("failed",) * 3 + ("rejected",) + ("queued",) * 2 + ("executing",)
+COMMAND_NAMES = ("start_recipe",) * 8 + ("reset", "Start Process")
+WIRE_TYPES = ("Standard copper wire", "Shielded wire", "Flexible wire", "High voltage wire", "Tinned wire")
+CROSS_SECTIONS = (0.35, 0.5, 0.75, 1.0, 1.5, 2.5, 4.0, 6.0)
+COLORS = ("red", "blue", "green", "black", "white", "yellow", "brown", "violet")
+HISTORY_DAYS = 180
+
+
+def table_counts(rows):
+    """Number of rows per model for a dataset of about rows rows"""
+    return {model: max(1, round(rows * ratio)) for model, ratio in RATIOS.items()}
+
+
+def pick(rng, count):
+    # Low ids are picked far more often, like a catalogue's common parts
+    return int(count * rng.random() ** 2) + 1
+
+
+def generate_rows(model, count, counts, rng):
+    """Yield count row dicts for model; foreign keys point into counts"""
+    now = datetime.now(pytz.timezone("Europe/Berlin"))
+    history_step = timedelta(days=HISTORY_DAYS) / count
+    for i in range(1, count + 1):
+        if model is Contact:
+            row = {"Description": f"Contact {i}", "Diameter": f"{rng.uniform(0.5, 6):.2f}",
+                   "Insertdepth": f"{rng.uniform(2, 30):.2f}", "Name": f"ZF{i:07d}",
+                   "ZF_ContNumb": f"{rng.randint(1, 9)}.{rng.randint(100, 999)}"}
+        elif model is Wire:
+            cross_section = rng.choice(CROSS_SECTIONS)
+            row = {"name": f"W{i:07d}", "description": rng.choice(WIRE_TYPES),
+                   "cross_section": f"{cross_section} mm²",
+                   "isolation_diameter": f"{1 + cross_section * 0.4:.1f} mm",
+                   "wire_diameter": f"{0.6 + cross_section * 0.3:.1f} mm", "color": rng.choice(COLORS)}
+        elif model is Process:
+            row = {"name": f"P{i:07d}", "crimping_depth_d": f"{rng.uniform(0.8, 2.0):.2f}",
+                   "crimping_depth_offset_d": f"{rng.uniform(-0.5, 0.5):.2f}",
+                   "holding_value_delta_d": f"{rng.uniform(0, 0.1):.3f}",
+                   "insertion_depth_delta_d": f"{rng.uniform(0, 0.2):.3f}",
+                   "sf_performance_d": str(rng.randint(85, 99)), "sf_frequence_d": f"{rng.choice((45, 50, 60))}Hz",
+                   "extendable_feeder_tuble_s": rng.choice(("yes", "no")),
+                   "loading_holding_jaws_s": rng.choice(("light", "standard", "medium", "heavy")),
+                   "catact_monitoring_s": rng.choice(("enabled", "disabled")),
+                   "wayback_d": f"{rng.uniform(2, 5):.1f}", "stripping_position": rng.choice(("front", "rear")),
+                   "stripping_function": rng.choice(("auto", "manual")),
+                   "crimping_position_monitoring": rng.choice(("enabled", "disabled"))}
+        elif model is Recipe:
+            row = {"description": f"Assembly {i}", "contact_id": pick(rng, counts[Contact]),
+                   "wire_id": pick(rng, counts[Wire]), "process_id": pick(rng, counts[Process])}
+        elif model is Setup:
+            row = {"name": f"Setup {i}", "description": f"Line setup {i}",
+                   "status": "active" if rng.random() < 0.8 else "inactive"}
+        elif model is Job:
+            row = {"name": f"Job {i}", "status": rng.choice(JOB_STATUSES),
+                   "created_at": (now - history_step * (count - i)).isoformat()}
+        else:
+            name = rng.choice(COMMAND_NAMES)
+            recipe_id = pick(rng, counts[Recipe])
+            row = {"name": name, "description": f"Start recipe {recipe_id}" if name == "start_recipe" else name,
+                   "status": rng.choice(COMMAND_STATUSES),
+                   "created_at": (now - history_step * (count - i)).isoformat()}
+        yield row
+
+
+def fill(rows, seed=0):
+    """Add a dataset of about rows rows to an empty database; returns {table: (rows, seconds)}"""
+    rng = random.Random(seed)
+    counts = table_counts(rows)
+    loaded = bulk_load({model: generate_rows(model, count, counts, rng) for model, count in counts.items()},
+                       replace=False)
+    with app.app_context():
+        db.engine.dispose()
+    return loaded
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    started = time.perf_counter()
+    loaded = fill(rows, seed)
+    report(loaded, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Index benchmark
+Fills a fresh database with recipes and commands, drops the secondary
+indexes to mimic a database created before migration 0001, times the hot
+lookups, applies the migration and times them again.
+
+Usage: python -m benchmarks.indexes [recipes] [commands]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'indexes.db')}")
+
+from main import (app, db, Contact, Wire, Process, Recipe, Command,
+                  SchemaMigration, DERIVED_FIELDS, init_database, run_migrations)
+
+CONTACTS, WIRES, PROCESSES = 2000, 500, 200
+STATUSES = ("completed",) * 97 + ("pending", "executing", "failed")
+
+
+def seed(recipes, commands):
+    process_values = {column.key: "1.0" for column in Process.__table__.columns
+                      if column.key not in ("id", "name") and column.key not in DERIVED_FIELDS[Process]}
+    db.session.execute(db.insert(Contact), [
+        {"Description": "Contact", "Diameter": "1.0", "Insertdepth": "2.0",
+         "Name": f"ZF{i:07d}", "ZF_ContNumb": "1.1"} for i in range(CONTACTS)])
+    db.session.execute(db.insert(Wire), [
+        {"name": f"W{i:07d}", "description": "Copper wire", "cross_section": "0.5 mm²",
+         "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"} for i in range(WIRES)])
+    db.session.execute(db.insert(Process), [dict(process_values, name=f"P{i:07d}") for i in range(PROCESSES)])
+    db.session.execute(db.insert(Recipe), [
+        {"description": f"Assembly {i}", "contact_id": i % CONTACTS + 1,
+         "wire_id": i % WIRES + 1, "process_id": i % PROCESSES + 1} for i in range(recipes)])
+    db.session.execute(db.insert(Command), [
+        {"name": "start_recipe", "description": f"Start recipe {i}", "status": STATUSES[i % len(STATUSES)]}
+        for i in range(commands)])
+    db.session.commit()
+
+
+def drop_secondary_indexes():
+    for model in (Recipe, Command):
+        for index in model.__table__.indexes:
+            index.drop(db.engine, checkfirst=True)
+    db.session.execute(db.delete(SchemaMigration))
+    db.session.commit()
+
+
+def timed(label, func, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {label:<48} {elapsed * 1000:9.3f} ms")
+    return elapsed
+
+
+def run_queries(client):
+    queries = [
+        ("recipes of a contact (delete cascade)", 50,
+         lambda i: db.session.execute(db.select(Recipe.id).where(Recipe.contact_id == i % CONTACTS + 1)).all()),
+        ("recipes of a process", 50,
+         lambda i: db.session.execute(db.select(Recipe.id).where(Recipe.process_id == i % PROCESSES + 1)).all()),
+        ("GET /api/v1/commands?status=pending&limit=100", 20,
+         lambda i: client.get("/api/v1/commands?status=pending&limit=100")),
+        ("count commands by status", 20,
+         lambda i: db.session.execute(db.select(db.func.count()).select_from(Command)
+                                      .where(Command.status == "failed")).scalar()),
+    ]
+    results = {label: timed(label, func, repeat) for label, repeat, func in queries}
+    db.session.rollback()
+    return results
+
+
+def main():
+    recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    init_database()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(recipes, commands)
+        drop_secondary_indexes()
+        client = app.test_client()
+
+        print(f"{recipes} recipes, {commands} commands\n\nwithout secondary indexes:")
+        before = run_queries(client)
+        run_migrations()
+        print("\nafter migration 0001_hot_path_indexes:")
+        after = run_queries(client)
+
+        print("\nspeed-up:")
+        for label in before:
+            print(f"  {label:<48} {before[label] / after[label]:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Search benchmark
+Fills a fresh database with recipes and their contacts, wires and processes
+and times the search endpoints, printing the SQLite query plan of each.
+
+Usage: python -m benchmarks.search [recipes]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'search.db')}")
+
+from sqlalchemy import event
+
+from main import app, db, init_database, Contact, Wire, Process, Recipe
+
+COLORS = ("red", "blue", "black", "green", "yellow", "white", "brown", "grey")
+BATCH = 50000
+
+
+def seed(recipes):
+    contacts, wires, processes = max(recipes // 10, 1), max(recipes // 100, 1), max(recipes // 100, 1)
+    for start in range(0, contacts, BATCH):
+        db.session.execute(db.insert(Contact), [
+            {"Description": "Contact", "Diameter": f"{1 + i % 20}.0", "Diameter_value": 1.0 + i % 20,
+             "Insertdepth": "2.0", "Insertdepth_value": 2.0,
+             "Name": f"ZF{i:07d}", "ZF_ContNumb": "1.1"} for i in range(start, min(start + BATCH, contacts))])
+    db.session.execute(db.insert(Wire), [
+        {"name": f"W{i:07d}", "description": "Copper wire", "cross_section": f"{0.25 * (1 + i % 16)} mm²",
+         "cross_section_value": 0.25 * (1 + i % 16), "cross_section_unit": "mm²",
+         "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": COLORS[i % len(COLORS)]}
+        for i in range(wires)])
+    process_values = {"crimping_depth_offset_d": "0.2", "holding_value_delta_d": "0.05",
+                      "insertion_depth_delta_d": "0.1", "sf_performance_d": "95", "sf_frequence_d": "60Hz",
+                      "extendable_feeder_tuble_s": "yes", "loading_holding_jaws_s": "standard",
+                      "catact_monitoring_s": "enabled", "wayback_d": "3.5", "stripping_position": "front",
+                      "stripping_function": "auto", "crimping_position_monitoring": "enabled"}
+    db.session.execute(db.insert(Process), [
+        dict(process_values, name=f"P{i:07d}", crimping_depth_d=f"{0.5 + (i % 100) / 50:.2f}",
+             crimping_depth_d_value=round(0.5 + (i % 100) / 50, 2)) for i in range(processes)])
+    for start in range(0, recipes, BATCH):
+        db.session.execute(db.insert(Recipe), [
+            {"description": f"Assembly {i}", "contact_id": i % contacts + 1,
+             "wire_id": i % wires + 1, "process_id": i % processes + 1}
+            for i in range(start, min(start + BATCH, recipes))])
+    db.session.commit()
+
+
+def explain(statement, parameters):
+    plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in plan]
+
+
+def timed(client, url, repeat=50):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "table_version" not in statement:
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    response = client.get(url)
+    event.remove(db.engine, "before_cursor_execute", capture)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        client.get(url)
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {url:<78} {elapsed * 1000:8.3f} ms  {len(response.get_json()):>4} rows")
+    for statement, parameters in statements:
+        for step in explain(statement, parameters):
+            print(f"      {step}")
+
+
+def main():
+    recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    init_database()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(recipes)
+        client = app.test_client()
+        print(f"{recipes} recipes\n")
+        for url in (
+            "/api/v1/contacts/search?name=ZF00012*",
+            "/api/v1/contacts/search?Diameter_min=5&Diameter_max=5.5&limit=20",
+            "/api/v1/wires/search?cross_section_min=0.5&cross_section_max=1.0&color=blue",
+            "/api/v1/processes/search?crimping_depth_d_min=1.0&crimping_depth_d_max=1.1",
+            "/api/v1/recipes/search?contact_name=ZF00012*",
+            "/api/v1/recipes/search?wire_name=W000042*&limit=20",
+            "/api/v1/recipes/search?process_crimping_depth_d_min=1.0&process_crimping_depth_d_max=1.02&limit=20",
+        ):
+            timed(client, url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Serializer micro-benchmark
+Compares the reflective model_to_dict/recipe_to_dict of v1.0 with the
+column-cached serializers and the plain column-tuple path used by the API.
+
+Usage: python -m benchmarks.serializers [rows]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from main import (app, db, init_database, Contact, Wire, Process, Recipe, RECIPE_EAGER_LOAD,
+                  model_to_dict, recipe_to_dict, select_recipe_rows, recipe_row_to_dict)
+
+
+def legacy_model_to_dict(obj):
+    """model_to_dict as shipped in v1.0"""
+    if obj is None:
+        return None
+    result = {}
+    for column in obj.__table__.columns:
+        result[column.name] = getattr(obj, column.name)
+    return result
+
+
+def legacy_recipe_to_dict(recipe):
+    """recipe_to_dict as shipped in v1.0"""
+    if recipe is None:
+        return None
+    return {
+        'id': recipe.id,
+        'description': recipe.description,
+        'contact_id': recipe.contact_id,
+        'wire_id': recipe.wire_id,
+        'process_id': recipe.process_id,
+        'contact': legacy_model_to_dict(recipe.contact),
+        'wire': legacy_model_to_dict(recipe.wire),
+        'process': legacy_model_to_dict(recipe.process)
+    }
+
+
+def seed(rows):
+    process_values = {column.key: "1.0" for column in Process.__table__.columns if column.key not in ("id", "name")}
+    db.session.execute(db.insert(Contact), [
+        {"Description": f"Contact {i}", "Diameter": "1.0", "Insertdepth": "2.0",
+         "Name": f"ZF{i:07d}", "ZF_ContNumb": "1.1"} for i in range(rows)])
+    db.session.execute(db.insert(Wire), [
+        {"name": f"W{i:07d}", "description": "Copper wire", "cross_section": "0.5 mm²",
+         "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"} for i in range(rows)])
+    db.session.execute(db.insert(Process), [dict(process_values, name=f"P{i:07d}") for i in range(rows)])
+    db.session.execute(db.insert(Recipe), [
+        {"description": f"Assembly {i}", "contact_id": i + 1, "wire_id": i + 1, "process_id": i + 1}
+        for i in range(rows)])
+    db.session.commit()
+
+
+def timed(label, func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        count = len(func())
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<45} {best * 1000:9.1f} ms  ({count} rows)")
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    init_database()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(rows)
+
+        print(f"Serializing {rows} rows (best of 3, including the query)\n")
+        load = lambda: db.session.execute(db.select(Process).order_by(Process.id)).scalars().all()
+        timed("process: legacy model_to_dict", lambda: [legacy_model_to_dict(p) for p in load()])
+        timed("process: cached model_to_dict", lambda: [model_to_dict(p) for p in load()])
+
+        def process_rows():
+            result = db.session.execute(db.select(*Process.__table__.columns).order_by(Process.id))
+            names = tuple(result.keys())
+            return [dict(zip(names, row)) for row in result]
+        timed("process: column tuples", process_rows)
+
+        print()
+        lazy = lambda: db.session.execute(db.select(Recipe).order_by(Recipe.id)).scalars().all()
+        eager = lambda: db.session.execute(
+            db.select(Recipe).options(*RECIPE_EAGER_LOAD).order_by(Recipe.id)).scalars().all()
+        timed("recipe: legacy recipe_to_dict (lazy loads)", lambda: [legacy_recipe_to_dict(r) for r in lazy()])
+        timed("recipe: legacy recipe_to_dict (eager)", lambda: [legacy_recipe_to_dict(r) for r in eager()])
+        timed("recipe: cached recipe_to_dict (eager)", lambda: [recipe_to_dict(r) for r in eager()])
+        timed("recipe: joined column tuples", lambda: [
+            recipe_row_to_dict(row) for row in db.session.execute(select_recipe_rows().order_by(Recipe.id))])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Serving benchmark
+Starts the Werkzeug debug server (as "python main.py" runs it, without the
+reloader) and the production server from server.py on a seeded database and
+drives both over HTTP with the same concurrent read/write mix, printing
+throughput and latency percentiles.
+
+Usage: python -m benchmarks.serving [seconds] [connections] [workers] [threads]
+"""
+
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'serving.db')}")
+
+from main import app, db, create_app, Contact, Wire, Process, Recipe, DERIVED_FIELDS
+
+RECIPES = 2000
+
+# (method, path, body) mix sent by every connection in turn
+REQUESTS = [
+    ("GET", "/api/v1/wires?limit=100", None),
+    ("GET", "/api/v1/recipes?limit=50", None),
+    ("GET", "/api/v1/recipes/42", None),
+    ("GET", "/api/v1/contacts/search?name=ZF00012*", None),
+    ("GET", "/api/v1/stats", None),
+    ("GET", "/api/v1/jobs?limit=20", None),
+    ("POST", "/api/v1/jobs", {"name": "benchmark job"}),
+]
+
+
+def seed():
+    process_values = {column.key: "1.0" for column in Process.__table__.columns
+                      if column.key not in ("id", "name") and column.key not in DERIVED_FIELDS[Process]}
+    create_app()
+    with app.app_context():
+        db.session.execute(db.insert(Contact), [
+            {"Description": "Contact", "Diameter": "1.0", "Insertdepth": "2.0",
+             "Name": f"ZF{i:05d}", "ZF_ContNumb": "1.1"} for i in range(RECIPES)])
+        db.session.execute(db.insert(Wire), [
+            {"name": f"W{i:05d}", "description": "Copper wire", "cross_section": "0.5 mm²",
+             "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"} for i in range(RECIPES)])
+        db.session.execute(db.insert(Process), [dict(process_values, name=f"P{i:05d}") for i in range(RECIPES)])
+        db.session.execute(db.insert(Recipe), [
+            {"description": f"Assembly {i}", "contact_id": i + 1, "wire_id": i + 1, "process_id": i + 1}
+            for i in range(RECIPES)])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def start_server(command, port, timeout=30):
+    """Start a server subprocess and wait until it accepts connections"""
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f"{command[0]} exited with status {process.returncode}")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=40)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def client_process(port, requests, connections, seconds, results, host="127.0.0.1"):
+    """Send requests over connections threads until seconds have passed"""
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def connection(offset):
+        local, failed, step = [], 0, offset
+        while time.perf_counter() < deadline:
+            method, path, body = requests[step % len(requests)]
+            step += 1
+            started = time.perf_counter()
+            try:
+                client = http.client.HTTPConnection(host, port, timeout=30)
+                client.request(method, path, body=json.dumps(body) if body is not None else None,
+                               headers={"Content-Type": "application/json"})
+                response = client.getresponse()
+                response.read()
+                client.close()
+                if response.status >= 400:
+                    failed += 1
+                    continue
+            except OSError:
+                failed += 1
+                continue
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=connection, args=(n,)) for n in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, errors[0]))
+
+
+def run_load(port, requests, connections, seconds, processes=None, host="127.0.0.1"):
+    """Drive the server on host:port from several client processes; returns a summary dict"""
+    processes = min(processes or os.cpu_count() or 1, connections)
+    context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+    results = context.Queue()
+    clients = [context.Process(target=client_process,
+                               args=(port, requests, connections // processes + (n < connections % processes),
+                                     seconds, results, host))
+               for n in range(processes)]
+    for client in clients:
+        client.start()
+    latencies, errors = [], 0
+    for _ in clients:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for client in clients:
+        client.join()
+    return summarize(latencies, errors, seconds)
+
+
+def summarize(latencies, errors, seconds):
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return None
+        return round(latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] * 1000, 2)
+
+    return {"requests": len(latencies), "errors": errors,
+            "requests_per_second": round(len(latencies) / seconds, 1),
+            "p50_ms": percentile(0.50), "p90_ms": percentile(0.90), "p99_ms": percentile(0.99)}
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    workers = sys.argv[3] if len(sys.argv) > 3 else str(os.cpu_count() or 1)
+    threads = sys.argv[4] if len(sys.argv) > 4 else "8"
+    seed()
+
+    port = free_port()
+    servers = {
+        "debug": [sys.executable, "-c",
+                  "from main import create_app; "
+                  f"create_app().run(debug=True, use_reloader=False, host='127.0.0.1', port={port})"],
+        f"server.py {workers}x{threads}": [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port),
+                                            "--workers", workers, "--threads", threads],
+    }
+    print(f"{seconds:g}s, {connections} concurrent connections, {RECIPES} recipes\n")
+    for name, command in servers.items():
+        process = start_server(command, port)
+        try:
+            result = run_load(port, REQUESTS, connections, seconds)
+        finally:
+            stop_server(process)
+        print(f"{name:<18} req/s {result['requests_per_second']:>8}  p50 {result['p50_ms']:>7} ms"
+              f"  p90 {result['p90_ms']:>7} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']:>5}")
+
+
+if __name__ == "__main__":
+    main()
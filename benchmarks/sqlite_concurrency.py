@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrency benchmark
+Measures API read throughput while writers keep inserting jobs, once per
+SQLite engine profile. Each profile runs in its own process against a fresh
+database file because the profile is applied when main is imported.
+
+Usage: python -m benchmarks.sqlite_concurrency [seconds] [readers] [writers]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = ("default", "production")
+
+
+def run_profile(seconds, readers, writers):
+    from main import app, db, create_app, Wire
+
+    create_app()
+    with app.app_context():
+        db.session.execute(db.insert(Wire), [
+            {"name": f"W{i:06d}", "description": "Copper wire", "cross_section": "0.5 mm²",
+             "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"}
+            for i in range(5000)])
+        db.session.commit()
+
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = client.get("/api/v1/wires?limit=200&color=red")
+            with lock:
+                counts["reads" if response.status_code == 200 else "read_errors"] += 1
+
+    def writer(number):
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = client.post("/api/v1/jobs", json={"name": f"writer {number}"})
+            with lock:
+                counts["writes" if response.status_code == 201 else "write_errors"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    counts["reads_per_second"] = round(counts["reads"] / seconds, 1)
+    counts["writes_per_second"] = round(counts["writes"] / seconds, 1)
+    print(json.dumps(counts))
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run_profile(float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    seconds = sys.argv[1] if len(sys.argv) > 1 else "5"
+    readers = sys.argv[2] if len(sys.argv) > 2 else "4"
+    writers = sys.argv[3] if len(sys.argv) > 3 else "2"
+    print(f"{seconds}s, {readers} reader threads, {writers} writer threads\n")
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(os.environ, SQLITE_PROFILE=profile,
+                       DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}")
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.sqlite_concurrency", "--run", seconds, readers, writers],
+                env=env, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{profile:<12} reads/s {result['reads_per_second']:>8}  writes/s {result['writes_per_second']:>8}"
+                  f"  read errors {result['read_errors']:>5}  write errors {result['write_errors']:>5}")
+
+
+if __name__ == "__main__":
+    main()
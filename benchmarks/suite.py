@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite
+Fills a fresh database with the synthetic dataset (benchmarks.dataset) and
+runs scripted scenarios - list reads, recipe detail, device command bursts
+and a mixed read/write workload - in process through the Flask test client
+and over HTTP against server.py, or against a server that is already
+running. Prints throughput and latency percentiles per scenario as JSON so
+runs can be saved and compared.
+
+Usage: python -m benchmarks.suite [--rows N] [--seconds S] [--mode inprocess|server|both]
+                                  [--scenarios a,b] [--connections N] [--workers N] [--threads N]
+                                  [--url http://host:port] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+directory = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(directory, 'suite.db')}")
+# Device commands complete at once and never fill the queue; no archiving mid-run
+os.environ.setdefault("DEVICE_SIMULATOR_DELAY", "0")
+os.environ.setdefault("DEVICE_QUEUE_SIZE", "1000000")
+os.environ.setdefault("ARCHIVE_INTERVAL", "0")
+
+from benchmarks.dataset import fill, table_counts
+from benchmarks.serving import free_port, run_load, start_server, stop_server, summarize
+from main import app, Contact, Recipe, Job, Command
+
+# Requests generated per scenario; connections cycle through them
+SCRIPT_LENGTH = 1000
+
+
+def list_reads(counts, rng):
+    recipes, contacts, jobs = counts[Recipe], counts[Contact], counts[Job]
+    return [rng.choice((
+        ("GET", f"/api/v1/recipes?limit=50&after={rng.randrange(recipes)}", None),
+        ("GET", f"/api/v1/contacts?limit=100&after={rng.randrange(contacts)}", None),
+        ("GET", "/api/v1/jobs?status=pending&limit=50", None),
+        ("GET", f"/api/v1/jobs?limit=100&after={rng.randrange(jobs)}", None),
+        ("GET", f"/api/v1/contacts/search?name=ZF{rng.randrange(contacts) // 100:05d}*", None),
+    )) for _ in range(SCRIPT_LENGTH)]
+
+
+def recipe_detail(counts, rng):
+    return [("GET", f"/api/v1/recipes/{rng.randint(1, counts[Recipe])}" + rng.choice(("", "/package")), None)
+            for _ in range(SCRIPT_LENGTH)]
+
+
+def device_command_burst(counts, rng):
+    return [("POST", "/api/v1/device/commands",
+             {"command": "start_recipe", "parameters": {"recipe_id": rng.randint(1, counts[Recipe])}}
+             if rng.random() < 0.9 else {"command": "reset"})
+            for _ in range(SCRIPT_LENGTH)]
+
+
+def mixed_read_write(counts, rng):
+    reads = list_reads(counts, rng) + recipe_detail(counts, rng)
+    script = []
+    for i in range(SCRIPT_LENGTH):
+        roll = rng.random()
+        if roll < 0.1:
+            script.append(("POST", "/api/v1/jobs", {"name": f"Benchmark job {i}"}))
+        elif roll < 0.2:
+            script.append(("PUT", f"/api/v1/jobs/{rng.randint(1, counts[Job])}",
+                           {"status": rng.choice(("running", "completed"))}))
+        elif roll < 0.3:
+            script.append(("PUT", f"/api/v1/commands/{rng.randint(1, counts[Command])}", {"status": "completed"}))
+        else:
+            script.append(rng.choice(reads))
+    return script
+
+
+SCENARIOS = {
+    "list_reads": list_reads,
+    "recipe_detail": recipe_detail,
+    "device_command_burst": device_command_burst,
+    "mixed_read_write": mixed_read_write,
+}
+
+
+def run_in_process(requests, seconds):
+    """Send requests through the Flask test client, one at a time, for seconds"""
+    client = app.test_client()
+    latencies, errors, step = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        method, path, body = requests[step % len(requests)]
+        step += 1
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        if response.status_code >= 400:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return summarize(latencies, errors, seconds)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark scenarios and print the results as JSON")
+    parser.add_argument("--rows", type=int, default=10000, help="dataset size, e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each scenario run")
+    parser.add_argument("--mode", choices=("inprocess", "server", "both"), default="both")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent HTTP connections")
+    parser.add_argument("--workers", default="1", help="server.py worker processes")
+    parser.add_argument("--threads", default="8", help="server.py threads per worker")
+    parser.add_argument("--url", help="benchmark this running server (filled with benchmarks.dataset "
+                                      "and --rows rows) instead of starting server.py")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    counts = table_counts(args.rows)
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "dataset": {"tables": {model.__tablename__: count for model, count in counts.items()}},
+        "results": {},
+    }
+
+    if args.url is None:
+        started = time.perf_counter()
+        fill(args.rows, args.seed)
+        report["dataset"]["fill_seconds"] = round(time.perf_counter() - started, 2)
+    modes = ("inprocess", "server") if args.mode == "both" else (args.mode,)
+    if args.url is not None:
+        modes = ("server",)
+
+    for mode in modes:
+        results = report["results"][mode] = {}
+        process = None
+        if mode == "server":
+            if args.url is not None:
+                address = urlsplit(args.url)
+                host, port = address.hostname, address.port or 80
+            else:
+                host, port = "127.0.0.1", free_port()
+                process = start_server([sys.executable, "server.py", "--host", host, "--port", str(port),
+                                        "--workers", args.workers, "--threads", args.threads], port)
+        try:
+            for name in args.scenarios.split(","):
+                # The same script for both modes
+                requests = SCENARIOS[name](counts, random.Random(args.seed))
+                if mode == "inprocess":
+                    results[name] = run_in_process(requests, args.seconds)
+                else:
+                    results[name] = run_load(port, requests, args.connections, args.seconds, host=host)
+                print(f"{mode:<9} {name:<22} {results[name]['requests_per_second']:>8} req/s"
+                      f"  p50 {results[name]['p50_ms']} ms  p99 {results[name]['p99_ms']} ms", file=sys.stderr)
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as results_file:
+            results_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Device command queue
+Commands are queued per machine in a store shared by all server processes
+and executed by one worker thread per machine through a pluggable machine
+driver, so dispatch never blocks a request.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a machine queue has reached its maximum depth"""
+
+
+class UnknownMachineError(Exception):
+    """Raised when a command targets a machine that has no worker"""
+
+
+class MachineDriver:
+    """Interface for machine drivers
+
+    dispatch() runs in the machine's worker thread and must block until the
+    machine has accepted or finished the command. Raising marks it failed.
+    """
+
+    def dispatch(self, machine, command):
+        raise NotImplementedError
+
+
+class SimulatedMachineDriver(MachineDriver):
+    """Local stand-in for a real machine: waits and reports success"""
+
+    def __init__(self, delay=0.5):
+        self.delay = delay
+
+    def dispatch(self, machine, command):
+        if self.delay:
+            time.sleep(self.delay)
+        return {"machine": machine, "result": "simulated"}
+
+
+def load_driver(spec, simulator_delay=0.5):
+    """Return a driver for "simulator" or a "package.module:ClassName" spec"""
+    if spec == "simulator":
+        return SimulatedMachineDriver(delay=simulator_delay)
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class CommandStore:
+    """Interface for the storage of queued commands
+
+    Every server process enqueues into the same store; only the process that
+    started the CommandQueue claims from it.
+    """
+
+    def put(self, machine, command_id, command, maxsize):
+        """Queue a command; raises QueueFullError when maxsize are queued for the machine"""
+        raise NotImplementedError
+
+    def claim(self, machine):
+        """Take the oldest queued command of a machine: (command_id, command, enqueued_at) or None"""
+        raise NotImplementedError
+
+    def done(self, command_id):
+        """Forget a claimed command once it has been dispatched"""
+        raise NotImplementedError
+
+    def depth(self, machine):
+        raise NotImplementedError
+
+    def recover(self, machines):
+        """Prepare the store for a new dispatcher after a restart or crash
+
+        Commands claimed but not yet started go back to the queue. Returns the
+        ids of commands that can not be resumed: those that were executing
+        and those queued for machines that are no longer configured.
+        """
+        raise NotImplementedError
+
+
+class LatencyStats:
+    """Rolling window of latency samples in seconds"""
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(fraction):
+            return round(samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000, 3)
+
+        return {"count": len(samples), "p50_ms": percentile(0.5),
+                "p95_ms": percentile(0.95), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+class CommandQueue:
+    """Per-machine FIFO queues drained by one worker thread per machine
+
+    Any process can enqueue() into the shared store, but only the one process
+    that calls start() runs the workers, so each machine receives one command
+    at a time. Workers pick up commands enqueued here at once and those of
+    other processes within poll_interval seconds (never when it is 0, for a
+    single process). on_status(command_id,
+    status) is called from the worker threads whenever a command moves to
+    "executing", "completed" or "failed".
+    """
+
+    def __init__(self, machines, driver, store, on_status, maxsize=1000, poll_interval=0.2):
+        self.machines = tuple(machines)
+        self.driver = driver
+        self.store = store
+        self.on_status = on_status
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self._wakeups = {machine: threading.Event() for machine in self.machines}
+        self._idle = threading.Condition()
+        self._busy = set()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._counters = {"enqueued": 0, "completed": 0, "failed": 0, "rejected": 0, "recovered_failed": 0}
+        self.wait_latency = LatencyStats()
+        self.dispatch_latency = LatencyStats()
+
+    def start(self):
+        """Start the worker threads once; call it in one process per database"""
+        with self._lock:
+            if self._workers:
+                return
+            # Commands interrupted by the previous dispatcher; the queued ones are picked up below
+            for command_id in self.store.recover(self.machines):
+                logger.warning("Device command %s was interrupted by a restart and is marked failed", command_id)
+                try:
+                    self.on_status(command_id, "failed")
+                except Exception:
+                    logger.exception("Could not mark device command %s failed", command_id)
+                self._counters["recovered_failed"] += 1
+            for machine in self.machines:
+                worker = threading.Thread(target=self._run, args=(machine,),
+                                          name=f"device-worker-{machine}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def configure(self, machines, driver):
+        """Replace the machines and the driver; only possible before start()"""
+        with self._lock:
+            if self._workers:
+                raise RuntimeError("The device workers are already running")
+            self.machines = tuple(machines)
+            self.driver = driver
+            self._wakeups = {machine: threading.Event() for machine in self.machines}
+
+    def enqueue(self, machine, command_id, command):
+        if machine not in self._wakeups:
+            raise UnknownMachineError(machine)
+        try:
+            self.store.put(machine, command_id, command, self.maxsize)
+        except QueueFullError:
+            self._count("rejected")
+            raise
+        self._count("enqueued")
+        self._wakeups[machine].set()
+
+    def join(self):
+        """Block until the workers of this process have emptied every machine queue"""
+        with self._idle:
+            self._idle.wait_for(lambda: not self._busy and all(self.store.depth(machine) == 0
+                                                               for machine in self.machines))
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        return dict(counters,
+                    depth={machine: self.store.depth(machine) for machine in self.machines},
+                    workers=len(self._workers),
+                    wait_latency=self.wait_latency.summary(),
+                    dispatch_latency=self.dispatch_latency.summary())
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _run(self, machine):
+        wakeup = self._wakeups[machine]
+        while True:
+            wakeup.clear()
+            try:
+                entry = self.store.claim(machine)
+            except Exception:
+                logger.exception("Could not claim the next command for machine %s", machine)
+                entry = None
+            if entry is None:
+                with self._idle:
+                    self._idle.notify_all()
+                wakeup.wait(self.poll_interval if self.poll_interval > 0 else None)
+                continue
+            command_id, command, enqueued_at = entry
+            with self._idle:
+                self._busy.add(machine)
+            try:
+                # enqueued_at is wall-clock time, set by whichever process queued the command
+                self.wait_latency.add(max(0.0, time.time() - enqueued_at))
+                self.on_status(command_id, "executing")
+                started_at = time.perf_counter()
+                try:
+                    self.driver.dispatch(machine, command)
+                    status = "completed"
+                except Exception:
+                    status = "failed"
+                self.dispatch_latency.add(time.perf_counter() - started_at)
+                self._count(status)
+                self.on_status(command_id, status)
+            except Exception:
+                # A failed status update must not kill the machine's worker
+                logger.exception("Device command %s could not be dispatched", command_id)
+                self._count("failed")
+                try:
+                    self.on_status(command_id, "failed")
+                except Exception:
+                    logger.exception("Could not mark device command %s failed", command_id)
+            finally:
+                try:
+                    self.store.done(command_id)
+                finally:
+                    with self._idle:
+                        self._busy.discard(machine)
+                        self._idle.notify_all()
@@ -0,0 +1,72 @@
+"""
+Wake-up primitive for change event subscribers
+"""
+
+import asyncio
+import threading
+
+
+class ChangeNotifier:
+    """Lets any number of idle subscribers sleep until the next commit
+
+    notify() is called after a transaction that wrote change events commits;
+    wait() returns as soon as that happens or when the timeout expires.
+    wait_async() does the same for coroutines; notify() may be called from
+    any thread or event loop.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+        self._waiting = 0
+        self._async_waiters = set()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, generation, timeout):
+        """Wait until notify() has been called after generation was read"""
+        with self._condition:
+            self._waiting += 1
+            try:
+                return self._condition.wait_for(lambda: self._generation != generation, timeout)
+            finally:
+                self._waiting -= 1
+
+    async def wait_async(self, generation, timeout):
+        """Coroutine version of wait()"""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._generation != generation:
+                return True
+            self._async_waiters.add(waiter)
+            self._waiting += 1
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+                self._waiting -= 1
+
+    @property
+    def waiting(self):
+        """Number of subscribers currently sleeping in wait() or wait_async()"""
+        return self._waiting
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -1,12 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, stream_with_context, g, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import Integer, String, Float, ForeignKey
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, Session
+from sqlalchemy import Integer, String, Float, Boolean, Text, ForeignKey, event, make_url
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import relationship, joinedload
+from werkzeug.datastructures import ImmutableMultiDict
+from datetime import datetime, timedelta
+from hashlib import sha1
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
+from urllib.parse import urlencode
+import cProfile
+import heapq
+import hmac
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
 import pytz
 
+from cache import LRUCache, MISSING
+from device_queue import CommandQueue, CommandStore, QueueFullError, load_driver
+from events import ChangeNotifier
+from metrics import RequestCounters, RequestMetrics, request_counters
+from parameters import parse_quantity, validate_quantities
+from profiling import SamplingProfiler, log_statement, statement_log, top_functions
+from scheduler import PeriodicTask
+
 app = Flask(__name__)
 # Enable CORS for REST API endpoints
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -18,7 +44,101 @@ class Base(DeclarativeBase):
     pass
 
 
-app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///manufacturing.db"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL", "sqlite:///manufacturing.db")
+# In-process cache for contact/wire/process/recipe reads
+app.config['MASTER_CACHE_SIZE'] = int(os.environ.get("MASTER_CACHE_SIZE", 4096))
+app.config['MASTER_CACHE_TTL'] = float(os.environ.get("MASTER_CACHE_TTL", 300))
+# Seconds that /api/v1/stats (counts, status breakdowns, samples) is served from memory
+app.config['STATS_CACHE_TTL'] = float(os.environ.get("STATS_CACHE_TTL", 5))
+# History retention: finished jobs and commands older than ARCHIVE_AFTER_DAYS
+# move to the archive tables every ARCHIVE_INTERVAL seconds (0 disables the
+# background task), ARCHIVE_BATCH_SIZE rows per transaction
+app.config['ARCHIVE_AFTER_DAYS'] = float(os.environ.get("ARCHIVE_AFTER_DAYS", 30))
+app.config['ARCHIVE_STATUSES'] = os.environ.get("ARCHIVE_STATUSES", "completed,failed,rejected").split(",")
+app.config['ARCHIVE_INTERVAL'] = float(os.environ.get("ARCHIVE_INTERVAL", 3600))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+app.config['ARCHIVE_BATCH_PAUSE'] = float(os.environ.get("ARCHIVE_BATCH_PAUSE", 0.05))
+# Whether this process runs the background tasks (history archiver); a
+# multi-process server enables them in one worker only
+app.config['BACKGROUND_TASKS'] = os.environ.get("BACKGROUND_TASKS", "1") not in ("0", "false")
+# Device command queue: one worker per machine/line, pluggable machine driver
+# ("simulator" or "package.module:DriverClass"). Queued commands are stored in
+# the database; the process running the background tasks dispatches them and
+# looks for commands queued by other processes every DEVICE_POLL_INTERVAL seconds.
+app.config['DEVICE_MACHINES'] = os.environ.get("DEVICE_MACHINES", "default").split(",")
+app.config['DEVICE_DRIVER'] = os.environ.get("DEVICE_DRIVER", "simulator")
+app.config['DEVICE_SIMULATOR_DELAY'] = float(os.environ.get("DEVICE_SIMULATOR_DELAY", 0.5))
+app.config['DEVICE_QUEUE_SIZE'] = int(os.environ.get("DEVICE_QUEUE_SIZE", 1000))
+app.config['DEVICE_POLL_INTERVAL'] = float(os.environ.get("DEVICE_POLL_INTERVAL", 0.2))
+# Request metrics served at /metrics, and the slow query log: statements
+# taking at least SLOW_QUERY_MS milliseconds are logged (0 disables it)
+app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false")
+app.config['SLOW_QUERY_MS'] = float(os.environ.get("SLOW_QUERY_MS", 0))
+# Profiling of single requests (?__profile=1 or X-Profile: 1) for callers
+# presenting PROFILE_TOKEN; disabled while no token is set. Reports are kept
+# in PROFILE_DIR, the newest PROFILE_KEEP of them.
+app.config['PROFILE_TOKEN'] = os.environ.get("PROFILE_TOKEN", "")
+app.config['PROFILE_DIR'] = os.environ.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+app.config['PROFILE_KEEP'] = int(os.environ.get("PROFILE_KEEP", 50))
+app.config['PROFILE_SAMPLE_INTERVAL'] = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", 0.005))
+
+# SQLite engine profiles. "production" runs in WAL mode so readers do not block
+# on writers, waits on locks instead of failing with "database is locked" and
+# enforces foreign keys so ON DELETE CASCADE fires; "default" keeps the driver
+# defaults (rollback journal, no FK enforcement) for comparison.
+SQLITE_PROFILES = {
+    "default": {
+        "pragmas": {},
+        "busy_timeout_ms": 5000,
+        "pool": {},
+    },
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "foreign_keys": "ON",
+            "mmap_size": 268435456,     # 256 MiB
+            "cache_size": -65536,       # 64 MiB, negative values are KiB
+            "temp_store": "MEMORY",
+        },
+        "busy_timeout_ms": 5000,
+        "pool": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30},
+    },
+}
+
+app.config['SQLITE_PROFILE'] = os.environ.get("SQLITE_PROFILE", "production")
+sqlite_profile = SQLITE_PROFILES[app.config['SQLITE_PROFILE']]
+app.config['SQLITE_PRAGMAS'] = dict(sqlite_profile["pragmas"],
+                                    busy_timeout=int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS",
+                                                                    sqlite_profile["busy_timeout_ms"])))
+database_url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+# In-memory databases live in their single connection and must never be disposed
+file_database = database_url.get_backend_name() != "sqlite" or database_url.database not in (None, "", ":memory:")
+if database_url.get_backend_name() == "sqlite" and file_database:
+    # In-memory databases keep Flask-SQLAlchemy's single static connection
+    pool_options = dict(sqlite_profile["pool"])
+    if "SQLITE_POOL_SIZE" in os.environ:
+        pool_options["pool_size"] = int(os.environ["SQLITE_POOL_SIZE"])
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+        pool_options,
+        connect_args={"timeout": app.config['SQLITE_PRAGMAS']["busy_timeout"] / 1000,
+                      "check_same_thread": False})
+
+
+@event.listens_for(Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the configured PRAGMAs to every new SQLite connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        execute_sqlite_pragmas(dbapi_connection)
+
+
+def execute_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
 # Create the extension
 db = SQLAlchemy(model_class=Base)
 # initialise the app with the extension
@@ -34,6 +154,12 @@ class Contact(db.Model):
     Name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
     ZF_ContNumb: Mapped[str] = mapped_column(String(50), nullable=False)
 
+    # Parsed from the string parameters above on every write
+    Diameter_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    Diameter_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    Insertdepth_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    Insertdepth_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+
 
 class Wire(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -44,6 +170,14 @@ class Wire(db.Model):
     wire_diameter: Mapped[str] = mapped_column(String(50), nullable=False)
     color: Mapped[str] = mapped_column(String(50), nullable=False)
 
+    # Parsed from the string parameters above on every write
+    cross_section_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    cross_section_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    isolation_diameter_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    isolation_diameter_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    wire_diameter_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    wire_diameter_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+
 
 class Process(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -62,43 +196,1287 @@ class Process(db.Model):
     stripping_function: Mapped[str] = mapped_column(String(50), nullable=False)
     crimping_position_monitoring: Mapped[str] = mapped_column(String(50), nullable=False)
 
+    # Parsed from the string parameters above on every write
+    crimping_depth_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    crimping_depth_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    crimping_depth_offset_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    crimping_depth_offset_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    holding_value_delta_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    holding_value_delta_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    insertion_depth_delta_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    insertion_depth_delta_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    sf_performance_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    sf_performance_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    sf_frequence_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    sf_frequence_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+    wayback_d_value: Mapped[float] = mapped_column(Float, nullable=True, index=True)
+    wayback_d_unit: Mapped[str] = mapped_column(String(20), nullable=True)
+
 
 class Recipe(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    description: Mapped[str] = mapped_column(String(250), nullable=False)
-    contact_id: Mapped[int] = mapped_column(Integer, ForeignKey('contact.id', ondelete='CASCADE'), nullable=False)
-    wire_id: Mapped[int] = mapped_column(Integer, ForeignKey('wire.id', ondelete='CASCADE'), nullable=False)
-    process_id: Mapped[int] = mapped_column(Integer, ForeignKey('process.id', ondelete='CASCADE'), nullable=False)
+    description: Mapped[str] = mapped_column(String(250), nullable=False, index=True)
+    contact_id: Mapped[int] = mapped_column(Integer, ForeignKey('contact.id', ondelete='CASCADE'), nullable=False, index=True)
+    wire_id: Mapped[int] = mapped_column(Integer, ForeignKey('wire.id', ondelete='CASCADE'), nullable=False, index=True)
+    process_id: Mapped[int] = mapped_column(Integer, ForeignKey('process.id', ondelete='CASCADE'), nullable=False, index=True)
     
     contact = relationship("Contact", backref="recipes")
     wire = relationship("Wire", backref="recipes")
     process = relationship("Process", backref="recipes")
 
 
+# Loader options for reading recipes together with their contact, wire and
+# process in the same SELECT instead of one lazy SELECT per relationship.
+RECIPE_EAGER_LOAD = [
+    joinedload(Recipe.contact),
+    joinedload(Recipe.wire),
+    joinedload(Recipe.process),
+]
+
+
 class Job(db.Model):
+    # AUTOINCREMENT: ids of archived rows are never handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
-    status: Mapped[str] = mapped_column(String(50), default="pending")
-    created_at: Mapped[str] = mapped_column(String(100), nullable=False)
+    status: Mapped[str] = mapped_column(String(50), default="pending", index=True)
+    created_at: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
 
 
 class Setup(db.Model):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String(250), nullable=False)
-    status: Mapped[str] = mapped_column(String(50), default="active")
+    status: Mapped[str] = mapped_column(String(50), default="active", index=True)
+
+
+# Helper function returning the current time as stored in created_at columns
+def berlin_now():
+    return datetime.now(pytz.timezone("Europe/Berlin")).isoformat()
 
 
 class Command(db.Model):
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     description: Mapped[str] = mapped_column(String(250), nullable=False)
-    status: Mapped[str] = mapped_column(String(50), default="pending")
+    status: Mapped[str] = mapped_column(String(50), default="pending", index=True)
+    created_at: Mapped[str] = mapped_column(String(100), nullable=True, default=berlin_now, index=True)
+
+
+# Finished jobs and commands moved out of the hot tables by the history
+# archiver; rows keep their original id
+class JobArchive(db.Model):
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    status: Mapped[str] = mapped_column(String(50), nullable=True, index=True)
+    created_at: Mapped[str] = mapped_column(String(100), nullable=False)
+    archived_at: Mapped[str] = mapped_column(String(100), nullable=False)
+
+
+class CommandArchive(db.Model):
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    description: Mapped[str] = mapped_column(String(250), nullable=False)
+    status: Mapped[str] = mapped_column(String(50), nullable=True, index=True)
+    created_at: Mapped[str] = mapped_column(String(100), nullable=True)
+    archived_at: Mapped[str] = mapped_column(String(100), nullable=False)
+
+
+# Per-table change counter, bumped in the same transaction as every write
+class TableVersion(db.Model):
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[float] = mapped_column(Float, nullable=False)
+    # Version of the first write within the whole second of updated_at
+    second_version: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+
+
+# Committed create/update/delete of commands, jobs and setups, in commit order
+class ChangeEvent(db.Model):
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    table: Mapped[str] = mapped_column(String(50), nullable=False)
+    action: Mapped[str] = mapped_column(String(20), nullable=False)
+    record_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    data: Mapped[str] = mapped_column(String, nullable=True)
+    created_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+# Precompiled machine download package per recipe, rebuilt when stale
+class RecipePackage(db.Model):
+    recipe_id: Mapped[int] = mapped_column(Integer, ForeignKey('recipe.id', ondelete='CASCADE'), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    checksum: Mapped[str] = mapped_column(String(40), nullable=False)
+    stale: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    built_at: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+# Device commands waiting for or being dispatched to their machine
+class DeviceQueueEntry(db.Model):
+    command_id: Mapped[int] = mapped_column(Integer, ForeignKey('command.id', ondelete='CASCADE'), primary_key=True)
+    machine: Mapped[str] = mapped_column(String(100), nullable=False, index=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    enqueued_at: Mapped[float] = mapped_column(Float, nullable=False)
+    claimed_at: Mapped[float] = mapped_column(Float, nullable=True)
+
+
+# Applied schema migrations
+class SchemaMigration(db.Model):
+    id: Mapped[str] = mapped_column(String(100), primary_key=True)
+    applied_at: Mapped[str] = mapped_column(String(100), nullable=False)
+
+
+# ============================================================================
+# NUMERIC PARAMETERS
+# ============================================================================
+# Geometry and process parameters are entered as strings like "0.5 mm²" or
+# "60Hz". Each one is also stored split into <field>_value (indexed float) and
+# <field>_unit so that range queries run in SQL. The strings stay the source
+# of truth: ORM writes re-parse them in before_insert/before_update, bulk
+# writes parse them in validate_bulk_rows().
+
+# Accepted (minimum, maximum) per parameter for bulk imports
+NUMERIC_PARAMETERS = {
+    Contact: {
+        'Diameter': (0, 100),
+        'Insertdepth': (0, 100),
+    },
+    Wire: {
+        'cross_section': (0, 100),
+        'isolation_diameter': (0, 50),
+        'wire_diameter': (0, 50),
+    },
+    Process: {
+        'crimping_depth_d': (0, 20),
+        'crimping_depth_offset_d': (-10, 10),
+        'holding_value_delta_d': (-10, 10),
+        'insertion_depth_delta_d': (-10, 10),
+        'sf_performance_d': (0, 100),
+        'sf_frequence_d': (0, 1000),
+        'wayback_d': (0, 100),
+    },
+}
+
+# Columns that are computed from a parameter string and cannot be written directly
+DERIVED_FIELDS = {
+    model: {f"{field}_{suffix}" for field in ranges for suffix in ('value', 'unit')}
+    for model, ranges in NUMERIC_PARAMETERS.items()
+}
+
+
+def _parse_numeric_parameters(mapper, connection, target):
+    for field in NUMERIC_PARAMETERS[mapper.class_]:
+        value, unit = parse_quantity(getattr(target, field))
+        setattr(target, f"{field}_value", value)
+        setattr(target, f"{field}_unit", unit)
+
+
+for _model in NUMERIC_PARAMETERS:
+    event.listen(_model, "before_insert", _parse_numeric_parameters)
+    event.listen(_model, "before_update", _parse_numeric_parameters)
+
+
+# ============================================================================
+# FULL-TEXT SEARCH INDEX
+# ============================================================================
+# Names and descriptions are indexed in the FTS5 table search_index. SQLite
+# triggers on the indexed tables keep it in sync, so ORM writes, bulk
+# statements, foreign key cascades and other processes all update it. Each
+# record's FTS rowid is id * SEARCH_ROWID_FACTOR + entity code, which makes
+# trigger updates and deletes rowid lookups.
+
+SEARCH_INDEX_TABLE = "search_index"
+SEARCH_ROWID_FACTOR = 8
+
+# entity name -> (model, entity code, title column, body column)
+SEARCH_ENTITIES = {
+    'contact': (Contact, 1, 'Name', 'Description'),
+    'wire': (Wire, 2, 'name', 'description'),
+    'recipe': (Recipe, 3, None, 'description'),
+    'setup': (Setup, 4, 'name', 'description'),
+    'command': (Command, 5, 'name', 'description'),
+}
+
+
+def search_index_ddl(entity):
+    """CREATE TRIGGER statements that mirror one table into the search index"""
+    model, code, title, body = SEARCH_ENTITIES[entity]
+    table = model.__tablename__
+
+    def values(row):
+        title_value = f'{row}."{title}"' if title else "''"
+        return (f"({row}.id * {SEARCH_ROWID_FACTOR} + {code}, '{entity}', "
+                f'{title_value}, {row}."{body}")')
+
+    insert = f"INSERT INTO {SEARCH_INDEX_TABLE} (rowid, entity, title, body) VALUES {values('new')};"
+    delete = f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = old.id * {SEARCH_ROWID_FACTOR} + {code};"
+    columns = ", ".join(f'"{column}"' for column in ('id', title, body) if column)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON \"{table}\" BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON \"{table}\" "
+        f"BEGIN {delete} {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON \"{table}\" BEGIN {delete} END",
+    ]
+
+
+def create_search_index(connection):
+    """Create the FTS5 table and the sync triggers if they are missing"""
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_INDEX_TABLE} USING fts5("
+        "entity UNINDEXED, title, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+    for entity in SEARCH_ENTITIES:
+        for statement in search_index_ddl(entity):
+            connection.exec_driver_sql(statement)
+
+
+def rebuild_search_index(connection):
+    """Re-fill the search index from the indexed tables; returns the number of entries"""
+    create_search_index(connection)
+    connection.exec_driver_sql(f"DELETE FROM {SEARCH_INDEX_TABLE}")
+    for entity, (model, code, title, body) in SEARCH_ENTITIES.items():
+        title_value = f'"{title}"' if title else "''"
+        connection.exec_driver_sql(
+            f"INSERT INTO {SEARCH_INDEX_TABLE} (rowid, entity, title, body) "
+            f"SELECT id * {SEARCH_ROWID_FACTOR} + {code}, '{entity}', {title_value}, \"{body}\" "
+            f"FROM \"{model.__tablename__}\"")
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_INDEX_TABLE} ({SEARCH_INDEX_TABLE}) VALUES ('optimize')")
+    return connection.exec_driver_sql(f"SELECT count(*) FROM {SEARCH_INDEX_TABLE}").scalar()
+
+
+# db.create_all()/db.drop_all() create and drop the index along with the tables
+@event.listens_for(db.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(db.metadata, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_INDEX_TABLE}")
+
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Rebuild the full-text search index from the database."""
+    init_database()
+    with db.engine.begin() as connection:
+        count = rebuild_search_index(connection)
+    print(f"Indexed {count} records")
+
+
+# ============================================================================
+# SCHEMA MIGRATIONS
+# ============================================================================
+# db.create_all() only creates missing tables; indexes and columns added to
+# existing tables reach older databases through these ordered migrations.
+
+def create_model_indexes(connection, model):
+    """Create the model's indexes whose columns already exist in the database"""
+    existing = {column["name"] for column in db.inspect(connection).get_columns(model.__tablename__)}
+    for index in model.__table__.indexes:
+        if all(column.name in existing for column in index.columns):
+            index.create(connection, checkfirst=True)
+
+
+def migrate_hot_path_indexes(connection):
+    """Indexes on recipe foreign keys, recipe description and status columns"""
+    for model in (Recipe, Job, Setup, Command):
+        create_model_indexes(connection, model)
+
+
+def migrate_numeric_parameters(connection, batch_size=1000):
+    """Value/unit columns for numeric parameters, filled by parsing existing rows"""
+    inspector = db.inspect(connection)
+    for model, ranges in NUMERIC_PARAMETERS.items():
+        table = model.__table__
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for name in sorted(DERIVED_FIELDS[model]):
+            if name not in existing:
+                column_type = table.c[name].type.compile(connection.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE "{table.name}" ADD COLUMN "{name}" {column_type}')
+        create_model_indexes(connection, model)
+
+        fields = list(ranges)
+        update = (table.update()
+                  .where(table.c.id == db.bindparam("row_id"))
+                  .values({f"{field}_{suffix}": db.bindparam(f"new_{field}_{suffix}")
+                           for field in fields for suffix in ('value', 'unit')}))
+        last_id = 0
+        while True:
+            rows = connection.execute(db.select(table.c.id, *[table.c[field] for field in fields])
+                                      .where(table.c.id > last_id)
+                                      .order_by(table.c.id)
+                                      .limit(batch_size)).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            parsed, _ = validate_quantities({field: [row[i + 1] for row in rows]
+                                             for i, field in enumerate(fields)},
+                                            ranges)
+            params = []
+            for i, row in enumerate(rows):
+                values = {"row_id": row[0]}
+                for field in fields:
+                    values[f"new_{field}_value"], values[f"new_{field}_unit"] = parsed[field][i]
+                params.append(values)
+            connection.execute(update, params)
+
+
+def migrate_history_timestamps(connection):
+    """command.created_at, set to the migration time for existing commands, and created_at indexes"""
+    existing = {column["name"] for column in db.inspect(connection).get_columns("command")}
+    if "created_at" not in existing:
+        connection.exec_driver_sql('ALTER TABLE "command" ADD COLUMN "created_at" VARCHAR(100)')
+    connection.execute(Command.__table__.update()
+                       .where(Command.__table__.c.created_at.is_(None))
+                       .values(created_at=berlin_now()))
+    for model in (Job, Command):
+        create_model_indexes(connection, model)
+
+
+def migrate_autoincrement_history_ids(connection):
+    """Rebuild job and command with AUTOINCREMENT ids, starting above every archived id"""
+    for model, archive in ARCHIVE_MODELS.items():
+        table = model.__table__
+        ddl = connection.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                         (table.name,)).scalar()
+        if "AUTOINCREMENT" not in ddl.upper():
+            # SQLite cannot change a primary key in place: build a new table and swap it in.
+            # Renaming the old table instead would repoint foreign keys of other tables
+            # (device_queue_entry) at it
+            for index in table.indexes:
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+            new_table = table.to_metadata(db.MetaData(), name=f"{table.name}_new")
+            connection.execute(CreateTable(new_table))
+            columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            connection.exec_driver_sql(f'INSERT INTO "{new_table.name}" ({columns}) '
+                                       f'SELECT {columns} FROM "{table.name}"')
+            connection.exec_driver_sql(f'DROP TABLE "{table.name}"')
+            connection.exec_driver_sql(f'ALTER TABLE "{new_table.name}" RENAME TO "{table.name}"')
+            create_model_indexes(connection, model)
+        top = max(connection.execute(db.select(db.func.coalesce(db.func.max(t.c.id), 0))).scalar()
+                  for t in (table, archive.__table__))
+        connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+        connection.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table.name, top))
+    # The search triggers on command were dropped with the old table
+    rebuild_search_index(connection)
+
+
+def migrate_table_version_seconds(connection):
+    """table_version.second_version, existing versions counted as the only write of their second"""
+    existing = {column["name"] for column in db.inspect(connection).get_columns("table_version")}
+    if "second_version" not in existing:
+        connection.exec_driver_sql('ALTER TABLE "table_version" ADD COLUMN "second_version" INTEGER NOT NULL DEFAULT 1')
+        connection.execute(TableVersion.__table__.update().values(second_version=TableVersion.__table__.c.version))
+
+
+MIGRATIONS = [
+    ("0001_hot_path_indexes", migrate_hot_path_indexes),
+    ("0002_numeric_parameters", migrate_numeric_parameters),
+    ("0003_search_index", rebuild_search_index),
+    ("0004_history_timestamps", migrate_history_timestamps),
+    ("0005_autoincrement_history_ids", migrate_autoincrement_history_ids),
+    ("0006_table_version_seconds", migrate_table_version_seconds),
+]
+
+
+def run_migrations():
+    """Apply pending migrations, each in its own transaction
+
+    Foreign keys are not enforced while a migration runs, so that dropping a
+    rebuilt table does not cascade, and are checked before it commits.
+    """
+    applied = set(db.session.execute(db.select(SchemaMigration.id)).scalars())
+    db.session.rollback()
+    for name, migration in MIGRATIONS:
+        if name in applied:
+            continue
+        with db.engine.connect() as connection:
+            enforced = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            # PRAGMA foreign_keys has no effect inside a transaction
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+            try:
+                with connection.begin():
+                    migration(connection)
+                    violations = connection.exec_driver_sql("PRAGMA foreign_key_check").all()
+                    if violations:
+                        raise RuntimeError(f"Migration {name} leaves foreign key violations: {violations[:5]}")
+                    connection.execute(db.insert(SchemaMigration).values(
+                        id=name, applied_at=berlin_now()))
+            finally:
+                connection.exec_driver_sql(f"PRAGMA foreign_keys={enforced}")
+                connection.commit()
+        app.logger.info("Applied migration %s", name)
+
+
+_database_ready = False
+_database_lock = threading.Lock()
+
+
+def init_database():
+    """Create missing tables and apply pending migrations, once per process"""
+    global _database_ready
+    if _database_ready:
+        return
+    with _database_lock:
+        if _database_ready:
+            return
+        with app.app_context():
+            db.create_all()
+            run_migrations()
+            if file_database:
+                # Do not hand connections opened here to forked worker processes
+                db.engine.dispose()
+        _database_ready = True
+
+
+def init_process(background_tasks=True):
+    """Prepare a worker process forked from the process that imported main
+
+    Pooled connections inherited from the parent belong to it, so they are
+    dropped without being closed and the worker opens its own.
+    """
+    app.config['BACKGROUND_TASKS'] = background_tasks
+    if file_database:
+        with app.app_context():
+            db.engine.dispose(close=False)
+    if background_tasks:
+        # Commands queued by the other workers must not wait for this one's first request
+        command_queue.start()
+
+
+# Settings that configure the database engine when main is imported; they
+# can only be given through the environment
+IMPORT_TIME_SETTINGS = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLITE_PROFILE')
+
+
+def apply_config():
+    """Re-apply app.config to the caches, the archiver and the device queue built at import time"""
+    global device_driver_settings
+    master_cache.maxsize = app.config['MASTER_CACHE_SIZE']
+    master_cache.ttl = app.config['MASTER_CACHE_TTL']
+    stats_cache.ttl = app.config['STATS_CACHE_TTL']
+    history_archiver.interval = app.config['ARCHIVE_INTERVAL']
+    machines = tuple(app.config['DEVICE_MACHINES'])
+    driver_settings = (app.config['DEVICE_DRIVER'], app.config['DEVICE_SIMULATOR_DELAY'])
+    if machines != command_queue.machines or driver_settings != device_driver_settings:
+        # Raises once the device workers run
+        command_queue.configure(machines, load_driver(*driver_settings))
+        device_driver_settings = driver_settings
+    command_queue.maxsize = app.config['DEVICE_QUEUE_SIZE']
+    command_queue.poll_interval = app.config['DEVICE_POLL_INTERVAL']
+
+
+def create_app(config=None):
+    """Return the application with its database created and migrated
+
+    Importing main only builds the app; this is the entry point for servers
+    ("main:create_app()"). config is a mapping or object of settings that
+    override the environment, e.g. ARCHIVE_AFTER_DAYS or DEVICE_MACHINES;
+    the database settings (DATABASE_URL, SQLITE_PROFILE) are read while
+    importing and can only come from the environment.
+    """
+    if config is not None:
+        if not isinstance(config, dict):
+            config = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+        fixed = [key for key in IMPORT_TIME_SETTINGS if key in config and config[key] != app.config.get(key)]
+        if fixed:
+            raise ValueError(f"{', '.join(fixed)} must be set in the environment before main is imported")
+        app.config.update(config)
+        apply_config()
+    init_database()
+    return app
+
+
+@app.before_request
+def ensure_database():
+    # Covers servers that load the "app" object instead of calling create_app()
+    init_database()
+
+
+# ============================================================================
+# REQUEST METRICS AND SLOW QUERY LOG
+# ============================================================================
+
+request_metrics = RequestMetrics(prefix="manufacturing")
+slow_query_log = logging.getLogger("manufacturing.slow_queries")
+
+
+@event.listens_for(Engine, "connect")
+def _count_fetched_rows(dbapi_connection, connection_record):
+    if app.config['METRICS_ENABLED'] and isinstance(dbapi_connection, sqlite3.Connection):
+        # Called by sqlite3 for every row a cursor returns
+        dbapi_connection.row_factory = _counted_row
+
+
+def _counted_row(cursor, row):
+    counters = request_counters.get()
+    if counters is not None:
+        counters.rows += 1
+    return row
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    context.statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.statement_started
+    counters = request_counters.get()
+    if counters is not None:
+        counters.statements += 1
+        counters.sql_seconds += elapsed
+    log_statement(statement, parameters, elapsed)
+    threshold = app.config['SLOW_QUERY_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        slow_query_log.warning("%.1f ms in %s: %s; parameters: %s", elapsed * 1000,
+                               counters.endpoint if counters is not None else "background",
+                               " ".join(statement.split()),
+                               f"{len(parameters)} rows" if executemany else parameters)
+
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS_ENABLED']:
+        g.metrics_started = time.perf_counter()
+        request_counters.set(RequestCounters(request.endpoint or "unmatched"))
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    counters = request_counters.get()
+    if started is None or counters is None:
+        return response
+    if response.is_streamed:
+        # Streamed bodies are recorded once the server has sent the last chunk
+        response.response = metered_stream(response.response, started, request.method,
+                                           response.status_code, counters)
+        return response
+    request_counters.set(None)
+    request_metrics.observe(counters.endpoint, request.method, response.status_code,
+                            time.perf_counter() - started, counters, response.content_length)
+    return response
+
+
+def metered_stream(chunks, started, method, status, counters):
+    sent = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            sent += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+        request_counters.set(None)
+        request_metrics.observe(counters.endpoint, method, status, time.perf_counter() - started, counters, sent)
+
+
+# ============================================================================
+# REQUEST PROFILING
+# ============================================================================
+
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_PARAMETERS = ('__profile', '__profile_token')
+# Reading stored profiles is never profiled itself
+PROFILE_ENDPOINTS = ('api_list_profiles', 'api_get_profile_file')
+# One profiled request at a time per process
+_profile_lock = threading.Lock()
+
+
+def requested_profile_mode(req):
+    """'cprofile', 'sample' (or an unknown mode) if req asks to be profiled, else None"""
+    value = req.args.get('__profile') or req.headers.get('X-Profile')
+    if not value or value in ('0', 'false'):
+        return None
+    return 'cprofile' if value in ('1', 'true') else value
+
+
+def has_profile_token(req):
+    token = app.config['PROFILE_TOKEN']
+    supplied = req.headers.get('X-Profile-Token') or req.args.get('__profile_token', '')
+    return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+@app.before_request
+def start_profiling():
+    mode = requested_profile_mode(request)
+    # Checked before __profile_token is removed from request.args; the
+    # profile views read the result from g
+    authorized = g.profile_authorized = has_profile_token(request)
+    if any(name in request.args for name in PROFILE_PARAMETERS):
+        # Views must not take the profiling parameters for filters
+        request.args = ImmutableMultiDict([(key, value) for key, value in request.args.items(multi=True)
+                                           if key not in PROFILE_PARAMETERS])
+    if mode is None or not app.config['PROFILE_TOKEN'] or request.endpoint in PROFILE_ENDPOINTS:
+        return None
+    if not authorized:
+        return jsonify({"error": "Invalid profiling token"}), 403
+    if mode not in PROFILE_MODES:
+        return jsonify({"error": f"Unknown profiling mode '{mode}', use one of {', '.join(PROFILE_MODES)}"}), 400
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({"error": "Another request is being profiled"}), 429
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+    else:
+        profiler = SamplingProfiler(interval=app.config['PROFILE_SAMPLE_INTERVAL'])
+    statements = []
+    statement_log.set(statements)
+    g.profile = (mode, profiler, statements, time.perf_counter())
+    profiler.enable()
+    return None
+
+
+def stop_profiling():
+    mode, profiler, statements, started = g.pop('profile')
+    try:
+        profiler.disable()
+    finally:
+        statement_log.set(None)
+        _profile_lock.release()
+    return mode, profiler, statements, time.perf_counter() - started
+
+
+@app.after_request
+def finish_profiling(response):
+    """Replace the response of a profiled request with its profile report"""
+    if 'profile' not in g:
+        return response
+    if response.mimetype == 'text/event-stream':
+        # An event stream never ends, so there is no report to wait for
+        stop_profiling()
+        response.headers['X-Profile-Skipped'] = "event stream"
+        return response
+    try:
+        # Streamed bodies are generated inside the profile as well
+        response.direct_passthrough = False
+        body = response.get_data()
+    finally:
+        mode, profiler, statements, elapsed = stop_profiling()
+    report = {
+        "method": request.method,
+        # request.args no longer holds the token
+        "path": request.path + (f"?{urlencode(list(request.args.items(multi=True)))}" if request.args else ""),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "response_bytes": len(body),
+        "mode": mode,
+        "duration_ms": round(elapsed * 1000, 3),
+        "sql": {
+            "count": len(statements),
+            "total_ms": round(sum(seconds for _, _, seconds in statements) * 1000, 3),
+            "statements": [{"statement": statement, "parameters": repr(parameters), "ms": round(seconds * 1000, 3)}
+                           for statement, parameters, seconds in statements],
+        },
+    }
+    return jsonify(save_profile(report, mode, profiler))
+
+
+@app.teardown_request
+def abandon_profiling(error):
+    # An exception escaped before finish_profiling() ran
+    if 'profile' in g:
+        stop_profiling()
+
+
+# Helper function to store a profile report and its profiler output in PROFILE_DIR
+def save_profile(report, mode, profiler):
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S.%f')}-{report['endpoint'] or 'unmatched'}"
+    report = dict(id=profile_id, created_at=berlin_now(), **report)
+    if mode == 'cprofile':
+        name = f"{profile_id}.pstats"
+        profiler.dump_stats(os.path.join(directory, name))
+        report["functions"] = top_functions(profiler)
+    else:
+        name = f"{profile_id}.collapsed"
+        with open(os.path.join(directory, name), "w") as output:
+            output.write(profiler.collapsed())
+        report["samples"] = profiler.samples
+        report["functions"] = profiler.top_functions()
+    report["files"] = {
+        "report": url_for('api_get_profile_file', name=f"{profile_id}.json"),
+        mode: url_for('api_get_profile_file', name=name),
+    }
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as output:
+        json.dump(report, output, indent=1)
+
+    reports = sorted(entry for entry in os.listdir(directory) if entry.endswith(".json"))
+    for old_report in reports[:-app.config['PROFILE_KEEP']]:
+        stem = old_report[:-len(".json")]
+        for extension in (".json", ".pstats", ".collapsed"):
+            if os.path.exists(os.path.join(directory, stem + extension)):
+                os.remove(os.path.join(directory, stem + extension))
+    return report
+
+
+# ============================================================================
+# CHANGE VERSIONING AND CONDITIONAL GET
+# ============================================================================
+
+# Recipe representations embed their contact, wire and process, so a change
+# to any of those tables is also a change to the recipe table
+VERSION_DEPENDENTS = {
+    'contact': ('recipe',),
+    'wire': ('recipe',),
+    'process': ('recipe',),
+}
+
+ALL_TABLES = ('contact', 'wire', 'process', 'recipe', 'job', 'setup', 'command')
+
+# Tables read by each GET endpoint; the ETag is derived from their versions.
+# Endpoints serving several resources map to a function of their URL arguments.
+ENDPOINT_TABLES = {
+    'home': (),
+    'dashboard_section': lambda section: (
+        (DASHBOARD_SECTIONS[section][0].__tablename__,) if section in DASHBOARD_SECTIONS else ()),
+    'add_contact': (),
+    'add_wire': (),
+    'add_process': (),
+    'add_recipe': ('contact', 'wire', 'process'),
+    'edit_contact': ('contact',),
+    'edit_wire': ('wire',),
+    'edit_process': ('process',),
+    'edit_recipe': ('recipe',),
+    'api_get_contacts': ('contact',),
+    'api_get_contact': ('contact',),
+    'api_get_wires': ('wire',),
+    'api_get_wire': ('wire',),
+    'api_get_processes': ('process',),
+    'api_get_process': ('process',),
+    'api_get_recipes': ('recipe',),
+    'api_get_recipe': ('recipe',),
+    'api_get_jobs': ('job',),
+    'api_get_job': ('job',),
+    'api_get_setups': ('setup',),
+    'api_get_setup': ('setup',),
+    'api_get_commands': ('command',),
+    'api_get_command': ('command',),
+    'api_search': lambda resource: (RESOURCE_MODELS[resource].__tablename__,) if resource in RESOURCE_MODELS else (),
+    'api_full_text_search': tuple(SEARCH_ENTITIES),
+    'api_docs': (),
+}
+
+
+def bump_table_versions(connection, tables):
+    """Increment the version of the given tables and their dependents"""
+    tables = set(tables)
+    for table in list(tables):
+        tables.update(VERSION_DEPENDENTS.get(table, ()))
+    tables.discard(TableVersion.__tablename__)
+    if not tables:
+        return
+    now = time.time()
+    version_table = TableVersion.__table__
+    stmt = sqlite_insert(version_table).values(
+        [{"name": table, "version": 1, "updated_at": now, "second_version": 1} for table in sorted(tables)])
+    same_second = (db.cast(version_table.c.updated_at, Integer) == db.cast(stmt.excluded.updated_at, Integer))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[version_table.c.name],
+        set_={"version": version_table.c.version + 1, "updated_at": stmt.excluded.updated_at,
+              "second_version": db.case((same_second, version_table.c.second_version),
+                                        else_=version_table.c.version + 1)})
+    connection.execute(stmt)
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_versions_after_flush(session, flush_context):
+    # new/dirty/deleted still describe what this flush wrote
+    tables = {obj.__table__.name for obj in chain(session.new, session.dirty, session.deleted)}
+    bump_table_versions(session.connection(), tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_versions_on_bulk_statement(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        bump_table_versions(orm_execute_state.session.connection(), {table.name})
+
+
+def select_table_versions(tables):
+    return (db.select(TableVersion.name, TableVersion.version, TableVersion.updated_at, TableVersion.second_version)
+            .where(TableVersion.name.in_(tables)))
+
+
+def read_table_versions(tables):
+    """Return {table: (version, updated_at, second_version)} for the given tables"""
+    if not tables:
+        return {}
+    rows = db.session.execute(select_table_versions(tables)).all()
+    return {name: tuple(values) for name, *values in rows}
+
+
+def endpoint_tables(endpoint, view_args):
+    """Tables whose versions validate GET responses of endpoint, or None"""
+    tables = ENDPOINT_TABLES.get(endpoint)
+    if callable(tables):
+        tables = tables(**view_args)
+    return tables
+
+
+def conditional_validators(req, tables, versions):
+    """Return the (ETag, Last-Modified) pair of a request reading tables"""
+    tag = ";".join(f"{table}:{versions.get(table, (0, 0))[0]}" for table in tables)
+    etag = sha1(f"{req.full_path}|{tag}".encode()).hexdigest()
+    last_modified = max((updated_at for _, updated_at, _ in versions.values()), default=None)
+    return etag, last_modified
+
+
+def is_not_modified(req, etag, versions):
+    if req.if_none_match:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 9110, 13.1.3)
+        return req.if_none_match.contains(etag)
+    if req.if_modified_since and versions:
+        since = req.if_modified_since.timestamp()
+        for version, updated_at, second_version in versions.values():
+            # Last-Modified has whole seconds: after a second write within the
+            # same second the client's copy may predate it
+            if int(updated_at) > since or (int(updated_at) == since and version != second_version):
+                return False
+        return True
+    return False
+
+
+@app.before_request
+def conditional_get():
+    """Answer If-None-Match/If-Modified-Since with 304 before any rows are read"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    tables = endpoint_tables(request.endpoint, request.view_args)
+    if tables is None:
+        return None
+    versions = read_table_versions(tables)
+    etag, last_modified = conditional_validators(request, tables, versions)
+    g.conditional = (etag, last_modified)
+    g.table_versions = versions
+
+    if is_not_modified(request, etag, versions):
+        response = Response(status=304)
+        return add_conditional_headers(response)
+    return None
+
+
+@app.after_request
+def add_conditional_headers(response):
+    conditional = g.pop('conditional', None)
+    if conditional is None or response.status_code not in (200, 304):
+        return response
+    etag, last_modified = conditional
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+# ============================================================================
+# MASTER DATA READ CACHE
+# ============================================================================
+
+MASTER_TABLES = ('contact', 'wire', 'process', 'recipe')
+
+master_cache = LRUCache(maxsize=app.config['MASTER_CACHE_SIZE'], ttl=app.config['MASTER_CACHE_TTL'])
+
+
+def cached_master_read(table, key, loader):
+    """Return the serialized master data for key from the cache or from loader()
+
+    Entries are stamped with the table version read by conditional_get(), so a
+    write committed by another worker process is never served from here.
+    """
+    versions = g.get('table_versions')
+    stamp = versions.get(table, (0, 0))[0] if versions is not None else None
+    value = master_cache.get((table, key), stamp)
+    if value is MISSING:
+        value = loader()
+        if value is not None:
+            master_cache.set((table, key), value, stamp)
+    return value
+
+
+def invalidate_master_cache(changes):
+    """Drop cache entries for changed (table, id) pairs; id None means the whole table"""
+    tables = set()
+    for table, key in changes:
+        if key is None:
+            tables.add(table)
+        for dependent in VERSION_DEPENDENTS.get(table, ()):
+            tables.add(dependent)
+    for table, key in changes:
+        if table not in tables:
+            master_cache.invalidate((table, key))
+            master_cache.invalidate((table, 'all'))
+    if tables:
+        master_cache.invalidate_where(lambda cache_key: cache_key[0] in tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_cache_invalidations(session, flush_context):
+    changes = session.info.setdefault('cache_invalidations', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj.__table__.name in MASTER_TABLES:
+            changes.add((obj.__table__.name, obj.id))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_cache_invalidations(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table.name
+        if table in MASTER_TABLES:
+            orm_execute_state.session.info.setdefault('cache_invalidations', set()).add((table, None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_cache_invalidations(session):
+    changes = session.info.pop('cache_invalidations', None)
+    if changes:
+        invalidate_master_cache(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_invalidations(session):
+    session.info.pop('cache_invalidations', None)
+
+
+# ============================================================================
+# CHANGE EVENTS
+# ============================================================================
+# Every write to a command, job or setup also appends a change_event row in the
+# same transaction, so the event id is a global, gap-free-on-commit cursor that
+# works across worker processes. Subscribers in this process are woken right
+# after the commit; events from other processes are picked up by polling.
+
+EVENT_TABLES = ('command', 'job', 'setup')
+EVENT_LOG_SIZE = int(os.environ.get("EVENT_LOG_SIZE", 100000))
+EVENT_POLL_INTERVAL = float(os.environ.get("EVENT_POLL_INTERVAL", 1.0))
+EVENT_HEARTBEAT = 15.0
+
+change_notifier = ChangeNotifier()
+
+
+def append_change_events(connection, events):
+    if not events:
+        return
+    now = time.time()
+    result = connection.execute(
+        db.insert(ChangeEvent).returning(ChangeEvent.id),
+        [dict(event, created_at=now) for event in events])
+    last_id = max(result.scalars())
+    # Trim the log now and then; it only needs to cover reconnecting clients
+    if last_id // 1000 != (last_id - len(events)) // 1000:
+        connection.execute(db.delete(ChangeEvent).where(ChangeEvent.id <= last_id - EVENT_LOG_SIZE))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_change_events(session, flush_context):
+    events = []
+    for action, objects in (("create", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            table = obj.__table__.name
+            if table not in EVENT_TABLES:
+                continue
+            if action == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            data = app.json.dumps(model_to_dict(obj)) if action != "delete" else None
+            events.append({"table": table, "action": action, "record_id": obj.id, "data": data})
+    if events:
+        append_change_events(session.connection(), events)
+        session.info['change_events'] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_change_events(orm_execute_state):
+    # Bulk statements do not say which rows they touch; subscribers refetch the table
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table.name
+        if table in EVENT_TABLES:
+            append_change_events(orm_execute_state.session.connection(),
+                                 [{"table": table, "action": "bulk", "record_id": None, "data": None}])
+            orm_execute_state.session.info['change_events'] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_change_subscribers(session):
+    if session.info.pop('change_events', None):
+        change_notifier.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_change_notification(session):
+    session.info.pop('change_events', None)
+
+
+def change_event_to_dict(change):
+    return {
+        "id": change.id,
+        "table": change.table,
+        "action": change.action,
+        "record_id": change.record_id,
+        "data": json.loads(change.data) if change.data is not None else None,
+        "created_at": change.created_at,
+    }
+
+
+def select_change_events(since, tables, limit):
+    return (db.select(*ChangeEvent.__table__.columns)
+            .where(ChangeEvent.id > since, ChangeEvent.table.in_(tables))
+            .order_by(ChangeEvent.id).limit(limit))
+
+
+def read_change_events(since, tables, limit):
+    """Return up to limit events after since and release the connection"""
+    changes = db.session.execute(select_change_events(since, tables, limit)).all()
+    events = [change_event_to_dict(change) for change in changes]
+    db.session.rollback()
+    return events
+
+
+def latest_change_event_id():
+    last_id = db.session.execute(db.select(db.func.max(ChangeEvent.id))).scalar() or 0
+    db.session.rollback()
+    return last_id
+
+
+def oldest_change_event_id():
+    first_id = db.session.execute(db.select(db.func.min(ChangeEvent.id))).scalar()
+    db.session.rollback()
+    return first_id
+
+
+# ============================================================================
+# RECIPE DOWNLOAD PACKAGES
+# ============================================================================
+# A package merges a recipe's contact geometry, wire specs and process
+# parameters into one JSON blob stored in recipe_package. Writes to any of the
+# referenced rows mark exactly the affected packages stale in the same
+# transaction; the next lookup rebuilds them, bumping the package version only
+# when the content actually changed.
+
+PACKAGE_FORMAT = "recipe-package/1"
+
+
+def mark_packages_stale(connection, changes):
+    """changes maps a master table to the changed ids, or to None for all rows"""
+    package_table = RecipePackage.__table__
+    for table, ids in changes.items():
+        stmt = package_table.update().values(stale=True)
+        if ids is None:
+            if table != 'recipe':
+                stmt = stmt.where(package_table.c.recipe_id.in_(db.select(Recipe.id)))
+        elif table == 'recipe':
+            stmt = stmt.where(package_table.c.recipe_id.in_(ids))
+        else:
+            foreign_key = Recipe.__table__.c[f"{table}_id"]
+            stmt = stmt.where(package_table.c.recipe_id.in_(
+                db.select(Recipe.__table__.c.id).where(foreign_key.in_(ids))))
+        connection.execute(stmt)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_changed_packages_stale(session, flush_context):
+    changes = {}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = obj.__table__.name
+        if table in MASTER_TABLES and not (table == 'recipe' and obj in session.new):
+            changes.setdefault(table, set()).add(obj.id)
+    if changes:
+        mark_packages_stale(session.connection(), changes)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_packages_stale_on_bulk_statement(orm_execute_state):
+    # Inserted rows are not referenced by any package yet; bulk upserts mark
+    # the rows they update themselves (see bulk_write)
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    statement = orm_execute_state.statement
+    table = statement.table
+    if table.name not in MASTER_TABLES:
+        return
+    connection = orm_execute_state.session.connection()
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, list):
+        # Bulk UPDATE by primary key; anything else executemany may touch any row
+        by_id = statement.whereclause is None and all('id' in row for row in parameters)
+        ids = {row['id'] for row in parameters} if by_id else None
+    elif statement.whereclause is not None:
+        # The rows the statement is about to change, selected with its WHERE clause
+        ids = set(connection.execute(db.select(table.c.id).where(statement.whereclause), parameters).scalars())
+    else:
+        ids = None
+    if ids is None or ids:
+        mark_packages_stale(connection, {table.name: ids})
+
+
+def build_recipe_package_content(recipe_id):
+    """Read recipe, contact, wire and process in one joined SELECT"""
+    row = db.session.execute(select_recipe_rows().where(Recipe.id == recipe_id)).first()
+    if row is None:
+        return None
+    recipe = recipe_row_to_dict(row)
+    parameters = {}
+    for part in ('contact', 'wire', 'process'):
+        for key, value in (recipe[part] or {}).items():
+            if key != 'id':
+                parameters[f"{part}.{key}"] = value
+    return {
+        "format": PACKAGE_FORMAT,
+        "recipe_id": recipe['id'],
+        "description": recipe['description'],
+        "contact": recipe['contact'],
+        "wire": recipe['wire'],
+        "process": recipe['process'],
+        "parameters": parameters,
+    }
+
+
+def get_recipe_package(recipe_id):
+    """Return the current RecipePackage for a recipe, rebuilding it if stale; None if no recipe"""
+    package = db.session.get(RecipePackage, recipe_id)
+    if package is not None and not package.stale:
+        return package
+
+    # Re-read, build and store under the write lock, so that no master data
+    # write can mark the package stale in between and concurrent rebuilds
+    # cannot store different payloads under one version
+    db.session.rollback()
+    db.session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+    package = db.session.get(RecipePackage, recipe_id, populate_existing=True)
+    if package is not None and not package.stale:
+        # Rebuilt by another request while this one waited for the lock
+        db.session.commit()
+        return package
 
+    content = build_recipe_package_content(recipe_id)
+    if content is None:
+        if package is not None:
+            db.session.delete(package)
+        db.session.commit()
+        return None
+    checksum = sha1(app.json.dumps(content).encode()).hexdigest()
+    if package is not None and package.checksum == checksum:
+        package.stale = False
+        db.session.commit()
+        return package
+
+    version = package.version + 1 if package is not None else 1
+    content = dict(content, version=version, checksum=checksum, built_at=berlin_now())
+    values = dict(version=version, checksum=checksum, stale=False, built_at=content["built_at"],
+                  payload=app.json.dumps(content))
+    stmt = sqlite_insert(RecipePackage).values(recipe_id=recipe_id, **values)
+    stmt = stmt.on_conflict_do_update(index_elements=['recipe_id'], set_=values).returning(RecipePackage)
+    package = db.session.scalars(stmt, execution_options={"populate_existing": True}).one()
+    db.session.commit()
+    return package
+
+
+def package_recipe_detail(content):
+    """recipe_to_dict() shaped view of a package"""
+    return {
+        "id": content["recipe_id"],
+        "description": content["description"],
+        "contact_id": content["contact"]["id"] if content["contact"] else None,
+        "wire_id": content["wire"]["id"] if content["wire"] else None,
+        "process_id": content["process"]["id"] if content["process"] else None,
+        "contact": content["contact"],
+        "wire": content["wire"],
+        "process": content["process"],
+    }
 
-# Create table schema in the database. Requires application context.
-with app.app_context():
-    db.create_all()
+
+# ============================================================================
+# HISTORY RETENTION
+# ============================================================================
+# Finished jobs and commands past the retention age are moved to job_archive
+# and command_archive in short batches: each batch is one transaction that
+# copies and deletes at most ARCHIVE_BATCH_SIZE rows, followed by a pause so
+# that request writers never wait long for the database lock. Collection and
+# by-id reads include archived rows when asked with include_archived=1.
+
+ARCHIVE_MODELS = {Job: JobArchive, Command: CommandArchive}
+
+
+def archive_batch(model, cutoff, statuses, batch_size):
+    """Move one batch of finished rows created before cutoff; returns the number moved"""
+    archive = ARCHIVE_MODELS[model]
+    table = model.__table__
+    with db.engine.begin() as connection:
+        # job and command ids are AUTOINCREMENT, so archived ids are never reused
+        ids = connection.execute(
+            db.select(table.c.id)
+            .where(table.c.created_at < cutoff, table.c.status.in_(statuses))
+            .order_by(table.c.id)
+            .limit(batch_size)).scalars().all()
+        if not ids:
+            return 0
+        names = [column.name for column in table.columns]
+        copied = connection.execute(
+            archive.__table__.insert()
+            .from_select(names + ['archived_at'],
+                         db.select(*table.columns, db.literal(berlin_now())).where(table.c.id.in_(ids)))).rowcount
+        deleted = connection.execute(table.delete().where(table.c.id.in_(ids))).rowcount
+        if copied != len(ids) or deleted != len(ids):
+            # Another process archived part of the batch meanwhile; roll back and let the next pass retry
+            raise RuntimeError(f"{table.name} archive batch changed while it was moved: "
+                               f"{copied} copied, {deleted} deleted of {len(ids)}")
+        bump_table_versions(connection, [table.name])
+    return len(ids)
+
+
+def archive_history():
+    """Archive every eligible job and command; returns the number moved per table"""
+    cutoff = (datetime.now(pytz.timezone("Europe/Berlin"))
+              - timedelta(days=app.config['ARCHIVE_AFTER_DAYS'])).isoformat()
+    batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    moved = {}
+    for model in ARCHIVE_MODELS:
+        moved[model.__tablename__] = 0
+        while True:
+            count = archive_batch(model, cutoff, app.config['ARCHIVE_STATUSES'], batch_size)
+            moved[model.__tablename__] += count
+            if count < batch_size:
+                break
+            time.sleep(app.config['ARCHIVE_BATCH_PAUSE'])
+    if any(moved.values()):
+        app.logger.info("Archived %s", moved)
+    return moved
+
+
+def _run_history_archiver():
+    with app.app_context():
+        return archive_history()
+
+
+history_archiver = PeriodicTask("history-archiver", app.config['ARCHIVE_INTERVAL'], _run_history_archiver)
+
+
+@app.before_request
+def start_background_tasks():
+    if app.config['BACKGROUND_TASKS']:
+        history_archiver.start()
+        command_queue.start()
+
+
+@app.cli.command("archive-history")
+def archive_history_command():
+    """Move finished jobs and commands past the retention age to the archive tables."""
+    init_database()
+    moved = history_archiver.run_now()
+    print(", ".join(f"{table}: {count} archived" for table, count in moved.items()))
+
+
+# Helper function to check whether the client asked to include archived rows
+def wants_archived():
+    return request.args.get('include_archived') in ('1', 'true')
 
 
 # Custom error handlers for JSON responses
@@ -115,39 +1493,147 @@ def bad_request(error):
     return jsonify({"error": "Bad request"}), 400
 
 
+# Dashboard sections: model and sort key. Every sort key ends in the id, so
+# it is unique and pages are read by keyset from the matching index.
+DASHBOARD_SECTIONS = {
+    'contacts': (Contact, (Contact.Name, Contact.id)),
+    'wires': (Wire, (Wire.name, Wire.id)),
+    'processes': (Process, (Process.name, Process.id)),
+    'recipes': (Recipe, (Recipe.description, Recipe.id)),
+    'jobs': (Job, (Job.id,)),
+    'setups': (Setup, (Setup.id,)),
+    'commands': (Command, (Command.id,)),
+}
+DASHBOARD_PAGE_SIZE = 50
+DASHBOARD_MAX_PAGE_SIZE = 200
+
+
 @app.route('/')
 def home():
-    # READ ALL RECORDS
-    contacts = db.session.execute(db.select(Contact).order_by(Contact.Name)).scalars().all()
-    wires = db.session.execute(db.select(Wire).order_by(Wire.name)).scalars().all()
-    processes = db.session.execute(db.select(Process).order_by(Process.name)).scalars().all()
-    recipes = db.session.execute(db.select(Recipe).order_by(Recipe.description)).scalars().all()
-    jobs = db.session.execute(db.select(Job).order_by(Job.id)).scalars().all()
-    setups = db.session.execute(db.select(Setup).order_by(Setup.id)).scalars().all()
-    commands = db.session.execute(db.select(Command).order_by(Command.id)).scalars().all()
-    
-    return render_template("index.html", 
-                         contacts=contacts, 
-                         wires=wires, 
-                         processes=processes, 
-                         recipes=recipes,
-                         jobs=jobs,
-                         setups=setups,
-                         commands=commands)
+    # Only the page shell is rendered here; every section loads its rows
+    # page by page from dashboard_section()
+    return render_template("index.html", sections=list(DASHBOARD_SECTIONS),
+                           page_size=DASHBOARD_PAGE_SIZE)
+
+
+# Helper function to select one dashboard page in sort key order
+def select_dashboard_page(section, after, limit):
+    model, sort_key = DASHBOARD_SECTIONS[section]
+    if model is Recipe:
+        stmt = (db.select(*Recipe.__table__.columns,
+                          Contact.Name.label('contact_name'),
+                          Wire.name.label('wire_name'),
+                          Process.name.label('process_name'))
+                .select_from(Recipe)
+                .outerjoin(Contact, Recipe.contact_id == Contact.id)
+                .outerjoin(Wire, Recipe.wire_id == Wire.id)
+                .outerjoin(Process, Recipe.process_id == Process.id))
+    else:
+        stmt = db.select(*model.__table__.columns)
+    if after is not None:
+        if len(sort_key) == 1:
+            stmt = stmt.where(sort_key[0] > after[0])
+        else:
+            stmt = stmt.where(db.tuple_(*sort_key) > db.tuple_(*after))
+    return stmt.order_by(*sort_key).limit(limit + 1)
+
+
+@app.route('/dashboard/<section>')
+def dashboard_section(section):
+    """One page of a dashboard section as JSON; the first page also carries the COUNT(*) total"""
+    if section not in DASHBOARD_SECTIONS:
+        return jsonify({"error": f"Unknown section: {section}"}), 404
+    model, sort_key = DASHBOARD_SECTIONS[section]
+
+    limit = request.args.get('limit', str(DASHBOARD_PAGE_SIZE))
+    if not limit.isdigit() or not 1 <= int(limit) <= DASHBOARD_MAX_PAGE_SIZE:
+        return jsonify({"error": f"'limit' must be an integer between 1 and {DASHBOARD_MAX_PAGE_SIZE}"}), 400
+    limit = int(limit)
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = json.loads(after)
+        except ValueError:
+            after = None
+        if not isinstance(after, list) or len(after) != len(sort_key):
+            return jsonify({"error": "'after' must be the cursor returned by the previous page"}), 400
+
+    try:
+        result = db.session.execute(select_dashboard_page(section, after, limit))
+        names = tuple(result.keys())
+        items = [dict(zip(names, row)) for row in result]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = json.dumps([items[-1][column.key] for column in sort_key])
+        page = {"section": section, "items": items, "next": next_cursor}
+        if after is None:
+            page["total"] = db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+        return jsonify(page), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to load {section}: {str(e)}"}), 500
+
+
+# ============================================================================
+# DATABASE STATISTICS
+# ============================================================================
+# Counts, status breakdowns and a few sample records per table, computed with
+# COUNT(*), GROUP BY and LIMIT instead of loading the tables, and kept in
+# memory for STATS_CACHE_TTL seconds.
+
+STATUS_SECTIONS = ('jobs', 'setups', 'commands')
+STATS_SAMPLE_SIZE = 3
+
+stats_cache = LRUCache(maxsize=1, ttl=app.config['STATS_CACHE_TTL'])
+
+
+def read_database_stats():
+    models = {section: model for section, (model, _) in DASHBOARD_SECTIONS.items()}
+    # All counts in one statement of scalar subqueries
+    counts = db.session.execute(db.select(*[
+        db.select(db.func.count()).select_from(model).scalar_subquery().label(section)
+        for section, model in models.items()])).one()._asdict()
+
+    by_status = {section: {} for section in STATUS_SECTIONS}
+    status_counts = db.union_all(*[
+        db.select(db.literal(section).label('section'), models[section].status, db.func.count())
+        .group_by(models[section].status)
+        for section in STATUS_SECTIONS])
+    for section, status, count in db.session.execute(status_counts):
+        by_status[section][status] = count
+
+    samples = {}
+    for section, (model, sort_key) in DASHBOARD_SECTIONS.items():
+        if model is Recipe:
+            rows = db.session.execute(select_recipe_rows().order_by(*sort_key).limit(STATS_SAMPLE_SIZE))
+            samples[section] = [recipe_row_to_dict(row) for row in rows]
+        else:
+            result = db.session.execute(db.select(*model.__table__.columns).order_by(*sort_key).limit(STATS_SAMPLE_SIZE))
+            names = tuple(result.keys())
+            samples[section] = [dict(zip(names, row)) for row in result]
+
+    return {
+        "counts": counts,
+        "by_status": by_status,
+        "samples": samples,
+        "generated_at": datetime.now(pytz.timezone("Europe/Berlin")).isoformat(),
+    }
+
+
+def database_stats():
+    """Return the cached statistics, recomputing them once the TTL has expired"""
+    stats = stats_cache.get('stats')
+    if stats is MISSING:
+        stats = read_database_stats()
+        stats_cache.set('stats', stats)
+    return stats
 
 
 @app.route('/api/demo')
 def demo():
     """Demonstration endpoint showing current data"""
     try:
-        # READ ALL RECORDS
-        contacts = db.session.execute(db.select(Contact).order_by(Contact.Name)).scalars().all()
-        wires = db.session.execute(db.select(Wire).order_by(Wire.name)).scalars().all()
-        processes = db.session.execute(db.select(Process).order_by(Process.name)).scalars().all()
-        recipes = db.session.execute(db.select(Recipe).order_by(Recipe.description)).scalars().all()
-        jobs = db.session.execute(db.select(Job).order_by(Job.id)).scalars().all()
-        setups = db.session.execute(db.select(Setup).order_by(Setup.id)).scalars().all()
-        commands = db.session.execute(db.select(Command).order_by(Command.id)).scalars().all()
+        stats = database_stats()
         
         demo_data = {
             "server_info": {
@@ -156,24 +1642,8 @@ def demo():
                 "description": "Demonstration server for manufacturing data management",
                 "timestamp": datetime.now(pytz.timezone("Europe/Berlin")).isoformat()
             },
-            "database_stats": {
-                "contacts": len(contacts),
-                "wires": len(wires),
-                "processes": len(processes),
-                "recipes": len(recipes),
-                "jobs": len(jobs),
-                "setups": len(setups),
-                "commands": len(commands)
-            },
-            "sample_data": {
-                "contacts": [model_to_dict(contact) for contact in contacts[:3]],  # Show first 3
-                "wires": [model_to_dict(wire) for wire in wires[:3]],
-                "processes": [model_to_dict(process) for process in processes[:3]],
-                "recipes": [recipe_to_dict(recipe) for recipe in recipes[:3]],
-                "jobs": [model_to_dict(job) for job in jobs[:3]],
-                "setups": [model_to_dict(setup) for setup in setups[:3]],
-                "commands": [model_to_dict(command) for command in commands[:3]]
-            },
+            "database_stats": stats["counts"],
+            "sample_data": stats["samples"],
             "api_endpoints": {
                 "rest_api_base": "/api/v1",
                 "documentation": "/api/v1/docs",
@@ -385,17 +1855,10 @@ def delete_contact():
         if not contact_id:
             return jsonify({"error": "Contact ID is required"}), 400
         
-        contact_to_delete = db.session.get(Contact, contact_id)
-        if not contact_to_delete:
+        # Delete the contact and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Contact, [contact_id]):
+            db.session.rollback()
             return jsonify({"error": "Contact not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.contact_id == contact_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        # Now delete the contact
-        db.session.delete(contact_to_delete)
         db.session.commit()
         return jsonify({"message": "Contact deleted successfully"}), 200
     except Exception as e:
@@ -410,17 +1873,10 @@ def delete_wire():
         if not wire_id:
             return jsonify({"error": "Wire ID is required"}), 400
         
-        wire_to_delete = db.session.get(Wire, wire_id)
-        if not wire_to_delete:
+        # Delete the wire and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Wire, [wire_id]):
+            db.session.rollback()
             return jsonify({"error": "Wire not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.wire_id == wire_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        # Now delete the wire
-        db.session.delete(wire_to_delete)
         db.session.commit()
         return jsonify({"message": "Wire deleted successfully"}), 200
     except Exception as e:
@@ -435,17 +1891,10 @@ def delete_process():
         if not process_id:
             return jsonify({"error": "Process ID is required"}), 400
         
-        process_to_delete = db.session.get(Process, process_id)
-        if not process_to_delete:
+        # Delete the process and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Process, [process_id]):
+            db.session.rollback()
             return jsonify({"error": "Process not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.process_id == process_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        # Now delete the process
-        db.session.delete(process_to_delete)
         db.session.commit()
         return jsonify({"message": "Process deleted successfully"}), 200
     except Exception as e:
@@ -533,38 +1982,327 @@ def delete_command():
 # REST API ENDPOINTS FOR CUSTOMER INTEGRATION
 # ============================================================================
 
+# Serializers are built once per model: the column names are read from
+# __table__ a single time and one attrgetter fetches all values of a row
+_serializers = {}
+
+def model_serializer(model):
+    serializer = _serializers.get(model)
+    if serializer is None:
+        names = tuple(column.key for column in model.__table__.columns)
+        getter = attrgetter(*names)
+        if len(names) == 1:
+            serializer = lambda obj: {names[0]: getter(obj)}
+        else:
+            serializer = lambda obj: dict(zip(names, getter(obj)))
+        _serializers[model] = serializer
+    return serializer
+
 # Helper function to convert SQLAlchemy objects to dictionaries
 def model_to_dict(obj):
     if obj is None:
         return None
-    result = {}
-    for column in obj.__table__.columns:
-        result[column.name] = getattr(obj, column.name)
-    return result
+    return model_serializer(type(obj))(obj)
 
 # Helper function to convert Recipe with relationships to dictionary
 def recipe_to_dict(recipe):
     if recipe is None:
         return None
-    result = {
-        'id': recipe.id,
-        'description': recipe.description,
-        'contact_id': recipe.contact_id,
-        'wire_id': recipe.wire_id,
-        'process_id': recipe.process_id,
-        'contact': model_to_dict(recipe.contact),
-        'wire': model_to_dict(recipe.wire),
-        'process': model_to_dict(recipe.process)
-    }
+    result = model_to_dict(recipe)
+    result['contact'] = model_to_dict(recipe.contact)
+    result['wire'] = model_to_dict(recipe.wire)
+    result['process'] = model_to_dict(recipe.process)
     return result
 
+# Recipe collections are read as plain column tuples of recipe, contact, wire
+# and process joined together, bypassing ORM object construction entirely
+RECIPE_PARTS = (("contact", Contact), ("wire", Wire), ("process", Process))
+
+def _recipe_row_layout():
+    recipe_names = tuple(column.key for column in Recipe.__table__.columns)
+    offset = len(recipe_names)
+    parts = []
+    for name, model in RECIPE_PARTS:
+        names = tuple(column.key for column in model.__table__.columns)
+        parts.append((name, names, offset, offset + len(names)))
+        offset += len(names)
+    return recipe_names, tuple(parts)
+
+RECIPE_ROW_COLUMNS, RECIPE_ROW_PARTS = _recipe_row_layout()
+
+def select_recipe_rows():
+    columns = list(Recipe.__table__.columns)
+    for name, model in RECIPE_PARTS:
+        columns.extend(model.__table__.columns)
+    return (db.select(*columns)
+            .select_from(Recipe)
+            .outerjoin(Contact, Recipe.contact_id == Contact.id)
+            .outerjoin(Wire, Recipe.wire_id == Wire.id)
+            .outerjoin(Process, Recipe.process_id == Process.id))
+
+# Helper function to convert a row of select_recipe_rows() to the recipe_to_dict() shape
+def recipe_row_to_dict(row):
+    result = dict(zip(RECIPE_ROW_COLUMNS, row))
+    for name, names, begin, end in RECIPE_ROW_PARTS:
+        values = row[begin:end]
+        result[name] = dict(zip(names, values)) if values[0] is not None else None
+    return result
+
+# Maximum number of values bound into one IN (...) clause
+BULK_CHUNK_SIZE = 500
+
+RECIPE_FOREIGN_KEYS = {Contact: Recipe.contact_id, Wire: Recipe.wire_id, Process: Recipe.process_id}
+
+# Helper function to delete the recipes of the given contacts, wires or processes
+def delete_dependent_recipes(model, ids):
+    foreign_key = RECIPE_FOREIGN_KEYS.get(model)
+    if foreign_key is None:
+        return
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        db.session.execute(db.delete(Recipe)
+                           .where(foreign_key.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                           .execution_options(synchronize_session=False))
+
+# Helper function to delete records and their recipes with set-based DELETE
+# statements in the current transaction; returns the number of deleted records
+def delete_with_recipes(model, ids):
+    ids = list(ids)
+    delete_dependent_recipes(model, ids)
+    deleted = 0
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        deleted += db.session.execute(db.delete(model)
+                                      .where(model.id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                                      .execution_options(synchronize_session=False)).rowcount
+    return deleted
+
+# Query parameters used by collection endpoints; any other parameter that names
+# a column is applied as an equality filter, e.g. /api/v1/jobs?status=pending,
+# and <parameter>_min/_max bound a numeric parameter, e.g.
+# /api/v1/processes?crimping_depth_d_min=1.0&crimping_depth_d_max=1.5
+COLLECTION_PARAMS = {'limit', 'after', 'fields', 'stream', 'include_archived'}
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+RECIPE_RELATIONS = {'contact', 'wire', 'process'}
+
+# Search endpoints always paginate and accept a trailing * for prefix matches
+SEARCH_PAGE_SIZE = 100
+SEARCH_ALIASES = {Contact: {'name': 'Name', 'description': 'Description'}}
+
+# Helper function to parse pagination, projection and filter parameters
+# (of the current request unless query is given)
+def parse_collection_args(model, search=False, query=None):
+    query = request.args if query is None else query
+    columns = model.__table__.columns
+    allowed_fields = set(columns.keys())
+    if model is Recipe:
+        allowed_fields |= RECIPE_RELATIONS
+
+    limit = query.get('limit')
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+            raise ValueError(f"'limit' must be an integer between 1 and {MAX_PAGE_SIZE}")
+        limit = int(limit)
+
+    after = query.get('after')
+    if after is not None:
+        if not after.isdigit():
+            raise ValueError("'after' must be a non-negative integer id")
+        after = int(after)
+
+    fields = None
+    if query.get('fields'):
+        fields = [field.strip() for field in query['fields'].split(',') if field.strip()]
+        for field in fields:
+            if field not in allowed_fields:
+                raise ValueError(f"Unknown field: {field}")
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+
+    if limit is None and search:
+        limit = SEARCH_PAGE_SIZE
+
+    conditions, part_conditions = [], {}
+    parts = dict(RECIPE_PARTS) if search and model is Recipe else {}
+    for key, value in query.items():
+        if key in COLLECTION_PARAMS:
+            continue
+        part, _, part_key = key.partition('_')
+        if part in parts and key not in columns:
+            # Recipe searches filter on their parts, e.g. contact_name=ZF00* or
+            # process_crimping_depth_d_min=1.0
+            part_conditions.setdefault(part, []).append(filter_condition(parts[part], part_key, value, search))
+        else:
+            conditions.append(filter_condition(model, key, value, search))
+    # All filters on one part go into a single subquery over its indexes,
+    # joined back through the indexed recipe foreign key
+    for part, part_filters in part_conditions.items():
+        part_model = parts[part]
+        conditions.append(RECIPE_FOREIGN_KEYS[part_model].in_(db.select(part_model.id).where(*part_filters)))
+
+    return {"limit": limit, "after": after, "fields": fields, "conditions": conditions}
+
+# Helper function to turn one filter parameter into a SQL condition
+def filter_condition(model, key, value, search=False):
+    columns = model.__table__.columns
+    if search:
+        key = SEARCH_ALIASES.get(model, {}).get(key, key)
+
+    field, _, bound = key.rpartition('_')
+    if bound in ('min', 'max') and field in NUMERIC_PARAMETERS.get(model, {}):
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"'{key}' must be a number")
+        column = columns[f"{field}_value"]
+        return column >= number if bound == 'min' else column <= number
+
+    if key in columns:
+        column = columns[key]
+        if search and value.endswith('*') and column.type.python_type is str:
+            return prefix_condition(column, value[:-1])
+        return column == value
+
+    raise ValueError(f"Unknown filter field: {key}")
+
+# Helper function to match a string prefix as an index range instead of LIKE,
+# which SQLite can only serve from an index under case-insensitive collation
+def prefix_condition(column, prefix):
+    if not prefix:
+        return column.is_not(None)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(column >= prefix, column < upper)
+
+# Helper function to apply filters, keyset cursor and page size to a SELECT
+def paginate(stmt, model, args, peek_next=True):
+    if args["conditions"]:
+        stmt = stmt.where(*args["conditions"])
+    if args["after"] is not None:
+        stmt = stmt.where(model.id > args["after"])
+    stmt = stmt.order_by(model.id)
+    if args["limit"] is not None:
+        # Fetch one extra row to know whether there is a next page
+        stmt = stmt.limit(args["limit"] + 1 if peek_next else args["limit"])
+    return stmt
+
+# Helper function to build the keyset-paginated SELECT for a collection
+def select_collection(model, args, peek_next=True):
+    columns = model.__table__.columns
+    if model is Recipe:
+        if args["conditions"] and args["limit"] is not None:
+            # Pick the page of recipe ids on the indexes first and join contact,
+            # wire and process only for that page instead of for every match
+            page = paginate(db.select(Recipe.id), model, args, peek_next)
+            return select_recipe_rows().where(Recipe.id.in_(page)).order_by(Recipe.id)
+        stmt = select_recipe_rows()
+    elif args["fields"] is not None:
+        stmt = db.select(*[columns[field] for field in args["fields"]])
+    else:
+        stmt = db.select(*columns)
+    return paginate(stmt, model, args, peek_next)
+
+# Helper function to iterate a collection SELECT as dictionaries
+def iter_collection(model, stmt, fields, yield_per=None):
+    execution_options = {"yield_per": yield_per} if yield_per else {}
+    return collection_items(model, db.session.execute(stmt, execution_options=execution_options), fields)
+
+# Helper function to turn the result of select_collection() into dictionaries
+def collection_items(model, result, fields):
+    if model is Recipe:
+        for row in result:
+            item = recipe_row_to_dict(row)
+            if fields is not None:
+                item = {field: item[field] for field in fields}
+            yield item
+    else:
+        names = tuple(result.keys())
+        for row in result:
+            yield dict(zip(names, row))
+
+# Helper function to check whether the client asked for a streamed collection
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+# Helper function to stream a collection row by row, as NDJSON or as a JSON array
+def stream_collection(items):
+    ndjson = request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+    def generate():
+        if ndjson:
+            for item in items:
+                yield app.json.dumps(item) + "\n"
+            return
+        yield "["
+        for index, item in enumerate(items):
+            yield ("," if index else "") + app.json.dumps(item)
+        yield "]\n"
+
+    mimetype = NDJSON_MIMETYPE if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+# Helper function to iterate a collection page, merging in archived rows by
+# id when the request includes them
+def iter_collection_page(model, args, peek_next=True, yield_per=None):
+    items = iter_collection(model, select_collection(model, args, peek_next), args["fields"], yield_per)
+    archive_args = args.get("archive")
+    if archive_args is None:
+        return items
+    archive = ARCHIVE_MODELS[model]
+    if args["fields"] is None:
+        items = (dict(item, archived_at=None) for item in items)
+    archived = iter_collection(archive, select_collection(archive, archive_args, peek_next),
+                               args["fields"], yield_per)
+    # Both sides are limited and ordered by id; ids never repeat across them
+    merged = heapq.merge(items, archived, key=itemgetter('id'))
+    if args["limit"] is not None:
+        merged = islice(merged, args["limit"] + 1 if peek_next else args["limit"])
+    return merged
+
+# Helper function to serve a collection endpoint with pagination, projection and filters
+def collection_response(model, search=False):
+    args = parse_collection_args(model, search)
+    if model in ARCHIVE_MODELS and wants_archived():
+        args["archive"] = parse_collection_args(ARCHIVE_MODELS[model], search)
+
+    if wants_stream():
+        # Streamed responses are not buffered, so there is no next-page header;
+        # clients continue with after=<last id they received>
+        return stream_collection(iter_collection_page(model, args, peek_next=False,
+                                                      yield_per=STREAM_BATCH_SIZE))
+
+    table = model.__table__.name
+    if table in MASTER_TABLES and not request.args and not search:
+        # Plain full-list reads of master data are served from the cache
+        items = cached_master_read(table, 'all', lambda: list(
+            iter_collection(model, select_collection(model, args), None)))
+        return jsonify(items)
+
+    items = list(iter_collection_page(model, args))
+
+    next_cursor = None
+    if args["limit"] is not None and len(items) > args["limit"]:
+        items = items[:args["limit"]]
+        next_cursor = items[-1]["id"]
+
+    response = jsonify(items)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+        next_args = request.args.to_dict()
+        next_args["after"] = next_cursor
+        next_url = url_for(request.endpoint, **request.view_args, **next_args)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
 # CONTACTS API
 @app.route('/api/v1/contacts', methods=['GET'])
 def api_get_contacts():
     """Get all contacts"""
     try:
-        contacts = db.session.execute(db.select(Contact).order_by(Contact.id)).scalars().all()
-        return jsonify([model_to_dict(contact) for contact in contacts]), 200
+        return collection_response(Contact), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch contacts: {str(e)}"}), 500
 
@@ -572,10 +2310,11 @@ def api_get_contacts():
 def api_get_contact(contact_id):
     """Get a specific contact by ID"""
     try:
-        contact = db.session.get(Contact, contact_id)
+        contact = cached_master_read(
+            'contact', contact_id, lambda: model_to_dict(db.session.get(Contact, contact_id)))
         if not contact:
             return jsonify({"error": "Contact not found"}), 404
-        return jsonify(model_to_dict(contact)), 200
+        return jsonify(contact), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch contact: {str(e)}"}), 500
 
@@ -627,16 +2366,10 @@ def api_update_contact(contact_id):
 def api_delete_contact(contact_id):
     """Delete a contact"""
     try:
-        contact = db.session.get(Contact, contact_id)
-        if not contact:
+        # Delete the contact and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Contact, [contact_id]):
+            db.session.rollback()
             return jsonify({"error": "Contact not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.contact_id == contact_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        db.session.delete(contact)
         db.session.commit()
         return jsonify({"message": "Contact deleted successfully"}), 200
     except Exception as e:
@@ -648,8 +2381,9 @@ def api_delete_contact(contact_id):
 def api_get_wires():
     """Get all wires"""
     try:
-        wires = db.session.execute(db.select(Wire).order_by(Wire.id)).scalars().all()
-        return jsonify([model_to_dict(wire) for wire in wires]), 200
+        return collection_response(Wire), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch wires: {str(e)}"}), 500
 
@@ -657,10 +2391,11 @@ def api_get_wires():
 def api_get_wire(wire_id):
     """Get a specific wire by ID"""
     try:
-        wire = db.session.get(Wire, wire_id)
+        wire = cached_master_read(
+            'wire', wire_id, lambda: model_to_dict(db.session.get(Wire, wire_id)))
         if not wire:
             return jsonify({"error": "Wire not found"}), 404
-        return jsonify(model_to_dict(wire)), 200
+        return jsonify(wire), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch wire: {str(e)}"}), 500
 
@@ -712,16 +2447,10 @@ def api_update_wire(wire_id):
 def api_delete_wire(wire_id):
     """Delete a wire"""
     try:
-        wire = db.session.get(Wire, wire_id)
-        if not wire:
+        # Delete the wire and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Wire, [wire_id]):
+            db.session.rollback()
             return jsonify({"error": "Wire not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.wire_id == wire_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        db.session.delete(wire)
         db.session.commit()
         return jsonify({"message": "Wire deleted successfully"}), 200
     except Exception as e:
@@ -733,8 +2462,9 @@ def api_delete_wire(wire_id):
 def api_get_processes():
     """Get all processes"""
     try:
-        processes = db.session.execute(db.select(Process).order_by(Process.id)).scalars().all()
-        return jsonify([model_to_dict(process) for process in processes]), 200
+        return collection_response(Process), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch processes: {str(e)}"}), 500
 
@@ -742,10 +2472,11 @@ def api_get_processes():
 def api_get_process(process_id):
     """Get a specific process by ID"""
     try:
-        process = db.session.get(Process, process_id)
+        process = cached_master_read(
+            'process', process_id, lambda: model_to_dict(db.session.get(Process, process_id)))
         if not process:
             return jsonify({"error": "Process not found"}), 404
-        return jsonify(model_to_dict(process)), 200
+        return jsonify(process), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch process: {str(e)}"}), 500
 
@@ -800,16 +2531,10 @@ def api_update_process(process_id):
 def api_delete_process(process_id):
     """Delete a process"""
     try:
-        process = db.session.get(Process, process_id)
-        if not process:
+        # Delete the process and its recipes with set-based DELETE statements
+        if not delete_with_recipes(Process, [process_id]):
+            db.session.rollback()
             return jsonify({"error": "Process not found"}), 404
-        
-        # Delete related recipes first
-        related_recipes = db.session.execute(db.select(Recipe).where(Recipe.process_id == process_id)).scalars().all()
-        for recipe in related_recipes:
-            db.session.delete(recipe)
-        
-        db.session.delete(process)
         db.session.commit()
         return jsonify({"message": "Process deleted successfully"}), 200
     except Exception as e:
@@ -821,8 +2546,9 @@ def api_delete_process(process_id):
 def api_get_recipes():
     """Get all recipes with full details"""
     try:
-        recipes = db.session.execute(db.select(Recipe).order_by(Recipe.id)).scalars().all()
-        return jsonify([recipe_to_dict(recipe) for recipe in recipes]), 200
+        return collection_response(Recipe), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch recipes: {str(e)}"}), 500
 
@@ -830,10 +2556,11 @@ def api_get_recipes():
 def api_get_recipe(recipe_id):
     """Get a specific recipe by ID with full details"""
     try:
-        recipe = db.session.get(Recipe, recipe_id)
+        recipe = cached_master_read('recipe', recipe_id, lambda: recipe_to_dict(
+            db.session.get(Recipe, recipe_id, options=RECIPE_EAGER_LOAD)))
         if not recipe:
             return jsonify({"error": "Recipe not found"}), 404
-        return jsonify(recipe_to_dict(recipe)), 200
+        return jsonify(recipe), 200
     except Exception as e:
         return jsonify({"error": f"Failed to fetch recipe: {str(e)}"}), 500
 
@@ -908,13 +2635,28 @@ def api_delete_recipe(recipe_id):
         db.session.rollback()
         return jsonify({"error": f"Failed to delete recipe: {str(e)}"}), 500
 
+@app.route('/api/v1/recipes/<int:recipe_id>/package', methods=['GET'])
+def api_get_recipe_package(recipe_id):
+    """Get the precompiled machine download package of a recipe"""
+    try:
+        package = get_recipe_package(recipe_id)
+        if package is None:
+            return jsonify({"error": "Recipe not found"}), 404
+        response = Response(package.payload, mimetype='application/json')
+        response.set_etag(f"{package.checksum}-{package.version}")
+        return response.make_conditional(request)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to build recipe package: {str(e)}"}), 500
+
 # JOBS API
 @app.route('/api/v1/jobs', methods=['GET'])
 def api_get_jobs():
     """Get all jobs"""
     try:
-        jobs = db.session.execute(db.select(Job).order_by(Job.id)).scalars().all()
-        return jsonify([model_to_dict(job) for job in jobs]), 200
+        return collection_response(Job), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch jobs: {str(e)}"}), 500
 
@@ -923,6 +2665,8 @@ def api_get_job(job_id):
     """Get a specific job by ID"""
     try:
         job = db.session.get(Job, job_id)
+        if not job and wants_archived():
+            job = db.session.get(JobArchive, job_id)
         if not job:
             return jsonify({"error": "Job not found"}), 404
         return jsonify(model_to_dict(job)), 200
@@ -995,8 +2739,9 @@ def api_delete_job(job_id):
 def api_get_setups():
     """Get all setups"""
     try:
-        setups = db.session.execute(db.select(Setup).order_by(Setup.id)).scalars().all()
-        return jsonify([model_to_dict(setup) for setup in setups]), 200
+        return collection_response(Setup), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch setups: {str(e)}"}), 500
 
@@ -1077,8 +2822,9 @@ def api_delete_setup(setup_id):
 def api_get_commands():
     """Get all commands"""
     try:
-        commands = db.session.execute(db.select(Command).order_by(Command.id)).scalars().all()
-        return jsonify([model_to_dict(command) for command in commands]), 200
+        return collection_response(Command), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to fetch commands: {str(e)}"}), 500
 
@@ -1087,6 +2833,8 @@ def api_get_command(command_id):
     """Get a specific command by ID"""
     try:
         command = db.session.get(Command, command_id)
+        if not command and wants_archived():
+            command = db.session.get(CommandArchive, command_id)
         if not command:
             return jsonify({"error": "Command not found"}), 404
         return jsonify(model_to_dict(command)), 200
@@ -1154,10 +2902,449 @@ def api_delete_command(command_id):
         db.session.rollback()
         return jsonify({"error": f"Failed to delete command: {str(e)}"}), 500
 
+# BULK API
+RESOURCE_MODELS = {
+    'contacts': Contact,
+    'wires': Wire,
+    'processes': Process,
+    'recipes': Recipe,
+    'jobs': Job,
+    'setups': Setup,
+    'commands': Command,
+}
+
+# Unique natural key used by upserts; models without one upsert by id
+UPSERT_KEYS = {Contact: 'Name', Wire: 'name', Process: 'name'}
+
+
+# Helper function returning the defaults applied by the single-item create routes
+def bulk_defaults(model):
+    if model is Job:
+        return {'status': 'pending', 'created_at': berlin_now()}
+    if model is Setup:
+        return {'status': 'active'}
+    if model is Command:
+        return {'status': 'pending'}
+    return {}
+
+# Helper function to read a bulk request body given as a JSON array or as NDJSON
+def read_bulk_items():
+    if request.mimetype == NDJSON_MIMETYPE:
+        items = []
+        for line_number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"Invalid JSON on line {line_number}")
+        return items
+    if not request.is_json:
+        raise ValueError("Request must be JSON or NDJSON")
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise ValueError("Request body must be a JSON array")
+    return items
+
+# Helper function to look up which of the given values exist in a column
+def existing_values(column, values):
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), BULK_CHUNK_SIZE):
+        chunk = values[start:start + BULK_CHUNK_SIZE]
+        found.update(db.session.execute(db.select(column).where(column.in_(chunk))).scalars())
+    return found
+
+# Helper function to validate bulk insert/upsert items; returns (rows, errors)
+def validate_bulk_rows(model, items, upsert):
+    columns = model.__table__.columns
+    defaults = bulk_defaults(model)
+    required = [column.key for column in columns
+                if not column.nullable and not column.primary_key
+                and column.default is None and column.key not in defaults]
+    key = UPSERT_KEYS.get(model, 'id') if upsert else None
+    rows, errors, seen = [], [], set()
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({"index": index, "error": "Item must be a JSON object"})
+            continue
+        unknown = [field for field in item if field not in columns]
+        missing = [field for field in required if field not in item]
+        derived = [field for field in item if field in DERIVED_FIELDS.get(model, ())]
+        if unknown:
+            errors.append({"index": index, "error": f"Unknown field: {unknown[0]}"})
+            continue
+        if derived:
+            errors.append({"index": index, "error": f"Field '{derived[0]}' is computed by the server"})
+            continue
+        if missing:
+            errors.append({"index": index, "error": f"Missing required field: {missing[0]}"})
+            continue
+        if 'id' in item and key != 'id':
+            errors.append({"index": index, "error": "Field 'id' is assigned by the server"})
+            continue
+        bad_type = None
+        for field, value in item.items():
+            python_type = columns[field].type.python_type
+            if python_type is float:
+                python_type = (int, float)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, python_type)):
+                bad_type = field
+                break
+        if bad_type:
+            errors.append({"index": index, "error": f"Invalid type for field: {bad_type}"})
+            continue
+        unique_value = item.get(key) if key else None
+        if unique_value is not None:
+            if unique_value in seen:
+                errors.append({"index": index, "error": f"Duplicate {key} in request: {unique_value}"})
+                continue
+            seen.add(unique_value)
+        # Upserts apply the defaults in the INSERT only, see bulk_write()
+        rows.append((index, dict(item) if upsert else dict(defaults, **item)))
+
+    # Numeric parameters are parsed and range-checked column by column over
+    # the whole batch, then stored alongside the strings
+    ranges = NUMERIC_PARAMETERS.get(model, {})
+    if ranges and rows:
+        parsed, range_errors = validate_quantities(
+            {field: [row.get(field) for _, row in rows] for field in ranges}, ranges)
+        errors.extend({"index": rows[position][0], "error": message} for position, message in range_errors)
+        for field, pairs in parsed.items():
+            for (_, row), (value, unit) in zip(rows, pairs):
+                if field in row:
+                    row[f"{field}_value"], row[f"{field}_unit"] = value, unit
+
+    # Unique names must not collide with existing rows on insert
+    for unique in (column for column in columns if column.unique):
+        if upsert and unique.key == key:
+            continue
+        taken = existing_values(unique, {row[unique.key] for _, row in rows if unique.key in row})
+        for index, row in rows:
+            if row.get(unique.key) in taken:
+                errors.append({"index": index, "error": f"{unique.key} already exists: {row[unique.key]}"})
+
+    # Recipes must reference existing contacts, wires and processes
+    if model is Recipe:
+        for field, parent in (('contact_id', Contact), ('wire_id', Wire), ('process_id', Process)):
+            found = existing_values(parent.id, {row[field] for _, row in rows if field in row})
+            for index, row in rows:
+                if field in row and row[field] not in found:
+                    errors.append({"index": index, "error": f"Referenced {parent.__tablename__} not found: {row[field]}"})
+
+    errors.sort(key=lambda error: error["index"])
+    return [row for _, row in rows], errors
+
+# Helper function to run an executemany statement once per distinct set of keys
+def execute_grouped(stmt_for_keys, rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    for keys, group in groups.items():
+        for start in range(0, len(group), BULK_CHUNK_SIZE):
+            db.session.execute(stmt_for_keys(keys), group[start:start + BULK_CHUNK_SIZE])
+
+@app.route('/api/v1/<resource>/bulk', methods=['POST', 'PUT', 'DELETE'])
+def api_bulk(resource):
+    """Bulk insert (POST), upsert (PUT) or delete (DELETE) of a resource"""
+    model = RESOURCE_MODELS.get(resource)
+    if model is None:
+        return jsonify({"error": f"Unknown resource: {resource}"}), 404
+    try:
+        items = read_bulk_items()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if request.method == 'DELETE':
+            return bulk_delete(model, items)
+        return bulk_write(model, items, upsert=request.method == 'PUT')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to process bulk {resource}: {str(e)}"}), 500
+
+def bulk_write(model, items, upsert):
+    rows, errors = validate_bulk_rows(model, items, upsert)
+    if errors:
+        db.session.rollback()
+        return jsonify({"error": "Validation failed, nothing was written", "errors": errors}), 400
+
+    if not upsert:
+        ids = []
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            result = db.session.execute(
+                db.insert(model).returning(model.id, sort_by_parameter_order=True),
+                rows[start:start + BULK_CHUNK_SIZE])
+            ids.extend(result.scalars())
+        db.session.commit()
+        return jsonify({"inserted": len(ids), "ids": ids}), 201
+
+    key = UPSERT_KEYS.get(model, 'id')
+    defaults = bulk_defaults(model)
+    if model.__tablename__ in MASTER_TABLES:
+        # Packages of the rows the upsert updates; new rows have none yet
+        key_column = model.__table__.c[key]
+        values = [row[key] for row in rows if row.get(key) is not None]
+        updated = set()
+        for start in range(0, len(values), BULK_CHUNK_SIZE):
+            updated.update(db.session.execute(db.select(model.id).where(
+                key_column.in_(values[start:start + BULK_CHUNK_SIZE]))).scalars())
+        if updated:
+            mark_packages_stale(db.session.connection(), {model.__tablename__: updated})
+
+    def upsert_statement(keys):
+        # Defaults fill in new rows only; updates leave fields that were not sent alone
+        stmt = sqlite_insert(model).values(dict({field: db.bindparam(field) for field in keys},
+                                                **{field: value for field, value in defaults.items()
+                                                   if field not in keys}))
+        updates = {field: stmt.excluded[field] for field in keys if field not in (key, 'id')}
+        if not updates:
+            return stmt.on_conflict_do_nothing(index_elements=[key])
+        return stmt.on_conflict_do_update(index_elements=[key], set_=updates)
+
+    execute_grouped(upsert_statement, rows)
+    db.session.commit()
+    return jsonify({"upserted": len(rows)}), 200
+
+def bulk_delete(model, items):
+    key = UPSERT_KEYS.get(model)
+    ids, names, errors = [], [], []
+    for index, item in enumerate(items):
+        if isinstance(item, dict) and len(item) == 1:
+            field, value = next(iter(item.items()))
+        else:
+            field, value = 'id', item
+        if field == 'id' and isinstance(value, int) and not isinstance(value, bool):
+            ids.append((index, value))
+        elif key is not None and field == key and isinstance(value, str):
+            names.append((index, value))
+        else:
+            errors.append({"index": index, "error": "Item must be an id or an object with a single id or name key"})
+
+    found_ids = existing_values(model.id, {value for _, value in ids})
+    errors.extend({"index": index, "error": f"Not found: {value}"} for index, value in ids if value not in found_ids)
+    name_to_id = {}
+    if names:
+        name_column = model.__table__.columns[key]
+        for start in range(0, len(names), BULK_CHUNK_SIZE):
+            chunk = [value for _, value in names[start:start + BULK_CHUNK_SIZE]]
+            name_to_id.update(db.session.execute(
+                db.select(name_column, model.id).where(name_column.in_(chunk))).all())
+        errors.extend({"index": index, "error": f"Not found: {value}"} for index, value in names if value not in name_to_id)
+    if errors:
+        errors.sort(key=lambda error: error["index"])
+        db.session.rollback()
+        return jsonify({"error": "Validation failed, nothing was deleted", "errors": errors}), 400
+
+    target_ids = sorted({value for _, value in ids} | set(name_to_id.values()))
+    delete_with_recipes(model, target_ids)
+    db.session.commit()
+    return jsonify({"deleted": len(target_ids)}), 200
+
+# SEARCH API
+@app.route('/api/v1/<resource>/search', methods=['GET'])
+def api_search(resource):
+    """Paginated search with prefix, range and (for recipes) contact/wire/process filters"""
+    model = RESOURCE_MODELS.get(resource)
+    if model is None:
+        return jsonify({"error": f"Unknown resource: {resource}"}), 404
+    try:
+        return collection_response(model, search=True), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to search {resource}: {str(e)}"}), 500
+
+# Full-text hits are ranked with BM25; a match in a name counts ten times as
+# much as a match in a description
+FULL_TEXT_PAGE_SIZE = 20
+FULL_TEXT_MAX_PAGE_SIZE = 100
+FULL_TEXT_TERM = re.compile(r"\w+")
+
+# Helper function to turn free text into an FTS5 query of quoted prefix terms,
+# so operators' input can never be parsed as FTS5 syntax
+def full_text_query(text):
+    return " ".join(f'"{term}"*' for term in FULL_TEXT_TERM.findall(text))
+
+@app.route('/api/v1/search', methods=['GET'])
+def api_full_text_search():
+    """Ranked full-text search over names and descriptions"""
+    query = full_text_query(request.args.get('q', ''))
+    if not query:
+        return jsonify({"error": "Query parameter 'q' must contain at least one word"}), 400
+    types = [entity.strip() for entity in request.args.get('types', '').split(',') if entity.strip()]
+    unknown = [entity for entity in types if entity not in SEARCH_ENTITIES]
+    if unknown:
+        return jsonify({"error": f"Unknown type: {unknown[0]}"}), 400
+    limit, offset = request.args.get('limit', str(FULL_TEXT_PAGE_SIZE)), request.args.get('offset', '0')
+    if not limit.isdigit() or not 1 <= int(limit) <= FULL_TEXT_MAX_PAGE_SIZE:
+        return jsonify({"error": f"'limit' must be an integer between 1 and {FULL_TEXT_MAX_PAGE_SIZE}"}), 400
+    if not offset.isdigit():
+        return jsonify({"error": "'offset' must be a non-negative integer"}), 400
+    limit, offset = int(limit), int(offset)
+
+    try:
+        stmt = db.text(
+            f"SELECT rowid, entity, title, snippet({SEARCH_INDEX_TABLE}, 2, '[', ']', '…', 12), "
+            f"bm25({SEARCH_INDEX_TABLE}, 0.0, 10.0, 1.0) AS score FROM {SEARCH_INDEX_TABLE} "
+            f"WHERE {SEARCH_INDEX_TABLE} MATCH :query"
+            + (" AND entity IN :types" if types else "")
+            + " ORDER BY score LIMIT :limit OFFSET :offset")
+        params = {"query": query, "limit": limit + 1, "offset": offset}
+        if types:
+            stmt = stmt.bindparams(db.bindparam("types", expanding=True))
+            params["types"] = types
+        rows = db.session.execute(stmt, params).all()
+
+        hits = []
+        for rowid, entity, title, snippet, score in rows[:limit]:
+            record_id = rowid // SEARCH_ROWID_FACTOR
+            hits.append({
+                "type": entity,
+                "id": record_id,
+                "title": title or None,
+                "snippet": snippet,
+                "score": round(-score, 4),
+                "url": url_for(f"api_get_{entity}", **{f"{entity}_id": record_id}),
+            })
+        response = jsonify(hits)
+        if len(rows) > limit:
+            next_args = request.args.to_dict()
+            next_args["offset"] = offset + limit
+            response.headers["Link"] = f'<{url_for(request.endpoint, **next_args)}>; rel="next"'
+        return response, 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to search: {str(e)}"}), 500
+
 # DEVICE COMMANDS API (for machine control)
+# Commands move through queued -> executing -> completed/failed; a command that
+# does not fit into its machine's queue is marked rejected.
+def update_command_status(command_id, status):
+    """Persist a status change reported by a device worker thread"""
+    with app.app_context():
+        command = db.session.get(Command, command_id)
+        if command is not None:
+            command.status = status
+            db.session.commit()
+
+class DatabaseCommandStore(CommandStore):
+    """Queued device commands in the device_queue_entry table, shared by all server processes"""
+
+    def put(self, machine, command_id, command, maxsize):
+        table = DeviceQueueEntry.__table__
+        depth = db.select(db.func.count()).select_from(table).where(table.c.machine == machine).scalar_subquery()
+        # One statement, so that the depth is checked under the write lock taken for the insert
+        stmt = table.insert().from_select(
+            ["command_id", "machine", "payload", "enqueued_at"],
+            db.select(db.literal(command_id), db.literal(machine), db.literal(json.dumps(command)),
+                      db.literal(time.time())).where(depth < maxsize))
+        with app.app_context(), db.engine.begin() as connection:
+            if connection.execute(stmt).rowcount == 0:
+                raise QueueFullError(machine)
+
+    def claim(self, machine):
+        table, commands = DeviceQueueEntry.__table__, Command.__table__
+        with app.app_context(), db.engine.begin() as connection:
+            while True:
+                row = connection.execute(
+                    db.select(table.c.command_id, table.c.payload, table.c.enqueued_at, commands.c.status)
+                    .outerjoin(commands, commands.c.id == table.c.command_id)
+                    .where(table.c.machine == machine, table.c.claimed_at.is_(None))
+                    .order_by(table.c.command_id)
+                    .limit(1)).first()
+                if row is None:
+                    return None
+                command_id, payload, enqueued_at, status = row
+                if status != "queued":
+                    # Deleted or changed by a client while it waited
+                    connection.execute(table.delete().where(table.c.command_id == command_id))
+                    continue
+                connection.execute(table.update().where(table.c.command_id == command_id)
+                                   .values(claimed_at=time.time()))
+                return command_id, json.loads(payload), enqueued_at
+
+    def done(self, command_id):
+        table = DeviceQueueEntry.__table__
+        with app.app_context(), db.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.command_id == command_id))
+
+    def depth(self, machine):
+        with app.app_context(), db.engine.connect() as connection:
+            return self._depth(connection, machine)
+
+    def recover(self, machines):
+        table, commands = DeviceQueueEntry.__table__, Command.__table__
+        with app.app_context(), db.engine.begin() as connection:
+            # Executing commands without an entry were in flight in an older version's memory queue
+            failed = connection.execute(
+                db.select(commands.c.id)
+                .where(commands.c.status == "executing",
+                       commands.c.id.not_in(db.select(table.c.command_id)))).scalars().all()
+            requeue, dropped = [], []
+            for command_id, machine, claimed_at, status in connection.execute(
+                    db.select(table.c.command_id, table.c.machine, table.c.claimed_at, commands.c.status)
+                    .outerjoin(commands, commands.c.id == table.c.command_id)):
+                if machine in machines and claimed_at is None:
+                    continue
+                if machine in machines and status == "queued":
+                    # Claimed but never started
+                    requeue.append(command_id)
+                    continue
+                dropped.append(command_id)
+                if status in ("queued", "executing"):
+                    failed.append(command_id)
+            if requeue:
+                connection.execute(table.update().where(table.c.command_id.in_(requeue)).values(claimed_at=None))
+            if dropped:
+                connection.execute(table.delete().where(table.c.command_id.in_(dropped)))
+        return failed
+
+    @staticmethod
+    def _depth(connection, machine):
+        table = DeviceQueueEntry.__table__
+        return connection.execute(db.select(db.func.count()).select_from(table)
+                                  .where(table.c.machine == machine)).scalar()
+
+
+device_driver_settings = (app.config['DEVICE_DRIVER'], app.config['DEVICE_SIMULATOR_DELAY'])
+command_queue = CommandQueue(
+    machines=app.config['DEVICE_MACHINES'],
+    driver=load_driver(*device_driver_settings),
+    store=DatabaseCommandStore(),
+    on_status=update_command_status,
+    maxsize=app.config['DEVICE_QUEUE_SIZE'],
+    poll_interval=app.config['DEVICE_POLL_INTERVAL'])
+
+# Helper function to store a queued command, hand it to its machine's worker and build the 202 response
+def enqueue_device_command(command_entry, machine, payload, extra=None):
+    db.session.add(command_entry)
+    db.session.commit()
+    command = model_to_dict(command_entry)
+    try:
+        command_queue.enqueue(machine, command_entry.id, payload)
+    except QueueFullError:
+        update_command_status(command_entry.id, "rejected")
+        return jsonify({"error": f"Command queue of machine '{machine}' is full",
+                        "command_id": command_entry.id}), 503
+
+    status_url = url_for('api_get_command', command_id=command_entry.id)
+    response = jsonify(accepted_command_body(command, machine, status_url, extra))
+    response.headers["Location"] = status_url
+    return response, 202
+
+# Helper function to build the 202 body of a queued device command
+def accepted_command_body(command, machine, status_url, extra=None):
+    return dict({
+        "status": "accepted",
+        "command_id": command["id"],
+        "machine": machine,
+        "status_url": status_url,
+        "executed_command": command
+    }, **(extra or {}))
+
 @app.route('/api/v1/device/commands', methods=['POST'])
 def api_device_command():
-    """Execute device commands (e.g., start recipe)"""
+    """Queue device commands (e.g., start recipe) for asynchronous execution"""
     try:
         if not request.is_json:
             return jsonify({"error": "Request must be JSON"}), 400
@@ -1165,45 +3352,39 @@ def api_device_command():
         data = request.json
         command_type = data.get("command")
         parameters = data.get("parameters", {})
+        machine = parameters.get("machine", app.config['DEVICE_MACHINES'][0])
+        if machine not in command_queue.machines:
+            return jsonify({"error": f"Unknown machine: {machine}"}), 400
         
         if command_type == "start_recipe":
             recipe_id = parameters.get("recipe_id")
             if recipe_id is None:
                 return jsonify({"error": "Missing 'recipe_id' in parameters"}), 400
             
-            # Find recipe
-            recipe = db.session.get(Recipe, recipe_id)
-            if not recipe:
+            # Look up the precompiled download package of the recipe
+            package = get_recipe_package(recipe_id)
+            if package is None:
                 return jsonify({"error": f"Recipe id {recipe_id} not found"}), 404
+            content = json.loads(package.payload)
             
-            # Create command record
             command_entry = Command(
                 name="start_recipe",
-                description=f"Start recipe {recipe_id}: {recipe.description}",
-                status="executing"
+                description=f"Start recipe {recipe_id}: {content['description']}",
+                status="queued"
             )
-            db.session.add(command_entry)
-            db.session.commit()
-            
-            return jsonify({
-                "status": "ok",
-                "executed_command": model_to_dict(command_entry),
-                "recipe_detail": recipe_to_dict(recipe)
-            }), 201
+            payload = {"command": "start_recipe", "package": content}
+            return enqueue_device_command(command_entry, machine, payload, {
+                "recipe_detail": package_recipe_detail(content),
+                "package_version": package.version
+            })
         
         elif command_type == "reset":
             command_entry = Command(
                 name="reset",
                 description="Reset machine",
-                status="executing"
+                status="queued"
             )
-            db.session.add(command_entry)
-            db.session.commit()
-            
-            return jsonify({
-                "status": "ok",
-                "executed_command": model_to_dict(command_entry)
-            }), 201
+            return enqueue_device_command(command_entry, machine, {"command": "reset"})
         
         else:
             return jsonify({"error": "Unsupported command"}), 400
@@ -1212,6 +3393,159 @@ def api_device_command():
         db.session.rollback()
         return jsonify({"error": f"Failed to execute command: {str(e)}"}), 500
 
+@app.route('/api/v1/device/queue', methods=['GET'])
+def api_device_queue():
+    """Queue depth, throughput counters and latency of the device workers"""
+    return jsonify(command_queue.stats()), 200
+
+# CHANGE EVENTS API
+# Helper function to parse the event subscription parameters
+def parse_event_args(req=None):
+    req = request if req is None else req
+    tables = req.args.get('tables')
+    tables = [table.strip() for table in tables.split(',')] if tables else list(EVENT_TABLES)
+    for table in tables:
+        if table not in EVENT_TABLES:
+            raise ValueError(f"Unknown event table: {table}")
+    since = req.args.get('since', req.headers.get('Last-Event-ID'))
+    if since is not None and not str(since).isdigit():
+        raise ValueError("'since' must be an event id")
+    timeout = req.args.get('timeout', '25')
+    try:
+        timeout = min(max(float(timeout), 0.0), 60.0)
+    except ValueError:
+        raise ValueError("'timeout' must be a number of seconds")
+    return tables, int(since) if since is not None else None, timeout
+
+# Helper function to wait for events after since, waking on local commits and polling for remote ones
+def wait_for_change_events(since, tables, timeout, limit=500):
+    deadline = time.monotonic() + timeout
+    while True:
+        generation = change_notifier.generation
+        events = read_change_events(since, tables, limit)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        change_notifier.wait(generation, min(remaining, EVENT_POLL_INTERVAL))
+
+@app.route('/api/v1/events', methods=['GET'])
+def api_events():
+    """Change events for commands, jobs and setups as long-poll JSON or Server-Sent Events"""
+    try:
+        tables, since, timeout = parse_event_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return stream_change_events(tables, since)
+
+    try:
+        if since is None:
+            # First call: hand out the current cursor to continue from
+            return jsonify({"events": [], "last_id": latest_change_event_id()}), 200
+        oldest = oldest_change_event_id()
+        reset = oldest is not None and since < oldest - 1
+        events = wait_for_change_events(since, tables, timeout)
+        last_id = events[-1]["id"] if events else since
+        # reset tells the client that older events were trimmed and it should refetch
+        return jsonify({"events": events, "last_id": last_id, "reset": reset}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch events: {str(e)}"}), 500
+
+def stream_change_events(tables, since):
+    def generate():
+        last_id = since if since is not None else latest_change_event_id()
+        yield f"retry: 3000\nid: {last_id}\n\n"
+        while True:
+            events = wait_for_change_events(last_id, tables, EVENT_HEARTBEAT)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for change in events:
+                last_id = change["id"]
+                yield (f"id: {change['id']}\nevent: {change['table']}.{change['action']}\n"
+                       f"data: {app.json.dumps(change)}\n\n")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# History archive endpoints
+@app.route('/api/v1/archive', methods=['GET'])
+def api_archive_status():
+    """Hot and archived row counts and the state of the background archiver"""
+    try:
+        counts = {}
+        for model, archive in ARCHIVE_MODELS.items():
+            counts[model.__tablename__] = {
+                "hot": db.session.execute(db.select(db.func.count()).select_from(model)).scalar(),
+                "archived": db.session.execute(db.select(db.func.count()).select_from(archive)).scalar(),
+            }
+        return jsonify({"tables": counts,
+                        "retention_days": app.config['ARCHIVE_AFTER_DAYS'],
+                        "statuses": app.config['ARCHIVE_STATUSES'],
+                        "archiver": history_archiver.stats()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to read archive status: {str(e)}"}), 500
+
+@app.route('/api/v1/archive', methods=['POST'])
+def api_run_archive():
+    """Run an archiving pass now"""
+    try:
+        return jsonify({"archived": history_archiver.run_now()}), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to archive history: {str(e)}"}), 500
+
+# Database statistics endpoint
+@app.route('/api/v1/stats', methods=['GET'])
+def api_stats():
+    """Record counts, status breakdowns and sample records per table"""
+    try:
+        return jsonify(database_stats()), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to read stats: {str(e)}"}), 500
+
+# Cache statistics endpoint
+@app.route('/api/v1/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """Hit/miss counters of the master data read cache"""
+    return jsonify(master_cache.stats()), 200
+
+# Prometheus metrics endpoint
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-endpoint latency histograms, SQL and response counters in Prometheus text format"""
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Stored request profiles
+@app.route('/api/v1/profiles', methods=['GET'])
+def api_list_profiles():
+    """Summaries of the stored profile reports, newest first"""
+    if not g.get('profile_authorized'):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    try:
+        directory = app.config['PROFILE_DIR']
+        names = sorted((entry for entry in os.listdir(directory) if entry.endswith(".json")), reverse=True) \
+            if os.path.isdir(directory) else []
+        profiles = []
+        for name in names:
+            with open(os.path.join(directory, name)) as report_file:
+                report = json.load(report_file)
+            profiles.append({key: report.get(key) for key in
+                             ("id", "created_at", "method", "path", "status", "mode", "duration_ms", "files")}
+                            | {"sql_count": report["sql"]["count"]})
+        return jsonify(profiles), 200
+    except Exception as e:
+        return jsonify({"error": f"Failed to list profiles: {str(e)}"}), 500
+
+@app.route('/api/v1/profiles/<name>', methods=['GET'])
+def api_get_profile_file(name):
+    """A stored profile report (.json), cProfile dump (.pstats) or collapsed stacks (.collapsed)"""
+    if not g.get('profile_authorized'):
+        return jsonify({"error": "Invalid profiling token"}), 403
+    return send_from_directory(app.config['PROFILE_DIR'], name)
+
 # API Documentation endpoint
 @app.route('/api/v1/docs', methods=['GET'])
 def api_docs():
@@ -1246,7 +3580,8 @@ def api_docs():
                 "GET /api/v1/recipes/{id}": "Get recipe by ID with full details",
                 "POST /api/v1/recipes": "Create new recipe",
                 "PUT /api/v1/recipes/{id}": "Update recipe",
-                "DELETE /api/v1/recipes/{id}": "Delete recipe"
+                "DELETE /api/v1/recipes/{id}": "Delete recipe",
+                "GET /api/v1/recipes/{id}/package": "Precompiled machine download package (contact, wire and process parameters)"
             },
             "jobs": {
                 "GET /api/v1/jobs": "Get all jobs",
@@ -1269,10 +3604,53 @@ def api_docs():
                 "PUT /api/v1/commands/{id}": "Update command",
                 "DELETE /api/v1/commands/{id}": "Delete command"
             },
+            "events": {
+                "GET /api/v1/events?since={id}&tables=command,job&timeout=25": "Long-poll for change events after the given event id",
+                "GET /api/v1/events (Accept: text/event-stream)": "Server-Sent Events stream of command, job and setup changes; resumes from Last-Event-ID"
+            },
+            "cache": {
+                "GET /api/v1/cache/stats": "Hit/miss counters of the master data read cache"
+            },
+            "metrics": {
+                "GET /metrics": "Per-endpoint request latency histograms, status, error, SQL statement, fetched row and response byte counters (Prometheus text format)"
+            },
+            "profiling": {
+                "GET|POST|... {any path}?__profile=1": "Run the request under cProfile (or __profile=sample for the sampling profiler) and return the profile report with the SQL statements and their timings instead of the response; needs the X-Profile-Token header (or __profile_token) matching PROFILE_TOKEN",
+                "GET /api/v1/profiles": "Stored profile reports, newest first (X-Profile-Token required)",
+                "GET /api/v1/profiles/{name}": "Download a stored report (.json), cProfile dump (.pstats) or collapsed stacks (.collapsed) (X-Profile-Token required)"
+            },
+            "archive": {
+                "GET /api/v1/archive": "Hot and archived job/command counts and the background archiver state",
+                "POST /api/v1/archive": "Archive finished jobs and commands past the retention age now",
+                "GET /api/v1/jobs?include_archived=1": "Collection and by-id reads of jobs and commands include archived records (marked by archived_at)"
+            },
+            "stats": {
+                "GET /api/v1/stats": f"Record counts, job/setup/command counts by status and {STATS_SAMPLE_SIZE} sample records per table; cached for STATS_CACHE_TTL seconds"
+            },
+            "bulk": {
+                "POST /api/v1/{resource}/bulk": "Insert a JSON array (or NDJSON) of records in one transaction",
+                "PUT /api/v1/{resource}/bulk": "Upsert records by name (contacts: Name) or by id for resources without a unique name",
+                "DELETE /api/v1/{resource}/bulk": "Delete records given as ids or {\"name\": ...} objects"
+            },
+            "search": {
+                "GET /api/v1/{resource}/search": f"Collection parameters plus prefix matching with a trailing * (e.g. name=W00*); paginated with {SEARCH_PAGE_SIZE} records per page by default",
+                "GET /api/v1/recipes/search": "Also filters on contact_<field>, wire_<field> and process_<field>, e.g. contact_name=ZF00*&process_crimping_depth_d_min=1.0",
+                "GET /api/v1/search?q=<text>": f"Ranked full-text search over names and descriptions of contacts, wires, recipes, setups and commands; optional types=contact,wire,... and limit (max {FULL_TEXT_MAX_PAGE_SIZE})/offset"
+            },
             "device": {
-                "POST /api/v1/device/commands": "Execute device commands (start_recipe, reset)"
+                "POST /api/v1/device/commands": "Queue device commands (start_recipe, reset); returns 202 with the command id, poll GET /api/v1/commands/{id} for its status",
+                "GET /api/v1/device/queue": "Queue depth, counters and wait/dispatch latency per machine"
             }
         },
+        "collection_parameters": {
+            "limit": f"Page size (1-{MAX_PAGE_SIZE}); the next page cursor is returned in the X-Next-Cursor and Link headers",
+            "after": "Return only records with an id greater than this cursor",
+            "fields": "Comma-separated list of fields to return (id is always included)",
+            "<column>=<value>": "Equality filter on any column, e.g. /api/v1/jobs?status=pending",
+            "<parameter>_min / <parameter>_max": "Inclusive range filter on a numeric contact, wire or process parameter, e.g. /api/v1/processes?crimping_depth_d_min=1.0&crimping_depth_d_max=1.5",
+            "stream": "Set to 1 to stream the JSON array row by row; send 'Accept: application/x-ndjson' for newline-delimited JSON"
+        },
+        "conditional_requests": "GET responses carry ETag/Last-Modified; send If-None-Match or If-Modified-Since to receive 304 when unchanged",
         "data_format": "JSON",
         "authentication": "None (for demonstration)",
         "cors": "Enabled for all origins"
@@ -1281,4 +3659,5 @@ def api_docs():
 
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    # Development server with debugger and reloader; see server.py for production
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
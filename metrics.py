@@ -0,0 +1,148 @@
+"""
+Per-endpoint request metrics in the Prometheus text exposition format
+"""
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestCounters:
+    """Database work done on behalf of one request"""
+
+    __slots__ = ("endpoint", "statements", "sql_seconds", "rows")
+
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+
+
+# Counters of the request being handled in the current thread or task;
+# None outside requests (background tasks, CLI commands)
+request_counters = ContextVar("request_counters", default=None)
+
+
+def count_rows(rows):
+    counters = request_counters.get()
+    if counters is not None:
+        counters.rows += rows
+
+
+class _EndpointStats:
+    __slots__ = ("buckets", "seconds", "count", "statuses", "errors",
+                 "statements", "sql_seconds", "rows", "response_bytes")
+
+    def __init__(self, buckets):
+        self.buckets = [0] * (len(buckets) + 1)
+        self.seconds = 0.0
+        self.count = 0
+        self.statuses = {}
+        self.errors = 0
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.response_bytes = 0
+
+
+class RequestMetrics:
+    """Thread-safe per-(endpoint, method) latency histograms and counters
+
+    observe() costs one lock acquisition and a bisect, so it can run on every
+    request; render() returns the Prometheus text format served at /metrics.
+    """
+
+    def __init__(self, prefix="app", buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.bucket_bounds = tuple(buckets)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, seconds, counters=None, response_bytes=0):
+        key = (endpoint, method)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _EndpointStats(self.bucket_bounds)
+            stats.buckets[bisect_left(self.bucket_bounds, seconds)] += 1
+            stats.seconds += seconds
+            stats.count += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            if status >= 500:
+                stats.errors += 1
+            if counters is not None:
+                stats.statements += counters.statements
+                stats.sql_seconds += counters.sql_seconds
+                stats.rows += counters.rows
+            stats.response_bytes += response_bytes or 0
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        """Return {(endpoint, method): stats dict} of everything observed so far"""
+        with self._lock:
+            return {key: {"count": stats.count, "seconds": stats.seconds, "buckets": list(stats.buckets),
+                          "statuses": dict(stats.statuses), "errors": stats.errors,
+                          "statements": stats.statements, "sql_seconds": stats.sql_seconds,
+                          "rows": stats.rows, "response_bytes": stats.response_bytes}
+                    for key, stats in self._stats.items()}
+
+    def render(self):
+        snapshot = sorted(self.snapshot().items())
+        prefix = self.prefix
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(samples)
+
+        def labels(endpoint, method, **extra):
+            pairs = dict(endpoint=endpoint, method=method, **extra)
+            return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs.items()) + "}"
+
+        histogram = []
+        for (endpoint, method), stats in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.bucket_bounds, stats["buckets"]):
+                cumulative += count
+                histogram.append(f"{prefix}_request_duration_seconds_bucket"
+                                 f"{labels(endpoint, method, le=_format(bound))} {cumulative}")
+            histogram.append(f"{prefix}_request_duration_seconds_bucket"
+                             f"{labels(endpoint, method, le='+Inf')} {stats['count']}")
+            histogram.append(f"{prefix}_request_duration_seconds_sum{labels(endpoint, method)} "
+                             f"{_format(stats['seconds'])}")
+            histogram.append(f"{prefix}_request_duration_seconds_count{labels(endpoint, method)} {stats['count']}")
+        family("request_duration_seconds", "histogram", "Request latency by endpoint", histogram)
+
+        family("requests_total", "counter", "Requests by endpoint and response status",
+               [f"{prefix}_requests_total{labels(endpoint, method, status=status)} {count}"
+                for (endpoint, method), stats in snapshot for status, count in sorted(stats["statuses"].items())])
+        counters = (
+            ("request_errors_total", "errors", "Requests that failed with a 5xx status"),
+            ("sql_statements_total", "statements", "SQL statements executed while handling requests"),
+            ("sql_duration_seconds_total", "sql_seconds", "Time spent executing SQL statements"),
+            ("sql_rows_fetched_total", "rows", "Rows fetched from the database"),
+            ("response_bytes_total", "response_bytes", "Response body bytes sent"),
+        )
+        for name, field, help_text in counters:
+            family(name, "counter", help_text,
+                   [f"{prefix}_{name}{labels(endpoint, method)} {_format(stats[field])}"
+                    for (endpoint, method), stats in snapshot])
+        return "\n".join(lines) + "\n"
+
+
+def _format(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,47 @@
+"""
+Parsing and batch validation of numeric machine parameters
+
+Parameters are entered as strings such as "0.5 mm²", "60Hz" or "1.0". They are
+split into a float value and an optional unit so they can be stored, indexed
+and range-queried as numbers.
+"""
+
+import re
+
+QUANTITY_PATTERN = re.compile(r"^\s*([-+]?(?:\d+(?:[.,]\d*)?|[.,]\d+)(?:[eE][-+]?\d+)?)\s*(\S.*?)?\s*$")
+
+
+def parse_quantity(text):
+    """Return (value, unit) for a parameter string, or (None, None) if it is not numeric"""
+    if text is None:
+        return None, None
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text), None
+    match = QUANTITY_PATTERN.match(str(text))
+    if match is None:
+        return None, None
+    return float(match.group(1).replace(",", ".")), match.group(2)
+
+
+def validate_quantities(columns, ranges):
+    """Validate parameter columns of a batch at once
+
+    columns maps a field name to the list of its values across the batch (None
+    where an item does not set the field); ranges maps a field name to an
+    inclusive (minimum, maximum) pair. Returns (parsed, errors) where parsed
+    maps each field to a list of (value, unit) pairs and errors is a list of
+    (row index, message) tuples.
+    """
+    parsed, errors = {}, []
+    for field, values in columns.items():
+        minimum, maximum = ranges[field]
+        pairs = [parse_quantity(value) for value in values]
+        parsed[field] = pairs
+        for index, ((number, _), raw) in enumerate(zip(pairs, values)):
+            if raw is None:
+                continue
+            if number is None:
+                errors.append((index, f"{field} is not a number: {raw}"))
+            elif not minimum <= number <= maximum:
+                errors.append((index, f"{field} out of range [{minimum}, {maximum}]: {raw}"))
+    return parsed, errors
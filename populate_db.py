@@ -1,266 +1,433 @@
-from main import app, db, Contact, Wire, Process, Recipe, Job, Setup, Command
-from datetime import datetime
+#!/usr/bin/env python3
+"""
+Database population
+Without arguments, replaces the data with a small sample catalogue. Given
+fixture files - CSV, JSON arrays or NDJSON, one table per file named after it
+(contacts.csv, recipes.ndjson, ...) - or directories of them, bulk loads our
+real catalogues instead: rows are written in executemany batches in a single
+transaction, with fsync, foreign key checks, secondary indexes and search
+index triggers off until the end. Recipes name their contact, wire and
+process ("contact": "ZF001") and are resolved to ids during the load.
+
+Usage: python populate_db.py [FIXTURE_OR_DIRECTORY ...] [--append] [--batch-size N]
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import chain, islice
+
+from main import (app, db, init_database, bump_table_versions, append_change_events, mark_packages_stale,
+                  rebuild_search_index, bulk_defaults, RESOURCE_MODELS, SEARCH_ENTITIES,
+                  NUMERIC_PARAMETERS, DERIVED_FIELDS, EVENT_TABLES, MASTER_TABLES, ARCHIVE_MODELS,
+                  Contact, Wire, Process, Recipe, Job, Setup, Command)
+from parameters import validate_quantities
+
+BATCH_SIZE = 10000
+FIXTURE_FORMATS = ('.csv', '.json', '.ndjson', '.jsonl')
+# Parents first: recipes are resolved against contacts, wires and processes
+LOAD_ORDER = (Contact, Wire, Process, Recipe, Setup, Job, Command)
+# Recipe fixture field -> (part model, its name column, recipe foreign key)
+RECIPE_PARTS = {
+    'contact': (Contact, 'Name', 'contact_id'),
+    'wire': (Wire, 'name', 'wire_id'),
+    'process': (Process, 'name', 'process_id'),
+}
+# Connection settings for the duration of a load; the previous values are restored afterwards
+BULK_PRAGMAS = {
+    "synchronous": "OFF",
+    "foreign_keys": "OFF",      # references are resolved and checked by the loader
+    "cache_size": -262144,      # 256 MiB
+    "temp_store": "MEMORY",
+}
+
+CONTACTS = [
+    {
+        "Description": "Alpha",
+        "Diameter": "12.34",
+        "Insertdepth": "22.10",
+        "Name": "ZF001",
+        "ZF_ContNumb": "5.789"
+    },
+    {
+        "Description": "Beta",
+        "Diameter": "14.78",
+        "Insertdepth": "24.50",
+        "Name": "ZF002",
+        "ZF_ContNumb": "6.123"
+    },
+    {
+        "Description": "Gamma",
+        "Diameter": "16.90",
+        "Insertdepth": "26.78",
+        "Name": "ZF003",
+        "ZF_ContNumb": "7.456"
+    },
+    {
+        "Description": "Delta",
+        "Diameter": "18.25",
+        "Insertdepth": "28.90",
+        "Name": "ZF004",
+        "ZF_ContNumb": "8.234"
+    },
+    {
+        "Description": "Epsilon",
+        "Diameter": "20.10",
+        "Insertdepth": "30.12",
+        "Name": "ZF005",
+        "ZF_ContNumb": "9.876"
+    }
+]
+
+WIRES = [
+    {
+        "name": "W001",
+        "description": "Standard copper wire",
+        "cross_section": "0.5 mm²",
+        "isolation_diameter": "1.2 mm",
+        "wire_diameter": "0.8 mm",
+        "color": "red"
+    },
+    {
+        "name": "W002",
+        "description": "Shielded wire",
+        "cross_section": "0.75 mm²",
+        "isolation_diameter": "1.5 mm",
+        "wire_diameter": "1.0 mm",
+        "color": "blue"
+    },
+    {
+        "name": "W003",
+        "description": "Flexible wire",
+        "cross_section": "1.0 mm²",
+        "isolation_diameter": "1.6 mm",
+        "wire_diameter": "1.1 mm",
+        "color": "green"
+    },
+    {
+        "name": "W004",
+        "description": "High voltage wire",
+        "cross_section": "1.5 mm²",
+        "isolation_diameter": "2.0 mm",
+        "wire_diameter": "1.3 mm",
+        "color": "black"
+    },
+    {
+        "name": "W005",
+        "description": "Tinned wire",
+        "cross_section": "2.0 mm²",
+        "isolation_diameter": "2.4 mm",
+        "wire_diameter": "1.6 mm",
+        "color": "white"
+    }
+]
+
+PROCESSES = [
+    {
+        "name": "P001",
+        "crimping_depth_d": "1.0",
+        "crimping_depth_offset_d": "0.2",
+        "holding_value_delta_d": "0.05",
+        "insertion_depth_delta_d": "0.1",
+        "sf_performance_d": "95",
+        "sf_frequence_d": "60Hz",
+        "extendable_feeder_tuble_s": "yes",
+        "loading_holding_jaws_s": "standard",
+        "catact_monitoring_s": "enabled",
+        "wayback_d": "3.5",
+        "stripping_position": "front",
+        "stripping_function": "auto",
+        "crimping_position_monitoring": "enabled"
+    },
+    {
+        "name": "P002",
+        "crimping_depth_d": "1.1",
+        "crimping_depth_offset_d": "0.15",
+        "holding_value_delta_d": "0.06",
+        "insertion_depth_delta_d": "0.09",
+        "sf_performance_d": "93",
+        "sf_frequence_d": "50Hz",
+        "extendable_feeder_tuble_s": "no",
+        "loading_holding_jaws_s": "heavy",
+        "catact_monitoring_s": "disabled",
+        "wayback_d": "4.0",
+        "stripping_position": "rear",
+        "stripping_function": "manual",
+        "crimping_position_monitoring": "disabled"
+    },
+    {
+        "name": "P003",
+        "crimping_depth_d": "1.2",
+        "crimping_depth_offset_d": "0.25",
+        "holding_value_delta_d": "0.07",
+        "insertion_depth_delta_d": "0.11",
+        "sf_performance_d": "90",
+        "sf_frequence_d": "45Hz",
+        "extendable_feeder_tuble_s": "yes",
+        "loading_holding_jaws_s": "medium",
+        "catact_monitoring_s": "enabled",
+        "wayback_d": "3.2",
+        "stripping_position": "front",
+        "stripping_function": "auto",
+        "crimping_position_monitoring": "enabled"
+    },
+    {
+        "name": "P004",
+        "crimping_depth_d": "1.3",
+        "crimping_depth_offset_d": "0.3",
+        "holding_value_delta_d": "0.08",
+        "insertion_depth_delta_d": "0.12",
+        "sf_performance_d": "92",
+        "sf_frequence_d": "55Hz",
+        "extendable_feeder_tuble_s": "no",
+        "loading_holding_jaws_s": "light",
+        "catact_monitoring_s": "disabled",
+        "wayback_d": "4.1",
+        "stripping_position": "rear",
+        "stripping_function": "manual",
+        "crimping_position_monitoring": "enabled"
+    },
+    {
+        "name": "P005",
+        "crimping_depth_d": "1.4",
+        "crimping_depth_offset_d": "0.35",
+        "holding_value_delta_d": "0.09",
+        "insertion_depth_delta_d": "0.13",
+        "sf_performance_d": "94",
+        "sf_frequence_d": "65Hz",
+        "extendable_feeder_tuble_s": "yes",
+        "loading_holding_jaws_s": "standard",
+        "catact_monitoring_s": "enabled",
+        "wayback_d": "3.8",
+        "stripping_position": "front",
+        "stripping_function": "auto",
+        "crimping_position_monitoring": "enabled"
+    }
+]
+
+RECIPES = [
+    {"description": "First assembly", "contact": "ZF001", "wire": "W001", "process": "P001"},
+    {"description": "Second assembly", "contact": "ZF002", "wire": "W002", "process": "P002"},
+    {"description": "Third assembly", "contact": "ZF003", "wire": "W003", "process": "P003"},
+    {"description": "Fourth assembly", "contact": "ZF004", "wire": "W004", "process": "P004"},
+    {"description": "Fifth assembly", "contact": "ZF005", "wire": "W005", "process": "P005"},
+]
+
+SAMPLE_FIXTURES = {
+    Contact: CONTACTS,
+    Wire: WIRES,
+    Process: PROCESSES,
+    Recipe: RECIPES,
+    Job: [{"name": "Sample Job 1", "status": "pending"}],
+    Setup: [{"name": "Default Setup", "description": "Standard manufacturing setup", "status": "active"}],
+    Command: [{"name": "Start Process", "description": "Initialize manufacturing process", "status": "pending"}],
+}
+
+
+def fixture_model(path):
+    """The model a fixture file is for, from its name (contacts.csv, recipe.ndjson, ...)"""
+    stem = os.path.splitext(os.path.basename(path))[0].lower()
+    for resource, model in RESOURCE_MODELS.items():
+        if stem in (resource, model.__tablename__):
+            return model
+    return None
+
+
+def read_fixture(path):
+    """Yield the rows of a CSV, JSON array or NDJSON file as dicts"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as fixture:
+            for row in csv.DictReader(fixture):
+                # Empty cells fall back to the column defaults
+                yield {key: value for key, value in row.items() if value != ''}
+    elif extension == '.json':
+        with open(path, encoding='utf-8') as fixture:
+            rows = json.load(fixture)
+        if not isinstance(rows, list):
+            raise ValueError(f"{path}: expected a JSON array of objects")
+        yield from rows
+    else:
+        with open(path, encoding='utf-8') as fixture:
+            for line in fixture:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def collect_fixtures(paths):
+    """Map models to the fixture files given directly or found in directories"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(FIXTURE_FORMATS) and fixture_model(name) is not None)
+        elif fixture_model(path) is None or not path.lower().endswith(FIXTURE_FORMATS):
+            raise ValueError(f"{path}: not a fixture file, expected e.g. contacts.csv or recipes.ndjson")
+        else:
+            files.append(path)
+    fixtures = {}
+    for path in files:
+        fixtures.setdefault(fixture_model(path), []).append(read_fixture(path))
+    return {model: chain.from_iterable(sources) for model, sources in fixtures.items()}
+
+
+@contextmanager
+def relaxed_pragmas(connection):
+    """Apply BULK_PRAGMAS to a SQLite connection for the duration of the block"""
+    previous = {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in BULK_PRAGMAS}
+    for name, value in BULK_PRAGMAS.items():
+        connection.exec_driver_sql(f"PRAGMA {name}={value}")
+    # PRAGMAs run outside SQLite transactions; this only ends SQLAlchemy's autobegin
+    connection.commit()
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            connection.exec_driver_sql(f"PRAGMA {name}={value}")
+        connection.commit()
+
+
+# Helper function to resolve the part names of recipe rows to foreign keys;
+# rows giving ids instead are checked against the parts
+def resolve_recipe_parts(connection, rows):
+    ids = {field: dict(connection.execute(db.select(getattr(model, name_column), model.id)).all())
+           for field, (model, name_column, foreign_key) in RECIPE_PARTS.items()}
+    existing = {field: set(names.values()) for field, names in ids.items()}
+    for number, row in rows:
+        for field, (model, name_column, foreign_key) in RECIPE_PARTS.items():
+            if field in row:
+                name = row.pop(field)
+                if name not in ids[field]:
+                    raise ValueError(f"recipe row {number}: {field} not found: {name}")
+                row[foreign_key] = ids[field][name]
+            elif foreign_key in row:
+                if not str(row[foreign_key]).isdigit() or int(row[foreign_key]) not in existing[field]:
+                    raise ValueError(f"recipe row {number}: {field} not found: {row[foreign_key]}")
+                row[foreign_key] = int(row[foreign_key])
+        yield number, row
+
+
+# Helper function to check rows and add the parsed numeric parameters, batch by batch
+def prepare_batch(model, batch, defaults):
+    table = model.__tablename__
+    columns = model.__table__.columns
+    derived = DERIVED_FIELDS.get(model, ())
+    for number, row in batch:
+        for field in row:
+            if field not in columns:
+                raise ValueError(f"{table} row {number}: unknown field: {field}")
+            if field in derived:
+                raise ValueError(f"{table} row {number}: field '{field}' is computed from its parameter")
+    rows = [dict(defaults, **row) for _, row in batch]
+    ranges = NUMERIC_PARAMETERS.get(model, {})
+    if ranges:
+        parsed, errors = validate_quantities({field: [row.get(field) for row in rows] for field in ranges}, ranges)
+        if errors:
+            index, message = errors[0]
+            raise ValueError(f"{table} row {batch[index][0]}: {message}")
+        for field, pairs in parsed.items():
+            for row, (value, unit) in zip(rows, pairs):
+                row[f"{field}_value"], row[f"{field}_unit"] = value, unit
+    return rows
+
+
+# Helper function to run one executemany per distinct set of columns in a batch
+def insert_batch(connection, model, rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row), []).append(row)
+    for group in groups.values():
+        connection.execute(model.__table__.insert(), group)
+
+
+def bulk_load(fixtures, replace=True, batch_size=BATCH_SIZE):
+    """Load {model: iterable of row dicts} in one transaction; returns {table: (rows, seconds)}
+
+    With replace, the loaded tables are emptied first, together with the
+    archives of replaced jobs and commands and every table that ON DELETE
+    CASCADE would empty with them. Nothing is written if any row is invalid.
+    """
+    init_database()
+    models = [model for model in LOAD_ORDER if model in fixtures]
+    loaded = {}
+    with app.app_context(), db.engine.connect() as connection, relaxed_pragmas(connection):
+        with connection.begin():
+            # Indexes are rebuilt once at the end instead of row by row
+            tables = {model.__table__ for model in models}
+            indexes = [index for table in tables for index in table.indexes]
+            for index in indexes:
+                index.drop(connection, checkfirst=True)
+            for model, *_ in SEARCH_ENTITIES.values():
+                for action in ('insert', 'update', 'delete'):
+                    connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {model.__tablename__}_search_{action}")
+
+            if replace:
+                cleared = set(tables)
+                cleared.update(ARCHIVE_MODELS[model].__table__ for model in models if model in ARCHIVE_MODELS)
+                # Foreign keys are off: follow their cascades here, parents before children
+                for table in db.metadata.sorted_tables:
+                    if any(key.ondelete == "CASCADE" and key.column.table in cleared for key in table.foreign_keys):
+                        cleared.add(table)
+                for table in reversed(db.metadata.sorted_tables):
+                    if table in cleared:
+                        connection.execute(table.delete())
+
+            for model in models:
+                started = time.perf_counter()
+                count = 0
+                defaults = bulk_defaults(model)
+                rows = enumerate(fixtures[model], 1)
+                if model is Recipe:
+                    rows = resolve_recipe_parts(connection, rows)
+                while batch := list(islice(rows, batch_size)):
+                    insert_batch(connection, model, prepare_batch(model, batch, defaults))
+                    count += len(batch)
+                loaded[model.__tablename__] = (count, time.perf_counter() - started)
+
+            for index in indexes:
+                index.create(connection)
+            # Also restores the triggers
+            rebuild_search_index(connection)
+            # What ORM writes record through the session events
+            written = [model.__tablename__ for model in models]
+            bump_table_versions(connection, written)
+            append_change_events(connection, [{"table": table, "action": "bulk", "record_id": None, "data": None}
+                                              for table in written if table in EVENT_TABLES])
+            mark_packages_stale(connection, {table: None for table in written if table in MASTER_TABLES})
+    return loaded
+
+
+def report(loaded, elapsed):
+    total = 0
+    for table, (rows, seconds) in loaded.items():
+        total += rows
+        rate = f"{rows / seconds:,.0f} rows/s" if rows and seconds else ""
+        print(f"{table:<10} {rows:>10,} rows  {seconds:7.2f}s  {rate}")
+    print(f"{'total':<10} {total:>10,} rows  {elapsed:7.2f}s  {total / elapsed:,.0f} rows/s")
+
 
 def populate_database():
-    with app.app_context():
-        # Clear existing data
-        db.session.query(Recipe).delete()
-        db.session.query(Contact).delete()
-        db.session.query(Wire).delete()
-        db.session.query(Process).delete()
-        db.session.query(Job).delete()
-        db.session.query(Setup).delete()
-        db.session.query(Command).delete()
-        
-        # Add Contacts
-        contacts_data = [
-            {
-                "Description": "Alpha",
-                "Diameter": "12.34",
-                "Insertdepth": "22.10",
-                "Name": "ZF001",
-                "ZF_ContNumb": "5.789"
-            },
-            {
-                "Description": "Beta",
-                "Diameter": "14.78",
-                "Insertdepth": "24.50",
-                "Name": "ZF002",
-                "ZF_ContNumb": "6.123"
-            },
-            {
-                "Description": "Gamma",
-                "Diameter": "16.90",
-                "Insertdepth": "26.78",
-                "Name": "ZF003",
-                "ZF_ContNumb": "7.456"
-            },
-            {
-                "Description": "Delta",
-                "Diameter": "18.25",
-                "Insertdepth": "28.90",
-                "Name": "ZF004",
-                "ZF_ContNumb": "8.234"
-            },
-            {
-                "Description": "Epsilon",
-                "Diameter": "20.10",
-                "Insertdepth": "30.12",
-                "Name": "ZF005",
-                "ZF_ContNumb": "9.876"
-            }
-        ]
-        
-        for contact_data in contacts_data:
-            contact = Contact(**contact_data)
-            db.session.add(contact)
-        
-        # Add Wires
-        wires_data = [
-            {
-                "name": "W001",
-                "description": "Standard copper wire",
-                "cross_section": "0.5 mm²",
-                "isolation_diameter": "1.2 mm",
-                "wire_diameter": "0.8 mm",
-                "color": "red"
-            },
-            {
-                "name": "W002",
-                "description": "Shielded wire",
-                "cross_section": "0.75 mm²",
-                "isolation_diameter": "1.5 mm",
-                "wire_diameter": "1.0 mm",
-                "color": "blue"
-            },
-            {
-                "name": "W003",
-                "description": "Flexible wire",
-                "cross_section": "1.0 mm²",
-                "isolation_diameter": "1.6 mm",
-                "wire_diameter": "1.1 mm",
-                "color": "green"
-            },
-            {
-                "name": "W004",
-                "description": "High voltage wire",
-                "cross_section": "1.5 mm²",
-                "isolation_diameter": "2.0 mm",
-                "wire_diameter": "1.3 mm",
-                "color": "black"
-            },
-            {
-                "name": "W005",
-                "description": "Tinned wire",
-                "cross_section": "2.0 mm²",
-                "isolation_diameter": "2.4 mm",
-                "wire_diameter": "1.6 mm",
-                "color": "white"
-            }
-        ]
-        
-        for wire_data in wires_data:
-            wire = Wire(**wire_data)
-            db.session.add(wire)
-        
-        # Add Processes
-        processes_data = [
-            {
-                "name": "P001",
-                "crimping_depth_d": "1.0",
-                "crimping_depth_offset_d": "0.2",
-                "holding_value_delta_d": "0.05",
-                "insertion_depth_delta_d": "0.1",
-                "sf_performance_d": "95",
-                "sf_frequence_d": "60Hz",
-                "extendable_feeder_tuble_s": "yes",
-                "loading_holding_jaws_s": "standard",
-                "catact_monitoring_s": "enabled",
-                "wayback_d": "3.5",
-                "stripping_position": "front",
-                "stripping_function": "auto",
-                "crimping_position_monitoring": "enabled"
-            },
-            {
-                "name": "P002",
-                "crimping_depth_d": "1.1",
-                "crimping_depth_offset_d": "0.15",
-                "holding_value_delta_d": "0.06",
-                "insertion_depth_delta_d": "0.09",
-                "sf_performance_d": "93",
-                "sf_frequence_d": "50Hz",
-                "extendable_feeder_tuble_s": "no",
-                "loading_holding_jaws_s": "heavy",
-                "catact_monitoring_s": "disabled",
-                "wayback_d": "4.0",
-                "stripping_position": "rear",
-                "stripping_function": "manual",
-                "crimping_position_monitoring": "disabled"
-            },
-            {
-                "name": "P003",
-                "crimping_depth_d": "1.2",
-                "crimping_depth_offset_d": "0.25",
-                "holding_value_delta_d": "0.07",
-                "insertion_depth_delta_d": "0.11",
-                "sf_performance_d": "90",
-                "sf_frequence_d": "45Hz",
-                "extendable_feeder_tuble_s": "yes",
-                "loading_holding_jaws_s": "medium",
-                "catact_monitoring_s": "enabled",
-                "wayback_d": "3.2",
-                "stripping_position": "front",
-                "stripping_function": "auto",
-                "crimping_position_monitoring": "enabled"
-            },
-            {
-                "name": "P004",
-                "crimping_depth_d": "1.3",
-                "crimping_depth_offset_d": "0.3",
-                "holding_value_delta_d": "0.08",
-                "insertion_depth_delta_d": "0.12",
-                "sf_performance_d": "92",
-                "sf_frequence_d": "55Hz",
-                "extendable_feeder_tuble_s": "no",
-                "loading_holding_jaws_s": "light",
-                "catact_monitoring_s": "disabled",
-                "wayback_d": "4.1",
-                "stripping_position": "rear",
-                "stripping_function": "manual",
-                "crimping_position_monitoring": "enabled"
-            },
-            {
-                "name": "P005",
-                "crimping_depth_d": "1.4",
-                "crimping_depth_offset_d": "0.35",
-                "holding_value_delta_d": "0.09",
-                "insertion_depth_delta_d": "0.13",
-                "sf_performance_d": "94",
-                "sf_frequence_d": "65Hz",
-                "extendable_feeder_tuble_s": "yes",
-                "loading_holding_jaws_s": "standard",
-                "catact_monitoring_s": "enabled",
-                "wayback_d": "3.8",
-                "stripping_position": "front",
-                "stripping_function": "auto",
-                "crimping_position_monitoring": "enabled"
-            }
-        ]
-        
-        for process_data in processes_data:
-            process = Process(**process_data)
-            db.session.add(process)
-        
-        # Commit to get IDs
-        db.session.commit()
-        
-        # Add Recipes
-        recipes_data = [
-            {
-                "description": "First assembly",
-                "contact_id": 1,
-                "wire_id": 1,
-                "process_id": 1
-            },
-            {
-                "description": "Second assembly",
-                "contact_id": 2,
-                "wire_id": 2,
-                "process_id": 2
-            },
-            {
-                "description": "Third assembly",
-                "contact_id": 3,
-                "wire_id": 3,
-                "process_id": 3
-            },
-            {
-                "description": "Fourth assembly",
-                "contact_id": 4,
-                "wire_id": 4,
-                "process_id": 4
-            },
-            {
-                "description": "Fifth assembly",
-                "contact_id": 5,
-                "wire_id": 5,
-                "process_id": 5
-            }
-        ]
-        
-        for recipe_data in recipes_data:
-            recipe = Recipe(**recipe_data)
-            db.session.add(recipe)
-        
-        # Add some sample Jobs, Setups, and Commands
-        job_data = {
-            "name": "Sample Job 1", 
-            "status": "pending", 
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        job = Job(**job_data)
-        db.session.add(job)
-        
-        setup_data = {
-            "name": "Default Setup", 
-            "description": "Standard manufacturing setup", 
-            "status": "active"
-        }
-        setup = Setup(**setup_data)
-        db.session.add(setup)
-        
-        command_data = {
-            "name": "Start Process", 
-            "description": "Initialize manufacturing process", 
-            "status": "pending"
-        }
-        command = Command(**command_data)
-        db.session.add(command)
-        
-        # Final commit
-        db.session.commit()
-        
-        print("Database populated successfully!")
+    bulk_load(SAMPLE_FIXTURES)
+    print("Database populated successfully!")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the database with sample data or bulk load fixture files")
+    parser.add_argument("fixtures", nargs="*", help="CSV, JSON or NDJSON files named after their table, "
+                                                    "or directories of them")
+    parser.add_argument("--append", action="store_true", help="keep the existing rows of the loaded tables")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rows per executemany batch")
+    args = parser.parse_args(argv)
+    if not args.fixtures:
+        populate_database()
+        return
+    started = time.perf_counter()
+    loaded = bulk_load(collect_fixtures(args.fixtures), replace=not args.append, batch_size=args.batch_size)
+    report(loaded, time.perf_counter() - started)
+
 
 if __name__ == "__main__":
-    populate_database() 
\ No newline at end of file
+    main()
@@ -0,0 +1,92 @@
+"""
+On-demand profiling of single requests: deterministic (cProfile) and sampling
+"""
+
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+# (statement, parameters, seconds) of every SQL statement executed by the
+# profiled request in the current thread; None when nothing is profiled
+statement_log = ContextVar("statement_log", default=None)
+
+
+def log_statement(statement, parameters, seconds):
+    log = statement_log.get()
+    if log is not None:
+        log.append((statement, parameters, seconds))
+
+
+class SamplingProfiler:
+    """Records the call stack of one thread every interval seconds
+
+    Has the enable()/disable() interface of cProfile.Profile. The profiled
+    thread only yields the GIL every sys.getswitchinterval() seconds (5 ms by
+    default) while it runs Python code, which bounds the effective rate.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def enable(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def disable(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def collapsed(self):
+        """Stacks in the collapsed format of flamegraph.pl, speedscope and inferno"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=30):
+        """Functions by the number of samples they were on the stack (inclusive) and on top of it (self)"""
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                inclusive[name] += count
+        return [{"function": name, "samples": count, "self_samples": own[name]}
+                for name, count in inclusive.most_common(limit)]
+
+
+def frame_name(code):
+    # ";" separates frames in collapsed stacks
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def top_functions(profile, limit=30):
+    """Functions of a cProfile.Profile by cumulative time"""
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{"function": pstats.func_std_string(function), "calls": calls, "primitive_calls": primitive_calls,
+             "total_ms": round(total * 1000, 3), "cumulative_ms": round(cumulative * 1000, 3)}
+            for function, (primitive_calls, calls, total, cumulative, callers) in rows]
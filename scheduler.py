@@ -0,0 +1,78 @@
+"""
+Periodic background tasks
+A task runs its function every interval seconds in a daemon thread; it can
+also be run on demand, and never runs twice at the same time in one process.
+"""
+
+import threading
+import time
+
+
+class PeriodicTask:
+    """Runs func() every interval seconds once started; interval <= 0 disables it"""
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stop = threading.Event()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+
+    def start(self):
+        """Start the thread once; a no-op when disabled or already running"""
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"periodic-{self.name}", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_now(self):
+        """Run func() in the calling thread, waiting for a running pass to finish first"""
+        with self._run_lock:
+            self.last_started = time.time()
+            started = time.perf_counter()
+            try:
+                self.last_result = self.func()
+                self.last_error = None
+                return self.last_result
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                raise
+            finally:
+                self.runs += 1
+                self.last_duration = time.perf_counter() - started
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_duration_seconds": self.last_duration,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+    def _loop(self):
+        # The interval may be changed while the task runs; <= 0 stops it
+        while self.interval > 0 and not self._stop.wait(self.interval):
+            try:
+                self.run_now()
+            except Exception:
+                # The failure is recorded in stats(); the next pass retries
+                pass
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Production server
+Serves the application from pre-forked worker processes that share one
+listening socket and handle requests on a bounded pool of threads. The master
+process creates and migrates the database once, restarts workers that die
+and, on SIGTERM or SIGINT, lets workers finish their requests before they exit.
+
+Usage: python server.py [--host HOST] [--port PORT] [--workers N] [--threads N]
+                        [--timeout SECONDS] [--graceful-timeout SECONDS]
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, select_address_family
+
+logger = logging.getLogger("server")
+
+
+class ServerConfig:
+    """Server settings; defaults come from the SERVER_* environment variables"""
+
+    def __init__(self, host="0.0.0.0", port=5000, workers=None, threads=8, timeout=30.0,
+                 graceful_timeout=30.0, backlog=2048):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.backlog = backlog
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        return cls(host=environ.get("SERVER_HOST", "0.0.0.0"),
+                   port=int(environ.get("SERVER_PORT", 5000)),
+                   workers=int(environ.get("SERVER_WORKERS", 0)) or None,
+                   threads=int(environ.get("SERVER_THREADS", 8)),
+                   timeout=float(environ.get("SERVER_TIMEOUT", 30)),
+                   graceful_timeout=float(environ.get("SERVER_GRACEFUL_TIMEOUT", 30)),
+                   backlog=int(environ.get("SERVER_BACKLOG", 2048)))
+
+
+class TimeoutRequestHandler(WSGIRequestHandler):
+    """Request handler that drops clients which stall for timeout seconds
+
+    Werkzeug's handler closes the connection after every response (it cannot
+    drain an unread request body), so there are no keep-alive connections to
+    tune; a reverse proxy in front keeps client connections open instead.
+    """
+
+    def setup(self):
+        self.timeout = self.server.timeout
+        super().setup()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles connections on a fixed number of threads
+
+    A connection holds its thread until its response is complete, so threads
+    bounds the number of concurrent requests, including open event streams;
+    further connections wait in the listen backlog.
+    """
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, timeout=30.0, fd=None):
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        super().__init__(host, port, app, handler=TimeoutRequestHandler, fd=fd)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for requests in progress; True if all finished"""
+        waiter = threading.Thread(target=self.executor.shutdown, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+
+def serve_until_stopped(server, graceful_timeout):
+    """Run server until SIGTERM/SIGINT, then stop accepting and drain"""
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it needs its own thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    if not server.drain(graceful_timeout):
+        logger.warning("Worker %d exiting with requests still in progress", os.getpid())
+
+
+def run_worker(listener, config, index):
+    """Body of a forked worker process; never returns"""
+    from main import app, init_process
+
+    status = 0
+    try:
+        # One worker runs the background tasks for the whole server: the
+        # history archiver and the device workers, which dispatch the commands
+        # every worker queues in the database
+        init_process(background_tasks=index == 0)
+        server = PooledWSGIServer(config.host, config.port, app, threads=config.threads,
+                                  timeout=config.timeout, fd=listener.fileno())
+        serve_until_stopped(server, config.graceful_timeout)
+    except Exception:
+        logger.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        logging.shutdown()
+        os._exit(status)
+
+
+def open_listener(config):
+    family = select_address_family(config.host, config.port)
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((config.host, config.port))
+    listener.listen(config.backlog)
+    listener.set_inheritable(True)
+    return listener
+
+
+def serve(config):
+    """Run the master process until it is told to stop"""
+    from main import create_app
+
+    app = create_app()
+    if config.workers <= 1 or not hasattr(os, "fork"):
+        server = PooledWSGIServer(config.host, config.port, app, threads=config.threads,
+                                  timeout=config.timeout)
+        logger.info("Serving on http://%s:%d with %d threads", config.host, server.port, config.threads)
+        serve_until_stopped(server, config.graceful_timeout)
+        return
+
+    listener = open_listener(config)
+    workers = {}
+    stopping = threading.Event()
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(listener, config, index)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        logger.info("Shutting down %d workers", len(workers))
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # Workers that have not drained by then are killed
+        timer = threading.Timer(config.graceful_timeout + 1, kill_remaining)
+        timer.daemon = True
+        timer.start()
+
+    def kill_remaining():
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(config.workers):
+        spawn(index)
+    logger.info("Serving on http://%s:%d with %d workers x %d threads",
+                config.host, listener.getsockname()[1], config.workers, config.threads)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is not None and not stopping.is_set():
+            logger.warning("Worker %d exited with status %d, restarting", pid, status)
+            time.sleep(0.1)
+            spawn(index)
+    listener.close()
+
+
+def parse_args(argv=None):
+    defaults = ServerConfig.from_env()
+    parser = argparse.ArgumentParser(description="Run the Manufacturing REST API production server")
+    parser.add_argument("--host", default=defaults.host)
+    parser.add_argument("--port", type=int, default=defaults.port)
+    parser.add_argument("--workers", type=int, default=defaults.workers, help="worker processes")
+    parser.add_argument("--threads", type=int, default=defaults.threads, help="threads per worker")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout,
+                        help="seconds a stalled client connection is kept open")
+    parser.add_argument("--graceful-timeout", type=float, default=defaults.graceful_timeout,
+                        help="seconds workers get to finish requests on shutdown")
+    parser.add_argument("--backlog", type=int, default=defaults.backlog)
+    args = parser.parse_args(argv)
+    return ServerConfig(host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+                        timeout=args.timeout, graceful_timeout=args.graceful_timeout,
+                        backlog=args.backlog)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    serve(parse_args())
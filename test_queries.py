@@ -0,0 +1,996 @@
+"""
+Query-count regression tests for the Manufacturing REST API
+Runs in-process through the Flask test client against an in-memory database
+"""
+
+import json
+import os
+import pstats
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("ARCHIVE_INTERVAL", "0")
+# Device workers are started by the tests that use them, and only wake up for
+# commands queued in this process
+os.environ.setdefault("BACKGROUND_TASKS", "0")
+os.environ.setdefault("DEVICE_POLL_INTERVAL", "0")
+
+import pytest
+from sqlalchemy import event
+
+from main import (app, db, init_database, master_cache, stats_cache, command_queue, request_metrics,
+                  Contact, Wire, Process, Recipe)
+from server import PooledWSGIServer
+
+
+@pytest.fixture
+def client():
+    init_database()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        master_cache.clear()
+        stats_cache.clear()
+        yield app.test_client()
+        db.session.remove()
+
+
+class QueryCounter:
+    """Count the SQL statements executed while the block is active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, "before_cursor_execute", self._on_execute)
+
+
+def add_recipes(n, start=0):
+    """Insert n recipes, each with its own contact, wire and process"""
+    for i in range(start, start + n):
+        contact = Contact(Description=f"Contact {i}", Diameter="1.0", Insertdepth="2.0",
+                          Name=f"ZF{i:05d}", ZF_ContNumb="1.1")
+        wire = Wire(name=f"W{i:05d}", description="Copper wire", cross_section="0.5 mm²",
+                    isolation_diameter="1.2 mm", wire_diameter="0.8 mm", color="red")
+        process = Process(name=f"P{i:05d}", crimping_depth_d="1.0", crimping_depth_offset_d="0.2",
+                          holding_value_delta_d="0.05", insertion_depth_delta_d="0.1",
+                          sf_performance_d="95", sf_frequence_d="60Hz", extendable_feeder_tuble_s="yes",
+                          loading_holding_jaws_s="standard", catact_monitoring_s="enabled",
+                          wayback_d="3.5", stripping_position="front", stripping_function="auto",
+                          crimping_position_monitoring="enabled")
+        db.session.add(Recipe(description=f"Assembly {i}", contact=contact, wire=wire, process=process))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def count_queries(client, url):
+    db.session.expunge_all()
+    stats_cache.clear()
+    with QueryCounter() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize("url", ["/api/v1/recipes", "/api/demo", "/"])
+def test_recipe_reads_do_not_grow_with_recipe_count(client, url):
+    add_recipes(2)
+    small = count_queries(client, url)
+    add_recipes(48, start=2)
+    large = count_queries(client, url)
+    assert large == small
+
+
+def test_single_recipe_read_is_one_query(client):
+    add_recipes(3)
+    # One statement for the ETag version lookup, one for the recipe
+    assert count_queries(client, "/api/v1/recipes/2") == 2
+    data = client.get("/api/v1/recipes/2").get_json()
+    assert data["contact"]["Name"] == "ZF00001"
+    assert data["wire"]["name"] == "W00001"
+    assert data["process"]["name"] == "P00001"
+
+
+def test_stats_counts_and_samples_are_cached(client):
+    add_recipes(5)
+    for status in ("completed", "completed", "failed"):
+        client.post("/api/v1/commands", json={"name": "run", "description": "Run", "status": status})
+    stats_cache.clear()
+
+    with QueryCounter() as counter:
+        stats = client.get("/api/v1/stats").get_json()
+    assert counter.count == 2 + len(stats["samples"])
+    assert stats["counts"] == {"contacts": 5, "wires": 5, "processes": 5, "recipes": 5,
+                               "jobs": 0, "setups": 0, "commands": 3}
+    assert stats["by_status"]["commands"] == {"completed": 2, "failed": 1}
+    assert [contact["Name"] for contact in stats["samples"]["contacts"]] == ["ZF00000", "ZF00001", "ZF00002"]
+    assert stats["samples"]["recipes"][0]["contact"]["Name"] == "ZF00000"
+
+    with QueryCounter() as counter:
+        demo = client.get("/api/demo").get_json()
+    assert counter.count == 0
+    assert demo["database_stats"] == stats["counts"]
+    assert demo["sample_data"] == stats["samples"]
+
+
+def test_history_archival_and_reads_across_archive(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'ARCHIVE_BATCH_SIZE', 2)
+    monkeypatch.setitem(app.config, 'ARCHIVE_BATCH_PAUSE', 0)
+    old, new = "2020-01-01T00:00:00+01:00", "2999-01-01T00:00:00+01:00"
+    client.post("/api/v1/commands/bulk", json=[
+        {"name": f"c{i}", "description": "Run", "status": status, "created_at": created}
+        for i, (status, created) in enumerate([("completed", old), ("pending", old), ("failed", old),
+                                               ("completed", new), ("completed", old), ("completed", old)])])
+
+    moved = client.post("/api/v1/archive").get_json()["archived"]
+    # 1, 3, 5 and 6 are finished and old
+    assert moved == {"job": 0, "command": 4}
+    assert [command["id"] for command in client.get("/api/v1/commands").get_json()] == [2, 4]
+    assert client.get("/api/v1/commands/3").status_code == 404
+    assert client.get("/api/v1/commands/3?include_archived=1").get_json()["archived_at"] is not None
+
+    response = client.get("/api/v1/commands?include_archived=1&limit=4")
+    items = response.get_json()
+    assert [(item["id"], item["archived_at"] is not None) for item in items] == [
+        (1, True), (2, False), (3, True), (4, False)]
+    assert response.headers["X-Next-Cursor"] == "4"
+    rest = client.get("/api/v1/commands?include_archived=1&after=4&fields=name").get_json()
+    assert rest == [{"id": 5, "name": "c4"}, {"id": 6, "name": "c5"}]
+    assert client.get("/api/v1/commands?include_archived=1&status=completed").get_json()[0]["id"] == 1
+
+    # Archived ids are not handed out again, even once the newest hot row is gone
+    client.delete("/api/v1/commands/4")
+    assert client.post("/api/v1/commands", json={"name": "next", "description": "Run"}).get_json()["id"] == 7
+    assert client.get("/api/v1/archive").get_json()["tables"]["command"] == {"hot": 2, "archived": 4}
+
+
+def test_autoincrement_migration_keeps_rows_and_skips_archived_ids(client):
+    from main import migrate_autoincrement_history_ids, CommandArchive
+
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DROP TABLE command")
+        connection.exec_driver_sql("CREATE TABLE command (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(100) "
+                                   "NOT NULL, description VARCHAR(250) NOT NULL, status VARCHAR(50), "
+                                   "created_at VARCHAR(100))")
+        connection.exec_driver_sql("INSERT INTO command VALUES (2, 'calibrate', 'Door station', 'pending', NULL)")
+        connection.execute(db.insert(CommandArchive).values(id=5, name="old", description="Run", status="completed",
+                                                            archived_at="2020-01-01T00:00:00+01:00"))
+        migrate_autoincrement_history_ids(connection)
+        assert "AUTOINCREMENT" in connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'command'").scalar()
+
+    assert client.get("/api/v1/commands/2").get_json()["name"] == "calibrate"
+    assert [hit["id"] for hit in client.get("/api/v1/search?q=door").get_json()] == [2]
+    assert client.post("/api/v1/commands", json={"name": "next", "description": "Run"}).get_json()["id"] == 6
+
+
+def test_upgraded_database_keeps_device_queue_foreign_key(tmp_path):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    database = tmp_path / "upgraded.db"
+    # The shipped database has the schema from before any migration
+    database.write_bytes(open(os.path.join(repo, "instance", "manufacturing.db"), "rb").read())
+    script = """if True:
+        import main
+        main.create_app({"DEVICE_SIMULATOR_DELAY": 0})
+        with main.app.app_context():
+            print(main.db.session.execute(main.db.text(
+                "SELECT sql FROM sqlite_master WHERE name = 'device_queue_entry'")).scalar().splitlines()[-2])
+            print(main.db.session.execute(main.db.text("PRAGMA foreign_key_check")).all())
+        response = main.app.test_client().post("/api/v1/device/commands", json={"command": "reset"})
+        main.command_queue.start()
+        main.command_queue.join()
+        status = main.app.test_client().get(f"/api/v1/commands/{response.get_json()['command_id']}").get_json()
+        print(response.status_code, status["status"])
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{database}"), cwd=repo)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines() == [
+        "\tFOREIGN KEY(command_id) REFERENCES command (id) ON DELETE CASCADE", "[]", "202 completed"]
+
+
+def test_dashboard_shell_and_section_pages(client):
+    add_recipes(7)
+    with QueryCounter() as counter:
+        page = client.get("/")
+    assert page.status_code == 200 and b'data-section="commands"' in page.data
+    assert counter.count == 0
+
+    first = client.get("/dashboard/recipes?limit=3").get_json()
+    assert first["total"] == 7
+    assert [item["description"] for item in first["items"]] == ["Assembly 0", "Assembly 1", "Assembly 2"]
+    assert first["items"][0]["contact_name"] == "ZF00000"
+    second = client.get("/dashboard/recipes", query_string={"limit": 3, "after": first["next"]}).get_json()
+    assert [item["description"] for item in second["items"]] == ["Assembly 3", "Assembly 4", "Assembly 5"]
+    assert "total" not in second
+
+    client.post("/api/v1/contacts/bulk", json=[
+        {"Description": "Bulk", "Diameter": "1", "Insertdepth": "1", "Name": f"AA{i:03d}", "ZF_ContNumb": "1"}
+        for i in range(200)])
+    for url in ("/dashboard/contacts?limit=5", "/dashboard/contacts?limit=5&after=%5B%22AA100%22%2C%20101%5D"):
+        assert count_queries(client, url) <= 3
+    assert client.get("/dashboard/contacts?after=oops").status_code == 400
+    assert client.get("/dashboard/gadgets").status_code == 404
+
+
+def test_collection_keyset_pagination(client):
+    add_recipes(5)
+    response = client.get("/api/v1/wires?limit=2")
+    assert [wire["id"] for wire in response.get_json()] == [1, 2]
+    assert response.headers["X-Next-Cursor"] == "2"
+    response = client.get("/api/v1/wires?limit=2&after=4")
+    assert [wire["id"] for wire in response.get_json()] == [5]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_collection_projection_and_filters(client):
+    add_recipes(3)
+    data = client.get("/api/v1/contacts?fields=Name&Name=ZF00001").get_json()
+    assert data == [{"id": 2, "Name": "ZF00001"}]
+    data = client.get("/api/v1/recipes?fields=description,wire&limit=1").get_json()
+    assert data[0]["wire"]["name"] == "W00000"
+    assert set(data[0]) == {"id", "description", "wire"}
+    assert client.get("/api/v1/jobs?bogus=1").status_code == 400
+    assert client.get("/api/v1/jobs?limit=0").status_code == 400
+
+
+def test_collection_streaming(client):
+    add_recipes(3)
+    response = client.get("/api/v1/recipes?stream=1")
+    assert response.is_streamed
+    assert [recipe["contact"]["Name"] for recipe in response.get_json()] == ["ZF00000", "ZF00001", "ZF00002"]
+    response = client.get("/api/v1/wires?fields=name&after=1",
+                          headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [{"id": 2, "name": "W00001"}, {"id": 3, "name": "W00002"}]
+
+
+def test_conditional_get_uses_table_versions(client):
+    add_recipes(2)
+    response = client.get("/api/v1/recipes")
+    etag = response.headers["ETag"]
+    assert response.headers["Last-Modified"]
+
+    with QueryCounter() as counter:
+        response = client.get("/api/v1/recipes", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert counter.count == 1
+
+    # Editing a wire changes every recipe representation that embeds it
+    assert client.put("/api/v1/wires/1", json={"color": "blue"}).status_code == 200
+    response = client.get("/api/v1/recipes", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    etag = client.get("/api/v1/jobs").headers["ETag"]
+    client.delete("/delete_recipe?id=1")
+    assert client.get("/api/v1/jobs", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_if_modified_since_sees_writes_within_the_same_second(client, monkeypatch):
+    clock = [1_700_000_000.2]
+    monkeypatch.setattr("main.time.time", lambda: clock[0])
+    add_recipes(1)
+
+    clock[0] = 1_700_000_001.1
+    assert client.put("/api/v1/wires/1", json={"color": "blue"}).status_code == 200
+    response = client.get("/api/v1/wires/1")
+    stamp, etag = response.headers["Last-Modified"], response.headers["ETag"]
+    assert client.get("/api/v1/wires/1", headers={"If-Modified-Since": stamp}).status_code == 304
+
+    # A second write within the same second keeps Last-Modified unchanged
+    clock[0] = 1_700_000_001.6
+    assert client.put("/api/v1/wires/1", json={"color": "green"}).status_code == 200
+    response = client.get("/api/v1/wires/1", headers={"If-Modified-Since": stamp})
+    assert response.status_code == 200
+    assert response.headers["Last-Modified"] == stamp
+    assert response.get_json()["color"] == "green"
+
+    # If-None-Match decides alone when both are sent
+    assert client.get("/api/v1/wires/1", headers={"If-Modified-Since": stamp,
+                                                  "If-None-Match": etag}).status_code == 200
+    assert client.get("/api/v1/wires/1", headers={"If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT",
+                                                  "If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    clock[0] = 1_700_000_002.3
+    assert client.put("/api/v1/wires/1", json={"color": "red"}).status_code == 200
+    stamp = client.get("/api/v1/wires/1").headers["Last-Modified"]
+    assert client.get("/api/v1/wires/1", headers={"If-Modified-Since": stamp}).status_code == 304
+
+
+def test_master_cache_hits_and_invalidation(client):
+    add_recipes(2)
+    before = master_cache.stats()
+    client.get("/api/v1/contacts/1")
+    with QueryCounter() as counter:
+        assert client.get("/api/v1/contacts/1").get_json()["Name"] == "ZF00000"
+    assert counter.count == 1  # version lookup only
+    client.get("/api/v1/recipes/1")
+    stats = master_cache.stats()
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["misses"] == before["misses"] + 2
+
+    client.put("/api/v1/contacts/1", json={"Name": "ZF99999"})
+    assert master_cache.stats()["size"] == 0
+    assert client.get("/api/v1/contacts/1").get_json()["Name"] == "ZF99999"
+    assert client.get("/api/v1/recipes/1").get_json()["contact"]["Name"] == "ZF99999"
+    assert client.get("/api/v1/cache/stats").get_json()["hits"] >= 1
+
+
+def test_bulk_insert_upsert_and_delete(client):
+    wires = [{"name": f"BW{i}", "description": "Bulk wire", "cross_section": "1.0 mm²",
+              "isolation_diameter": "1.5 mm", "wire_diameter": "1.0 mm", "color": "red"} for i in range(3)]
+    with QueryCounter() as counter:
+        response = client.post("/api/v1/wires/bulk", json=wires)
+    assert response.status_code == 201
+    assert response.get_json() == {"inserted": 3, "ids": [1, 2, 3]}
+    assert counter.count < 10
+
+    ndjson = "\n".join(json.dumps(dict(wire, color="blue")) for wire in wires[:2])
+    ndjson += "\n" + json.dumps(dict(wires[0], name="BW9"))
+    response = client.put("/api/v1/wires/bulk", data=ndjson, content_type="application/x-ndjson")
+    assert response.get_json() == {"upserted": 3}
+    colors = {wire["name"]: wire["color"] for wire in client.get("/api/v1/wires").get_json()}
+    assert colors == {"BW0": "blue", "BW1": "blue", "BW2": "red", "BW9": "red"}
+
+    response = client.post("/api/v1/wires/bulk", json=[wires[0], {"name": "X"}, "bad"])
+    assert response.status_code == 400
+    assert [error["index"] for error in response.get_json()["errors"]] == [0, 1, 2]
+    assert len(client.get("/api/v1/wires").get_json()) == 4
+
+    response = client.delete("/api/v1/wires/bulk", json=[1, {"name": "BW9"}])
+    assert response.get_json() == {"deleted": 2}
+    assert client.delete("/api/v1/wires/bulk", json=[1]).status_code == 400
+
+
+def test_bulk_upsert_keeps_fields_that_were_not_sent(client):
+    client.post("/api/v1/jobs/bulk", json=[{"name": "Old job", "status": "running",
+                                            "created_at": "2020-01-01T00:00:00+01:00"}])
+    response = client.put("/api/v1/jobs/bulk", json=[{"id": 1, "name": "renamed"}, {"id": 5, "name": "new"}])
+    assert response.get_json() == {"upserted": 2}
+    jobs = client.get("/api/v1/jobs").get_json()
+    assert [(job["id"], job["name"], job["status"]) for job in jobs] == [(1, "renamed", "running"),
+                                                                        (5, "new", "pending")]
+    assert jobs[0]["created_at"] == "2020-01-01T00:00:00+01:00" != jobs[1]["created_at"]
+
+
+def test_numeric_parameters_are_parsed_and_range_filtered(client):
+    add_recipes(3)
+    for i, depth in enumerate(["0.8", "1.25 mm", "2,0"], start=1):
+        client.put(f"/api/v1/processes/{i}", json={"crimping_depth_d": depth})
+    process = client.get("/api/v1/processes/2").get_json()
+    assert (process["crimping_depth_d_value"], process["crimping_depth_d_unit"]) == (1.25, "mm")
+    assert (process["sf_frequence_d_value"], process["sf_frequence_d_unit"]) == (60.0, "Hz")
+
+    response = client.get("/api/v1/processes?crimping_depth_d_min=1&crimping_depth_d_max=2&fields=name")
+    assert response.get_json() == [{"id": 2, "name": "P00001"}, {"id": 3, "name": "P00002"}]
+    assert client.get("/api/v1/processes?crimping_depth_d_min=abc").status_code == 400
+
+    wires = [{"name": f"NW{i}", "description": "Bulk wire", "cross_section": section,
+              "isolation_diameter": "1.5 mm", "wire_diameter": "1.0 mm", "color": "red"}
+             for i, section in enumerate(["0.35 mm²", "thick", "500 mm²"])]
+    response = client.post("/api/v1/wires/bulk", json=wires)
+    assert [error["index"] for error in response.get_json()["errors"]] == [1, 2]
+    response = client.post("/api/v1/wires/bulk", json=[dict(wires[0], cross_section_value=1.0)])
+    assert response.status_code == 400
+    assert client.post("/api/v1/wires/bulk", json=wires[:1]).status_code == 201
+    wire = client.get("/api/v1/wires?name=NW0").get_json()[0]
+    assert (wire["cross_section_value"], wire["cross_section_unit"]) == (0.35, "mm²")
+
+
+def test_numeric_parameter_migration_parses_existing_rows(client):
+    from main import migrate_numeric_parameters
+
+    db.session.execute(db.insert(Contact), [
+        {"Description": "Legacy", "Diameter": f"{i}.5", "Insertdepth": "n/a",
+         "Name": f"L{i}", "ZF_ContNumb": "1"} for i in range(5)])
+    db.session.commit()
+    assert db.session.execute(db.select(Contact.Diameter_value)).scalars().all() == [None] * 5
+
+    with db.engine.begin() as connection:
+        migrate_numeric_parameters(connection, batch_size=2)
+    rows = db.session.execute(db.select(Contact.Diameter_value, Contact.Insertdepth_value)).all()
+    assert rows == [(i + 0.5, None) for i in range(5)]
+
+
+def test_search_prefix_range_and_recipe_part_filters(client):
+    add_recipes(30)
+    client.put("/api/v1/wires/3", json={"cross_section": "2.5 mm²", "color": "blue"})
+
+    response = client.get("/api/v1/contacts/search?name=ZF0001*&fields=Name&limit=5")
+    assert [contact["Name"] for contact in response.get_json()] == [f"ZF0001{i}" for i in range(5)]
+    assert response.headers["Link"].startswith("</api/v1/contacts/search?")
+    response = client.get(f"/api/v1/contacts/search?name=ZF0001*&fields=Name&after={response.headers['X-Next-Cursor']}")
+    assert [contact["Name"] for contact in response.get_json()] == [f"ZF0001{i}" for i in range(5, 10)]
+
+    response = client.get("/api/v1/wires/search?cross_section_min=1&color=blue")
+    assert [wire["name"] for wire in response.get_json()] == ["W00002"]
+    assert client.get("/api/v1/wires?name=W0000*").get_json() == []
+
+    response = client.get("/api/v1/recipes/search?contact_name=ZF0002*&process_name=P00025&limit=10")
+    recipes = response.get_json()
+    assert [(recipe["contact"]["Name"], recipe["process"]["name"]) for recipe in recipes] == [("ZF00025", "P00025")]
+
+    etag = client.get("/api/v1/recipes/search?contact_name=ZF0002*").headers["ETag"]
+    assert client.get("/api/v1/recipes/search?contact_name=ZF0002*",
+                      headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/v1/recipes/search?contact_colour=red").status_code == 400
+    assert client.get("/api/v1/gadgets/search").status_code == 404
+
+
+def test_full_text_search_stays_in_sync_with_writes(client):
+    from main import rebuild_search_index
+
+    add_recipes(2)
+    client.put("/api/v1/recipes/2", json={"description": "Harness for the door module"})
+    client.post("/api/v1/wires/bulk", json=[
+        {"name": "DW1", "description": "Door harness wire", "cross_section": "0.5 mm²",
+         "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"}])
+    client.post("/api/v1/commands", json={"name": "calibrate", "description": "Calibrate door station"})
+
+    hits = client.get("/api/v1/search?q=door").get_json()
+    assert {(hit["type"], hit["id"]) for hit in hits} == {("recipe", 2), ("wire", 3), ("command", 1)}
+    assert hits[0]["snippet"].count("[door]") + hits[0]["snippet"].count("[Door]") == 1
+    assert [hit["type"] for hit in client.get("/api/v1/search?q=harn&types=wire").get_json()] == ["wire"]
+    assert client.get(hits[0]["url"]).status_code == 200
+
+    client.delete("/api/v1/contacts/2")
+    assert {hit["type"] for hit in client.get("/api/v1/search?q=door").get_json()} == {"wire", "command"}
+    response = client.get("/api/v1/search?q=assembly&limit=1")
+    assert len(response.get_json()) == 1 and "Link" not in response.headers
+
+    db.session.execute(db.text("DELETE FROM search_index"))
+    db.session.commit()
+    with db.engine.begin() as connection:
+        assert rebuild_search_index(connection) == 6
+    assert len(client.get("/api/v1/search?q=door").get_json()) == 2
+    assert client.get("/api/v1/search?q=%22(").status_code == 400
+
+
+def test_bulk_fixture_load_resolves_parts_and_rebuilds_indexes(client, tmp_path):
+    from populate_db import bulk_load, collect_fixtures, populate_database
+
+    populate_database()
+    assert client.get("/api/v1/recipes/1").get_json()["contact"]["Name"] == "ZF001"
+
+    (tmp_path / "contacts.csv").write_text(
+        "Name,Description,Diameter,Insertdepth,ZF_ContNumb\n"
+        "ZF100,Door contact,1.5,20,1.1\nZF200,Seat contact,2.5 mm,22,1.2\n")
+    (tmp_path / "wires.json").write_text(json.dumps([
+        {"name": "W100", "description": "Copper wire", "cross_section": "0.5 mm²",
+         "isolation_diameter": "1.2 mm", "wire_diameter": "0.8 mm", "color": "red"}]))
+    (tmp_path / "processes.ndjson").write_text(json.dumps({
+        "name": "P100", "crimping_depth_d": "1.0", "crimping_depth_offset_d": "0.2",
+        "holding_value_delta_d": "0.05", "insertion_depth_delta_d": "0.1", "sf_performance_d": "95",
+        "sf_frequence_d": "60Hz", "extendable_feeder_tuble_s": "yes", "loading_holding_jaws_s": "standard",
+        "catact_monitoring_s": "enabled", "wayback_d": "3.5", "stripping_position": "front",
+        "stripping_function": "auto", "crimping_position_monitoring": "enabled"}) + "\n")
+    (tmp_path / "recipes.ndjson").write_text(
+        '{"description": "Door harness", "contact": "ZF100", "wire": "W100", "process": "P100"}\n'
+        '{"description": "Seat harness", "contact": "ZF200", "wire": "W100", "process": "P100"}\n')
+    version = client.get("/api/v1/contacts").headers["ETag"]
+    loaded = bulk_load(collect_fixtures([str(tmp_path)]), batch_size=1)
+    assert {table: rows for table, (rows, seconds) in loaded.items()} == {
+        "contact": 2, "wire": 1, "process": 1, "recipe": 2}
+
+    db.session.expire_all()
+    recipes = client.get("/api/v1/recipes").get_json()
+    assert [(recipe["description"], recipe["contact"]["Name"]) for recipe in recipes] == [
+        ("Door harness", "ZF100"), ("Seat harness", "ZF200")]
+    assert client.get("/api/v1/contacts").headers["ETag"] != version
+    assert [contact["Name"] for contact in client.get("/api/v1/contacts?Diameter_min=2").get_json()] == ["ZF200"]
+    assert {(hit["type"], hit["id"]) for hit in client.get("/api/v1/search?q=harness").get_json()} == {
+        ("recipe", 1), ("recipe", 2)}
+    assert client.get("/api/v1/jobs").get_json()[0]["name"] == "Sample Job 1"
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+        indexes = {row[1] for row in connection.exec_driver_sql("PRAGMA index_list(contact)")}
+    assert {index.name for index in Contact.__table__.indexes} <= indexes
+
+    (tmp_path / "recipes.ndjson").write_text('{"description": "Loose", "contact": "ZF999", "wire": "W100"}\n')
+    with pytest.raises(ValueError, match="recipe row 1: contact not found: ZF999"):
+        bulk_load(collect_fixtures([str(tmp_path / "recipes.ndjson")]), replace=False)
+    assert len(client.get("/api/v1/recipes").get_json()) == 2
+
+    # Replaced commands take the queue entries of the old rows with them
+    from main import DeviceQueueEntry
+    db.session.add(DeviceQueueEntry(command_id=1, machine="default", payload="{}", enqueued_at=0))
+    db.session.commit()
+    (tmp_path / "commands.json").write_text(json.dumps([
+        {"id": 1, "name": "reset", "description": "Reset machine", "status": "queued"}]))
+    bulk_load(collect_fixtures([str(tmp_path / "commands.json")]))
+    assert db.session.scalars(db.select(DeviceQueueEntry)).all() == []
+
+
+@pytest.mark.parametrize("url", ["/delete_process?id={}", "/api/v1/processes/{}"])
+def test_cascading_delete_is_set_based(client, url):
+    add_recipes(3)
+    # Point 40 more recipes at process 1
+    db.session.execute(db.insert(Recipe), [
+        {"description": f"Extra {i}", "contact_id": 2, "wire_id": 2, "process_id": 1} for i in range(40)])
+    db.session.commit()
+
+    counts = []
+    for process_id in (1, 2):
+        with QueryCounter() as counter:
+            assert client.delete(url.format(process_id)).status_code == 200
+        counts.append(counter.count)
+    # The same statements run whether 41 recipes or a single one are removed
+    assert counts[0] == counts[1]
+
+    remaining = db.session.execute(db.select(Recipe.process_id)).scalars().all()
+    assert remaining == [3]
+    assert db.session.get(Process, 1) is None
+    assert client.delete(url.format(1)).status_code == 404
+
+
+def test_device_commands_are_queued_and_executed(client):
+    add_recipes(1)
+    command_queue.driver.delay = 0
+    command_queue.start()
+    response = client.post("/api/v1/device/commands",
+                           json={"command": "start_recipe", "parameters": {"recipe_id": 1}})
+    assert response.status_code == 202
+    data = response.get_json()
+    assert data["executed_command"]["status"] == "queued"
+    assert data["recipe_detail"]["wire"]["name"] == "W00000"
+
+    command_queue.join()
+    db.session.expire_all()
+    assert client.get(data["status_url"]).get_json()["status"] == "completed"
+    stats = client.get("/api/v1/device/queue").get_json()
+    assert stats["completed"] >= 1
+    assert stats["depth"] == {"default": 0}
+    assert client.post("/api/v1/device/commands",
+                       json={"command": "reset", "parameters": {"machine": "nope"}}).status_code == 400
+
+
+def test_device_queue_recovers_commands_left_by_a_dead_dispatcher(client):
+    from device_queue import CommandQueue, SimulatedMachineDriver
+    from main import Command, DeviceQueueEntry, DatabaseCommandStore, update_command_status
+
+    # (status, queue entry: (machine, claimed) or None) as a crashed dispatcher left them
+    left_behind = [("queued", ("default", False)), ("executing", ("default", True)),
+                   ("queued", ("default", True)), ("queued", ("retired", False)),
+                   ("executing", None), ("completed", ("default", True))]
+    for i, (status, entry) in enumerate(left_behind, start=1):
+        db.session.add(Command(id=i, name="reset", description="Reset machine", status=status))
+        if entry:
+            db.session.add(DeviceQueueEntry(command_id=i, machine=entry[0], payload='{"command": "reset"}',
+                                            enqueued_at=0, claimed_at=1.0 if entry[1] else None))
+    db.session.commit()
+
+    queue = CommandQueue(("default",), SimulatedMachineDriver(delay=0), DatabaseCommandStore(),
+                         update_command_status, poll_interval=0)
+    queue.start()
+    queue.join()
+    db.session.expire_all()
+    assert [command.status for command in db.session.scalars(db.select(Command).order_by(Command.id))] == [
+        "completed", "failed", "completed", "failed", "failed", "completed"]
+    assert db.session.scalars(db.select(DeviceQueueEntry)).all() == []
+    assert queue.stats()["recovered_failed"] == 3
+
+
+def test_device_command_is_failed_when_a_status_update_raises(client, caplog):
+    from device_queue import CommandQueue, SimulatedMachineDriver
+    from main import Command, DeviceQueueEntry, DatabaseCommandStore, update_command_status
+
+    def flaky_status(command_id, status):
+        if status == "executing":
+            raise RuntimeError("database is locked")
+        update_command_status(command_id, status)
+
+    for i in (1, 2):
+        db.session.add(Command(id=i, name="reset", description="Reset machine", status="queued"))
+    db.session.commit()
+    queue = CommandQueue(("default",), SimulatedMachineDriver(delay=0), DatabaseCommandStore(),
+                         flaky_status, poll_interval=0)
+    # Queued before the workers start: the in-memory database has a single connection
+    for i in (1, 2):
+        queue.enqueue("default", i, {"command": "reset"})
+    queue.start()
+    queue.join()
+    db.session.expire_all()
+    assert [command.status for command in db.session.scalars(db.select(Command).order_by(Command.id))] == [
+        "failed", "failed"]
+    assert db.session.scalars(db.select(DeviceQueueEntry)).all() == []
+    assert queue.stats()["failed"] == 2
+    assert "Device command 1 could not be dispatched" in caplog.text
+
+
+def test_device_queue_size_holds_under_concurrent_enqueues(tmp_path):
+    script = """if True:
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        import main
+        from device_queue import QueueFullError
+
+        main.create_app()
+        with main.app.app_context():
+            for i in range(1, 9):
+                main.db.session.add(main.Command(id=i, name="reset", description="Reset machine", status="queued"))
+            main.db.session.commit()
+        store, barrier = main.DatabaseCommandStore(), threading.Barrier(8)
+
+        def put(command_id):
+            barrier.wait()
+            try:
+                store.put("default", command_id, {"command": "reset"}, 3)
+                return "queued"
+            except QueueFullError:
+                return "full"
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(put, range(1, 9)))
+        print(results.count("queued"), results.count("full"), store.depth("default"))
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split("\n")[-2] == "3 5 3"
+
+
+def test_change_events_long_poll_and_sse(client):
+    cursor = client.get("/api/v1/events").get_json()["last_id"]
+    job_id = client.post("/api/v1/jobs", json={"name": "Watched job"}).get_json()["id"]
+    client.put(f"/api/v1/jobs/{job_id}", json={"status": "completed"})
+    client.post("/api/v1/contacts", json={"Description": "Not an event", "Diameter": "1", "Insertdepth": "1",
+                                          "Name": "ZFX", "ZF_ContNumb": "1"})
+
+    data = client.get(f"/api/v1/events?since={cursor}&timeout=0").get_json()
+    assert [(event["table"], event["action"]) for event in data["events"]] == [("job", "create"), ("job", "update")]
+    assert data["events"][1]["data"]["status"] == "completed"
+    assert client.get(f"/api/v1/events?since={data['last_id']}&timeout=0").get_json()["events"] == []
+
+    response = client.get(f"/api/v1/events?since={cursor}", headers={"Accept": "text/event-stream"},
+                          buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+    assert b"event: job.create" in next(chunks)
+    response.close()
+
+
+def test_recipe_package_is_cached_and_rebuilt_on_change(client):
+    add_recipes(2)
+    package = client.get("/api/v1/recipes/1/package")
+    content = package.get_json()
+    assert content["version"] == 1
+    assert content["parameters"]["process.crimping_depth_d"] == "1.0"
+    assert client.get("/api/v1/recipes/1/package",
+                      headers={"If-None-Match": package.headers["ETag"]}).status_code == 304
+
+    with QueryCounter() as counter:
+        client.get("/api/v1/recipes/1/package")
+    assert counter.count == 1
+
+    # Editing another recipe's wire leaves this package untouched
+    client.put("/api/v1/wires/2", json={"color": "green"})
+    assert client.get("/api/v1/recipes/1/package").get_json()["version"] == 1
+    client.put("/api/v1/processes/1", json={"crimping_depth_d": "1.2"})
+    content = client.get("/api/v1/recipes/1/package").get_json()
+    assert content["version"] == 2
+    assert content["parameters"]["process.crimping_depth_d"] == "1.2"
+
+    command_queue.driver.delay = 0
+    command_queue.start()
+    response = client.post("/api/v1/device/commands",
+                           json={"command": "start_recipe", "parameters": {"recipe_id": 1}})
+    assert response.get_json()["package_version"] == 2
+    command_queue.join()
+
+
+def test_bulk_writes_mark_only_referencing_packages_stale(client):
+    from main import RecipePackage
+
+    add_recipes(3)
+    for recipe_id in (1, 2, 3):
+        client.get(f"/api/v1/recipes/{recipe_id}/package")
+
+    def stale_packages():
+        db.session.expire_all()
+        return {package.recipe_id: package.stale for package in db.session.scalars(db.select(RecipePackage))}
+
+    contact = {"Description": "Changed", "Diameter": "1.0", "Insertdepth": "2.0", "ZF_ContNumb": "1.1"}
+    client.post("/api/v1/contacts/bulk", json=[dict(contact, Name="ZF00099")])
+    assert stale_packages() == {1: False, 2: False, 3: False}
+    client.put("/api/v1/contacts/bulk", json=[dict(contact, Name="ZF00001"), dict(contact, Name="ZF00098")])
+    assert stale_packages() == {1: False, 2: True, 3: False}
+    assert client.delete("/api/v1/processes/bulk", json=[3]).get_json() == {"deleted": 1}
+    assert stale_packages() == {1: False, 2: True}
+
+
+def test_concurrent_first_package_builds_all_succeed(tmp_path):
+    # A database file, so that every thread has its own connection
+    script = """if True:
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        import main
+        from populate_db import populate_database
+
+        main.create_app()
+        populate_database()
+        barrier = threading.Barrier(8)
+
+        def get(_):
+            client = main.app.test_client()
+            barrier.wait()
+            response = client.get("/api/v1/recipes/3/package")
+            return response.status_code, response.get_json().get("version")
+
+        with ThreadPoolExecutor(8) as pool:
+            print(set(pool.map(get, range(8))))
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split("\n")[-2] == "{(200, 1)}"
+
+
+def test_write_during_package_rebuild_is_not_lost(tmp_path):
+    script = """if True:
+        import threading
+        import time
+        import main
+        from populate_db import populate_database
+
+        main.create_app()
+        populate_database()
+        client = main.app.test_client()
+        process = f"/api/v1/processes/{client.get('/api/v1/recipes/3').get_json()['process_id']}"
+        client.get("/api/v1/recipes/3/package")
+        client.put(process, json={"crimping_depth_d": "7.7"})
+
+        build, built = main.build_recipe_package_content, threading.Event()
+
+        def build_then_pause(recipe_id):
+            content = build(recipe_id)
+            built.set()
+            time.sleep(0.5)
+            return content
+
+        main.build_recipe_package_content = build_then_pause
+        rebuild = threading.Thread(target=main.app.test_client().get, args=("/api/v1/recipes/3/package",))
+        rebuild.start()
+        built.wait()
+        # Marks the package stale while it is being rebuilt from the 7.7 rows
+        status = main.app.test_client().put(process, json={"crimping_depth_d": "8.8"}).status_code
+        rebuild.join()
+        main.build_recipe_package_content = build
+        content = client.get("/api/v1/recipes/3/package").get_json()
+        print(status, content["version"], content["parameters"]["process.crimping_depth_d"])
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split("\n")[-2] == "200 3 8.8"
+
+
+def test_request_metrics_and_slow_query_log(client, caplog):
+    add_recipes(3)
+    request_metrics.reset()
+    client.get("/api/v1/recipes")
+    client.get("/api/v1/recipes/2")
+    client.get("/api/v1/recipes?stream=1").get_data()
+    client.get("/api/v1/recipes/9")
+    client.get("/no/such/page")
+
+    stats = request_metrics.snapshot()
+    collection = stats[("api_get_recipes", "GET")]
+    assert collection["count"] == 2 and collection["statuses"] == {200: 2}
+    assert collection["rows"] >= 6 and collection["statements"] >= 2
+    assert collection["response_bytes"] > 0 and sum(collection["buckets"]) == 2
+    assert stats[("api_get_recipe", "GET")]["statuses"] == {200: 1, 404: 1}
+    assert stats[("unmatched", "GET")]["statuses"] == {404: 1}
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'manufacturing_requests_total{endpoint="api_get_recipe",method="GET",status="404"} 1' in body
+    assert 'manufacturing_request_duration_seconds_bucket{endpoint="api_get_recipes",method="GET",le="+Inf"} 2' in body
+    assert "# TYPE manufacturing_sql_rows_fetched_total counter" in body
+
+    app.config['SLOW_QUERY_MS'] = 1e-6
+    try:
+        with caplog.at_level("WARNING", logger="manufacturing.slow_queries"):
+            client.get("/api/v1/jobs")
+    finally:
+        app.config['SLOW_QUERY_MS'] = 0
+    assert any("in api_get_jobs: SELECT" in record.getMessage() for record in caplog.records)
+
+
+def test_profiled_request_returns_and_stores_report(client, tmp_path, monkeypatch):
+    add_recipes(3)
+    # Without a configured token the parameter is ignored
+    assert isinstance(client.get("/api/v1/recipes?__profile=1").get_json(), list)
+
+    monkeypatch.setitem(app.config, 'PROFILE_TOKEN', "s3cret")
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    assert client.get("/api/v1/recipes?__profile=1&__profile_token=wrong").status_code == 403
+
+    report = client.get("/api/v1/recipes?limit=2&__profile=1&__profile_token=s3cret").get_json()
+    assert (report["endpoint"], report["status"], report["path"]) == ("api_get_recipes", 200, "/api/v1/recipes?limit=2")
+    assert report["sql"]["count"] == len(report["sql"]["statements"]) >= 2
+    assert any("FROM recipe" in statement["statement"] for statement in report["sql"]["statements"])
+    assert report["functions"] and report["functions"][0]["cumulative_ms"] >= 0
+    pstats.Stats(str(tmp_path / f"{report['id']}.pstats"))
+
+    headers = {"X-Profile": "sample", "X-Profile-Token": "s3cret"}
+    report = client.get("/api/v1/recipes?stream=1", headers=headers).get_json()
+    assert report["mode"] == "sample" and report["response_bytes"] > 0
+    collapsed = client.get(report["files"]["sample"], headers=headers)
+    assert collapsed.status_code == 200
+    listed = client.get("/api/v1/profiles", headers=headers).get_json()
+    assert [profile["mode"] for profile in listed] == ["sample", "cprofile"]
+    assert client.get("/api/v1/profiles").status_code == 403
+    assert client.get("/api/v1/profiles?__profile_token=s3cret").get_json() == listed
+
+    # Event streams never end; they are served unprofiled and free the profiler
+    response = client.get("/api/v1/events?__profile=1&__profile_token=s3cret",
+                          headers={"Accept": "text/event-stream"}, buffered=False)
+    assert response.mimetype == "text/event-stream" and response.headers["X-Profile-Skipped"]
+    response.close()
+    assert client.get("/api/v1/jobs", headers=headers).get_json()["mode"] == "sample"
+
+
+def test_file_database_connections_are_pooled_with_production_pragmas(tmp_path):
+    script = """if True:
+        import main
+        main.create_app()
+        with main.app.app_context(), main.db.engine.connect() as first, main.db.engine.connect() as second:
+            print(type(main.db.engine.pool).__name__, main.app.config["SQLITE_PRAGMAS"]["busy_timeout"])
+            for connection in (first, second):
+                print(*(connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                        for name in ("journal_mode", "busy_timeout", "foreign_keys", "synchronous")))
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}",
+                                     SQLITE_PROFILE="production", SQLITE_BUSY_TIMEOUT_MS="1234"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    # synchronous=NORMAL is 1
+    assert result.stdout.splitlines() == ["QueuePool 1234", "wal 1234 1 1", "wal 1234 1 1"]
+
+
+def test_import_has_no_side_effects_and_create_app_migrates(tmp_path):
+    database = tmp_path / "app.db"
+    script = ("import os, main; assert not os.path.exists(%r); main.create_app(); "
+              "print(main.app.test_client().get('/api/v1/jobs').status_code)") % str(database)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{database}", ARCHIVE_INTERVAL="0"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ["200"]
+
+
+def test_create_app_config_reaches_objects_built_at_import(tmp_path):
+    script = """if True:
+        import main
+        main.create_app({"DEVICE_MACHINES": ["line1", "line2"], "STATS_CACHE_TTL": 0, "MASTER_CACHE_SIZE": 1,
+                         "DEVICE_SIMULATOR_DELAY": 0})
+        response = main.app.test_client().post("/api/v1/device/commands", json={"command": "reset"})
+        main.command_queue.start()
+        main.command_queue.join()
+        print(response.status_code, response.get_json()["machine"], main.stats_cache.ttl,
+              main.master_cache.maxsize, main.command_queue.driver.delay)
+        try:
+            main.create_app({"SQLITE_PROFILE": "default"})
+        except ValueError as e:
+            print("rejected", e)
+    """
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    assert lines[0] == "202 line1 0 1 0"
+    assert lines[1].startswith("rejected SQLITE_PROFILE")
+
+
+def test_pooled_server_serves_concurrent_requests(client):
+    server = PooledWSGIServer("127.0.0.1", 0, app, threads=4)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def get(path):
+        connection = HTTPConnection("127.0.0.1", server.port, timeout=10)
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    try:
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(get, ["/api/v1/jobs"] * 16))
+        assert results == [(200, b"[]\n")] * 16
+    finally:
+        server.shutdown()
+        assert server.drain(5)
+
+
+# Runs in a subprocess because the async engine needs a database file
+ASGI_CHECK = """
+import asyncio, json
+from asgi import application, flask_app, request_metrics
+
+async def call(method, url, body=None, headers=()):
+    path, _, query = url.partition("?")
+    headers = list(headers) + ([("content-type", "application/json")] if body is not None else [])
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    messages, received = [], []
+
+    async def receive():
+        if received:
+            await asyncio.sleep(3600)
+        received.append(True)
+        return {"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    headers = {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+    return messages[0]["status"], headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+async def main():
+    client = flask_app.test_client()
+    for i in range(3):
+        assert (await call("POST", "/api/v1/jobs", {"name": f"job {i}"}))[0] == 201
+    urls = ["/api/v1/jobs", "/api/v1/jobs?limit=2", "/api/v1/jobs?limit=2&after=1&fields=name",
+            "/api/v1/jobs?limit=0", "/api/v1/jobs/2", "/api/v1/jobs/9", "/api/v1/contacts", "/api/v1/recipes/1",
+            "/api/v1/events", "/api/v1/events?since=1&timeout=0", "/api/v1/events?since=x"]
+    for url in urls:
+        for headers in ((), (("origin", "http://cell"),)):
+            expected = client.get(url, headers=dict(headers))
+            status, response_headers, body = await call("GET", url, headers=headers)
+            assert (status, body) == (expected.status_code, expected.get_data()), url
+            assert response_headers == {name.lower(): value for name, value in expected.headers.items()}, url
+    etag = client.get("/api/v1/jobs").headers["ETag"]
+    assert (await call("GET", "/api/v1/jobs", headers=[("if-none-match", etag)]))[0] == 304
+
+    # A long-poll is woken by a write that goes through the Flask app
+    async def write_later():
+        await asyncio.sleep(0.2)
+        return await call("POST", "/api/v1/jobs", {"name": "late"})
+    (status, _, body), _ = await asyncio.gather(call("GET", "/api/v1/events?since=3&timeout=10"), write_later())
+    assert [event["data"]["name"] for event in json.loads(body)["events"]] == ["late"]
+
+    status, headers, body = await call("POST", "/api/v1/device/commands", {"command": "reset"})
+    assert status == 202 and headers["location"] == json.loads(body)["status_url"] == "/api/v1/commands/1"
+    assert (await call("POST", "/api/v1/device/commands", {"command": "fly"}))[0] == 400
+
+    # Requests served by the async views and by the Flask app both land in /metrics
+    stats = request_metrics.snapshot()
+    assert stats[("api_device_command", "POST")]["statements"] > 0
+    assert stats[("api_get_job", "GET")]["rows"] > 0
+    assert stats[("api_create_job", "POST")]["statuses"] == {201: 4}
+
+async def run():
+    try:
+        await main()
+    finally:
+        await application.shutdown()
+
+asyncio.run(run())
+"""
+
+
+def test_asgi_app_matches_flask_responses(tmp_path):
+    pytest.importorskip("aiosqlite")
+    result = subprocess.run([sys.executable, "-c", ASGI_CHECK], capture_output=True, text=True,
+                            env=dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'asgi.db'}",
+                                     ARCHIVE_INTERVAL="0", DEVICE_SIMULATOR_DELAY="0"),
+                            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=60)
+    assert result.returncode == 0, result.stderr